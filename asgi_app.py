@@ -0,0 +1,357 @@
+"""
+ASGI Sunucusu - Web API, Telegram bot ve Gemini çağrıları tek event loop'ta
+
+Sohbet istekleri Gemini'yi beklerken thread tutmaz: bir worker gthread'in 4 thread'i
+yerine yüzlerce yavaş sohbeti aynı anda taşıyabilir. Sık okunan route'lar (sohbet,
+etkinlik listesi/detayı, şehirler, kategoriler) burada async yazılıdır ve MongoDB'ye
+async sürücü (motor) ile gider; CPU işleri (encode, FAISS) sınırlı bir executor'da çalışır.
+Diğer route'lar (etkinlik yazmaları, /api/seed, statik dosyalar) events_backend.py'deki
+Flask handler'larının kendisidir: Flask uygulaması WSGI olarak mount edilir.
+
+RAG index'inin kurulumu ve delta'ları, katalog revizyonu yazmaları ve change stream
+izlemesi scraper ile ortak pymongo kodudur; event loop'ta değil arka plan thread'lerinde
+ve executor'da çalışır.
+
+Çalıştırma:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5001
+"""
+
+import os
+
+# Telegram bot'u events_backend'in thread'i değil, bu sunucunun event loop'u çalıştırır;
+# MongoDB bağlantısı da import sırasında değil lifespan'de, executor'da kurulur
+os.environ['TELEGRAM_AUTOSTART'] = '0'
+os.environ['MONGO_AUTOCONNECT'] = '0'
+
+import asyncio
+import contextlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from telegram import Update
+
+import catalogue
+import events_backend
+from events_backend import (MONGO_URI, TELEGRAM_BOT_TOKEN, TELEGRAM_MODE, TELEGRAM_WEBHOOK_PATH,
+                            TELEGRAM_WEBHOOK_SECRET, TELEGRAM_WEBHOOK_URL)
+
+logger = logging.getLogger(__name__)
+
+# Bloklayan işler (encode, FAISS, pymongo ile RAG senkronizasyonu) ve Flask route'ları için thread sayısı
+ASGI_EXECUTOR_WORKERS = int(os.getenv('ASGI_EXECUTOR_WORKERS', '4'))
+
+# motor bağlantıyı ilk sorguda kurar: import sırasında ağa gidilmez
+motor_client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+motor_db = motor_client['events_db']
+events_collection = motor_db['events']
+
+
+class JSONEncoder(json.JSONEncoder):
+    """ObjectId ve datetime destekli JSON (Flask'taki CustomJSONProvider gibi)"""
+
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+class APIResponse(JSONResponse):
+    def render(self, content):
+        return json.dumps(content, cls=JSONEncoder, ensure_ascii=False).encode('utf-8')
+
+
+async def run_blocking(func, *args):
+    """Bloklayan çağrıyı sınırlı executor'da çalıştır"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def mongo_unavailable():
+    if events_backend.events_collection is None:
+        return APIResponse({"success": False, "error": "MongoDB not connected. Please check your MongoDB connection."},
+                           status_code=503)
+    return None
+
+
+def if_none_match(request, etag):
+    """If-None-Match başlığı bu ETag'i (veya '*') içeriyor mu"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or f'"{etag}"' in tags
+
+
+async def catalogue_revision():
+    """
+    events_backend.cached_catalogue_revision'un async eşdeğeri
+
+    Revizyon aynı RevisionCache'ten okunur; süresi dolduysa Mongo'ya motor ile gidilir.
+    """
+    cache = events_backend.catalogue_revision
+    if cache is None:
+        return None
+    revision = cache.cached()
+    if revision is not None:
+        return revision
+    try:
+        doc = await motor_db[catalogue.META_COLLECTION].find_one({'_id': catalogue.CATALOGUE_DOC_ID})
+    except Exception as e:
+        logger.warning(f"Katalog revizyonu okunamadı, yanıt cache'i atlanıyor: {e}")
+        return None
+    revision = doc.get('revision', 0) if doc else 0
+    cache.refresh(revision)
+    return revision
+
+
+async def cached_response(request, build):
+    """events_backend.cached_response'un async eşdeğeri (aynı cache, aynı ETag'ler)"""
+    cache = events_backend.response_cache
+    revision = None
+    if events_backend.response_versioned(request.query_params):
+        revision = await catalogue_revision()
+    if revision is None:
+        payload, status = await build()
+        return APIResponse(payload, status_code=status)
+
+    key = events_backend.response_cache_key(request.url.path, request.query_params.multi_items())
+    etag = events_backend.response_etag(key, revision)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': f'public, max-age={events_backend.RESPONSE_CACHE_MAX_AGE}'}
+    if if_none_match(request, etag):
+        cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    body = cache.get(key, revision)
+    if body is None:
+        payload, status = await build()
+        if status != 200:
+            return APIResponse(payload, status_code=status)
+        body = APIResponse(payload).body
+        if events_backend.response_cacheable(request.query_params):
+            cache.put(key, revision, body)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+# ============ API ENDPOINTS ============
+
+async def health(request):
+    return APIResponse(events_backend.health_status())
+
+
+async def chat(request):
+    """Chat API - Flask /api/chat ile aynı sözleşme"""
+    user_message, error = events_backend.chat_message(await read_json(request))
+    if error:
+        return APIResponse({"success": False, "error": error}, status_code=400)
+
+    logger.info(f"Web chat API - message: {user_message}")
+    rag_engine = await run_blocking(events_backend.get_rag_engine)
+    if rag_engine:
+        try:
+            result = await rag_engine.answer_question_async(**events_backend.chat_rag_arguments(user_message))
+            if result.get('answer'):
+                return APIResponse({"success": True, "answer": result['answer']})
+        except Exception as e:
+            logger.error(f"RAG engine error in web API: {e}")
+
+    # Fallback: Simple search
+    try:
+        return APIResponse({"success": True, "answer": await simple_search_answer(user_message)})
+    except Exception as e:
+        logger.error(f"Chat API error: {e}")
+        return APIResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def simple_search_answer(user_message):
+    """RAG yanıt veremediğinde basit arama (events_backend.search_events'in motor ile eşdeğeri)"""
+    params = events_backend.parse_message(user_message)
+    events = []
+    if events_backend.events_collection is not None:
+        query = events_backend.search_events_query(params)
+        events = await (events_collection.find(query).sort('date', 1).limit(events_backend.SEARCH_EVENTS_LIMIT)
+                        .to_list(length=events_backend.SEARCH_EVENTS_LIMIT))
+    return events_backend.format_events_message(events, params)
+
+
+async def chat_stream(request):
+    """Chat API'nin Server-Sent Events versiyonu - Flask /api/chat/stream ile aynı olaylar"""
+    user_message, error = events_backend.chat_message(await read_json(request))
+    if error:
+        return APIResponse({"success": False, "error": error}, status_code=400)
+
+    logger.info(f"Web chat stream API - message: {user_message}")
+    rag_engine = await run_blocking(events_backend.get_rag_engine)
+
+    async def generate():
+        sent = False
+        if rag_engine:
+            try:
+                async for chunk in rag_engine.answer_question_stream_async(
+                        **events_backend.chat_rag_arguments(user_message)):
+                    sent = True
+                    yield events_backend._sse({"delta": chunk})
+            except Exception as e:
+                logger.error(f"RAG engine error in web stream API: {e}")
+
+        if not sent:
+            try:
+                yield events_backend._sse({"delta": await simple_search_answer(user_message)})
+            except Exception as e:
+                logger.error(f"Chat stream API error: {e}")
+                yield events_backend._sse({"error": str(e)}, event='error')
+        yield events_backend._sse({}, event='done')
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def list_events(request):
+    unavailable = mongo_unavailable()
+    if unavailable:
+        return unavailable
+    async def build():
+        try:
+            query, limit, projection = events_backend.build_events_query(request.query_params)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
+        events = await (events_collection.find(query, projection).sort(events_backend.EVENTS_SORT)
+                        .limit(limit + 1).to_list(length=limit + 1))
+        return events_backend.events_page(events, limit)
+
+    try:
+        return await cached_response(request, build)
+    except Exception as e:
+        return APIResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def get_event(request):
+    unavailable = mongo_unavailable()
+    if unavailable:
+        return unavailable
+    async def build():
+        event = await events_collection.find_one({'_id': ObjectId(request.path_params['event_id'])},
+                                                 events_backend.EVENT_PROJECTION)
+        if not event:
+            return {"success": False, "error": "Event not found"}, 404
+        return {"success": True, "event": event}, 200
+
+    try:
+        return await cached_response(request, build)
+    except Exception as e:
+        return APIResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def distinct_values(request, field, key):
+    unavailable = mongo_unavailable()
+    if unavailable:
+        return unavailable
+    async def build():
+        return {"success": True, key: await events_collection.distinct(field)}, 200
+
+    try:
+        return await cached_response(request, build)
+    except Exception as e:
+        return APIResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def get_cities(request):
+    return await distinct_values(request, 'city', 'cities')
+
+
+async def get_categories(request):
+    return await distinct_values(request, 'category', 'categories')
+
+
+async def telegram_webhook(request):
+    """Telegram webhook endpoint'i - update aynı event loop'taki bot kuyruğuna eklenir"""
+    application = getattr(request.app.state, 'telegram', None)
+    if application is None or TELEGRAM_MODE != 'webhook':
+        return APIResponse({"ok": False, "error": "Telegram webhook is not active"}, status_code=503)
+
+    if not events_backend.telegram_webhook_authorized(request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')):
+        return APIResponse({"ok": False, "error": "Forbidden"}, status_code=403)
+
+    data = await read_json(request)
+    if not data:
+        return APIResponse({"ok": False, "error": "Invalid JSON"}, status_code=400)
+    await application.update_queue.put(Update.de_json(data, application.bot))
+    return APIResponse({"ok": True})
+
+
+# ============ UYGULAMA ============
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=ASGI_EXECUTOR_WORKERS, thread_name_prefix='asgi-cpu'))
+    # pymongo bağlantısı (RAG index'i, revizyon yazmaları, change stream) event loop'u bloklamadan kurulur
+    await run_blocking(events_backend.connect_mongo)
+
+    application = None
+    if TELEGRAM_BOT_TOKEN and (TELEGRAM_MODE != 'webhook' or events_backend.telegram_webhook_configured()):
+        # Aynı handler'lar, aynı event loop: bot update'leri sohbet istekleriyle birlikte işlenir
+        application = events_backend.build_telegram_application(webhook=TELEGRAM_MODE == 'webhook')
+        await application.initialize()
+        await application.start()
+        if TELEGRAM_MODE == 'webhook':
+            if TELEGRAM_WEBHOOK_URL:
+                await application.bot.set_webhook(
+                    url=TELEGRAM_WEBHOOK_URL.rstrip('/') + TELEGRAM_WEBHOOK_PATH,
+                    secret_token=TELEGRAM_WEBHOOK_SECRET,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            logger.info(f"✅ Telegram bot is receiving updates on {TELEGRAM_WEBHOOK_PATH} (ASGI)")
+        else:
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+            logger.info("✅ Telegram bot is polling for updates (ASGI)")
+    elif not TELEGRAM_BOT_TOKEN:
+        logger.warning("TELEGRAM_BOT_TOKEN not found, Telegram bot will not start")
+    app.state.telegram = application
+
+    try:
+        yield
+    finally:
+        if application is not None:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            await application.shutdown()
+        motor_client.close()
+
+
+routes = [
+    Route('/health', health, methods=['GET']),
+    Route('/api/chat', chat, methods=['POST']),
+    Route('/api/chat/stream', chat_stream, methods=['POST']),
+    Route('/api/events', list_events, methods=['GET']),
+    Route('/api/events/{event_id}', get_event, methods=['GET']),
+    Route('/api/cities', get_cities, methods=['GET']),
+    Route('/api/categories', get_categories, methods=['GET']),
+    Route(TELEGRAM_WEBHOOK_PATH, telegram_webhook, methods=['POST']),
+    # Geri kalanlar (POST/PUT/DELETE /api/events, /api/seed, web arayüzü) Flask handler'larıyla
+    Mount('/', WSGIMiddleware(events_backend.app, workers=ASGI_EXECUTOR_WORKERS)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
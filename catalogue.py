@@ -0,0 +1,222 @@
+"""
+Katalog Değişiklik Kaydı - Etkinlik ekleme/güncelleme/silme işlemlerini kaydeder
+Backend bu kayıtları okuyarak RAG index'ini tamamen yeniden kurmadan günceller
+
+Her yazma işlemi (API, scraper) değişen etkinlik ID'lerini yeni bir revizyon
+numarasıyla 'event_changes' koleksiyonuna yazar, sonra katalog revizyonunu o
+numaraya çeker. Revizyon hiçbir zaman kaydı yazılmamış bir değişikliği göstermez.
+"""
+
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError, OperationFailure
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CHANGES_COLLECTION = 'event_changes'
+META_COLLECTION = 'catalogue_meta'
+CATALOGUE_DOC_ID = 'catalogue'
+
+# Değişiklik kayıtları 7 gün saklanır (daha eski bir index tamamen yeniden kurulur)
+CHANGE_TTL_SECONDS = 7 * 24 * 3600
+
+# Eşzamanlı yazıcılar yüzünden oluşan kısa süreli boşluklar bu süre kadar beklenir
+GAP_GRACE_SECONDS = 60
+
+# Revizyon bellekte bu kadar saniye cache'lenir (change stream çalışıyorsa anında güncellenir)
+CATALOGUE_VERSION_TTL = float(os.getenv('CATALOGUE_VERSION_TTL', '5'))
+WATCH_RETRY_SECONDS = 30
+
+OP_UPSERT = 'upsert'
+OP_DELETE = 'delete'
+
+
+def ensure_indexes(db):
+    """Değişiklik koleksiyonu için index'leri oluştur"""
+    changes = db[CHANGES_COLLECTION]
+    try:
+        changes.create_index([("revision", 1)], unique=True)
+    except OperationFailure:
+        # Eski sürümün unique olmayan index'i: aynı anahtarla ikinci index kurulamaz
+        changes.drop_index("revision_1")
+        changes.create_index([("revision", 1)], unique=True)
+    changes.create_index([("ts", 1)], expireAfterSeconds=CHANGE_TTL_SECONDS)
+
+
+def current_revision(db):
+    """Katalogun güncel revizyon numarası (hiç yazma yapılmadıysa 0)"""
+    doc = db[META_COLLECTION].find_one({'_id': CATALOGUE_DOC_ID})
+    return doc.get('revision', 0) if doc else 0
+
+
+def _next_revision(db):
+    """Katalog revizyonundan ve en son değişiklik kaydından büyük ilk revizyon"""
+    latest = db[CHANGES_COLLECTION].find_one(sort=[('revision', -1)], projection={'revision': 1})
+    return max(current_revision(db), latest['revision'] if latest else 0) + 1
+
+
+def record_changes(db, event_ids, op):
+    """
+    Değişen etkinlikleri kaydet ve katalog revizyonunu artır
+
+    Önce değişiklik kaydı yazılır (revision alanındaki unique index aynı numarayı
+    iki yazıcıya vermez), sonra katalog revizyonu $max ile o numaraya çekilir.
+    Yazıcı arada ölürse kayıt bir sonraki yazmada okunur; revizyon kaydı
+    olmayan bir numaraya hiç ilerlemez.
+
+    Args:
+        db: MongoDB veritabanı
+        event_ids: Değişen etkinliklerin ID'leri
+        op: OP_UPSERT veya OP_DELETE
+
+    Returns:
+        int: Yeni revizyon numarası (değişiklik yoksa None)
+    """
+    event_ids = list(event_ids)
+    if not event_ids:
+        return None
+
+    while True:
+        revision = _next_revision(db)
+        try:
+            db[CHANGES_COLLECTION].insert_one({
+                'revision': revision,
+                'op': op,
+                'event_ids': event_ids,
+                'ts': datetime.now()
+            })
+            break
+        except DuplicateKeyError:
+            continue  # Eşzamanlı bir yazıcı bu numarayı aldı
+
+    db[META_COLLECTION].update_one(
+        {'_id': CATALOGUE_DOC_ID},
+        {'$max': {'revision': revision}},
+        upsert=True
+    )
+    return revision
+
+
+def fetch_changes(db, after_revision):
+    """
+    Verilen revizyondan sonraki değişiklikleri getir
+
+    Args:
+        db: MongoDB veritabanı
+        after_revision: Index'in en son uyguladığı revizyon
+
+    Returns:
+        (revision, upserted_ids, deleted_ids) tuple. Sadece kesintisiz revizyonlar
+        uygulanır; kayıtlar TTL ile silindiyse None döner ve index tamamen
+        yeniden kurulmalıdır.
+    """
+    docs = list(db[CHANGES_COLLECTION].find({'revision': {'$gt': after_revision}}).sort('revision', 1))
+
+    revision = after_revision
+    latest_op = {}
+    for doc in docs:
+        if doc['revision'] != revision + 1:
+            # Henüz yazılmamış bir revizyon olabilir; eskiyse kayıt silinmiştir
+            if revision == after_revision and doc['ts'] < datetime.now() - timedelta(seconds=GAP_GRACE_SECONDS):
+                logger.info(f"Değişiklik kaydında boşluk: {revision} -> {doc['revision']}")
+                return None
+            break
+        revision = doc['revision']
+        for event_id in doc['event_ids']:
+            # Aynı etkinlik birden fazla kez değiştiyse son işlem geçerli
+            latest_op.pop(event_id, None)
+            latest_op[event_id] = doc['op']
+
+    upserted = [event_id for event_id, op in latest_op.items() if op == OP_UPSERT]
+    deleted = [event_id for event_id, op in latest_op.items() if op == OP_DELETE]
+    return revision, upserted, deleted
+
+
+class RevisionCache:
+    """
+    Katalog revizyonunun süreç içi cache'i
+
+    Sohbet isteklerinin her birinde Mongo'ya gitmemek için revizyon TTL süresince
+    bellekten okunur. Change stream (replica set) varsa revizyon dokümanı izlenir ve
+    değişiklik anında görülür; standalone MongoDB'de sadece TTL kullanılır.
+    """
+
+    def __init__(self, db, ttl=None):
+        self.db = db
+        self.ttl = CATALOGUE_VERSION_TTL if ttl is None else ttl
+        self._revision = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._watching = False
+        self._watch_thread = None
+
+    def _set(self, revision):
+        self._revision = revision
+        self._fetched_at = time.monotonic()
+
+    def cached(self):
+        """Cache tazeyse revizyon, değilse None (Mongo'ya hiç gidilmez; async okuyucular için)"""
+        revision = self._revision
+        if revision is not None and (self._watching or time.monotonic() - self._fetched_at < self.ttl):
+            return revision
+        return None
+
+    def refresh(self, revision):
+        """Çağıranın okuduğu revizyonu cache'e yaz (TTL yeniden başlar)"""
+        with self._lock:
+            if self._revision is None or revision >= self._revision:
+                self._set(revision)
+
+    def get(self):
+        """Güncel revizyon (cache tazeyse Mongo'ya gidilmez)"""
+        revision = self.cached()
+        if revision is not None:
+            return revision
+        revision = self._revision
+
+        # Süresi dolan cache'i tek thread yeniler, diğerleri eski değerle devam eder
+        if not self._lock.acquire(blocking=revision is None):
+            return revision
+        try:
+            if self._revision is None or time.monotonic() - self._fetched_at >= self.ttl:
+                self._set(current_revision(self.db))
+            return self._revision
+        finally:
+            self._lock.release()
+
+    def advance(self, revision):
+        """Bu süreçteki bir yazmanın döndürdüğü revizyonu hemen uygula (TTL beklenmez)"""
+        with self._lock:
+            if self._revision is None or revision > self._revision:
+                self._set(revision)
+
+    def start_watcher(self):
+        """Revizyon dokümanını change stream ile izleyen arka plan thread'ini başlat"""
+        if self._watch_thread is None or not self._watch_thread.is_alive():
+            self._watch_thread = threading.Thread(target=self._watch, daemon=True)
+            self._watch_thread.start()
+
+    def _watch(self):
+        pipeline = [{'$match': {'documentKey._id': CATALOGUE_DOC_ID}}]
+        while True:
+            try:
+                with self.db[META_COLLECTION].watch(pipeline, full_document='updateLookup') as stream:
+                    self._set(current_revision(self.db))
+                    self._watching = True
+                    logger.info("👀 Katalog revizyonu change stream ile izleniyor")
+                    for change in stream:
+                        document = change.get('fullDocument') or {}
+                        if 'revision' in document:
+                            self._set(document['revision'])
+            except OperationFailure as e:
+                # Standalone MongoDB change stream desteklemez: TTL cache yeterli
+                logger.info(f"Change stream kullanılamıyor, revizyon {self.ttl:.0f}s TTL ile okunacak: {e}")
+                return
+            except Exception as e:
+                logger.warning(f"Change stream kesildi, {WATCH_RETRY_SECONDS}s sonra tekrar denenecek: {e}")
+                time.sleep(WATCH_RETRY_SECONDS)
+            finally:
+                self._watching = False
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from pymongo import MongoClient
 from datetime import datetime, timedelta
@@ -6,10 +6,23 @@ from bson import ObjectId
 import os
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 import asyncio
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Thread, Lock
+from collections import OrderedDict
+from urllib.parse import urlencode
+import base64
+import hashlib
+import hmac
+import itertools
+import json
 import logging
+import time
+import fcntl
+import catalogue
 
 load_dotenv()
 
@@ -28,8 +41,32 @@ CORS(app)
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
+# Akış yanıtında Telegram mesajı en fazla bu sıklıkta düzenlenir (Telegram edit limitleri)
+TELEGRAM_EDIT_INTERVAL = float(os.getenv('TELEGRAM_EDIT_INTERVAL', '1.0'))
+
+# Aynı anda işlenen Telegram update sayısı ve bloklayan işler (RAG, Gemini, Mongo) için thread sayısı
+TELEGRAM_CONCURRENT_UPDATES = int(os.getenv('TELEGRAM_CONCURRENT_UPDATES', '16'))
+TELEGRAM_RAG_WORKERS = int(os.getenv('TELEGRAM_RAG_WORKERS', '4'))
+_telegram_executor = ThreadPoolExecutor(max_workers=TELEGRAM_RAG_WORKERS, thread_name_prefix='telegram-rag')
+
+# polling: bot getUpdates ile mesaj çeker (geliştirme)
+# webhook: Telegram update'leri Flask route'una POST eder (production, birden fazla worker ile ölçeklenir)
+TELEGRAM_MODE = os.getenv('TELEGRAM_MODE', 'polling')
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')  # Örn: https://events.tugrul.app (boşsa webhook elle kurulur)
+TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram/webhook')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+# Bot'u bu modül kendi thread'inde başlatsın mı (ASGI sunucusu bot'u kendi event loop'unda çalıştırır)
+TELEGRAM_AUTOSTART = os.getenv('TELEGRAM_AUTOSTART', '1') == '1'
+
+async def _run_blocking(func, *args, **kwargs):
+    """Bloklayan çağrıyı Telegram havuzunda çalıştır (bot event loop'u diğer kullanıcılara hizmet etmeye devam eder)"""
+    return await asyncio.get_running_loop().run_in_executor(_telegram_executor, partial(func, *args, **kwargs))
+
 # Telegram bot thread (Gunicorn için - modül import edildiğinde başlat)
 _telegram_bot_thread = None
+# Webhook modunda update'lerin aktarıldığı uygulama ve event loop'u (bot hazır olunca atanır)
+_telegram_application = None
+_telegram_loop = None
 
 def start_telegram_bot_thread():
     """Telegram bot thread'ini başlat (Gunicorn için)"""
@@ -47,28 +84,57 @@ def start_telegram_bot_thread():
 # NOT: start_telegram_bot_thread() çağrısı dosyanın sonunda yapılacak
 # (tüm fonksiyonlar tanımlandıktan sonra)
 
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    # Test connection
-    client.server_info()
-    db = client['events_db']
-    events_collection = db['events']
-    
-    # Index oluştur
+# Bu modül import edilince MongoDB'ye bağlansın mı (ASGI sunucusu bağlantıyı event loop'u
+# bloklamadan lifespan'de kurar, change stream thread'i de orada başlar)
+MONGO_AUTOCONNECT = os.getenv('MONGO_AUTOCONNECT', '1') == '1'
+
+client = None
+db = None
+events_collection = None
+catalogue_revision = None
+
+def connect_mongo():
+    """
+    MongoDB'ye bağlan, index'leri oluştur ve katalog revizyonu izlemesini başlat
+    (bağlantı kurulamazsa db/events_collection None kalır, endpoint'ler 503 döner)
+    """
+    global client, db, events_collection, catalogue_revision
     try:
-        events_collection.create_index([("city", 1), ("date", 1), ("category", 1)])
+        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+        # Test connection
+        client.server_info()
+        db = client['events_db']
+        events_collection = db['events']
+        
+        # Index oluştur
+        try:
+            events_collection.create_index([("city", 1), ("date", 1), ("category", 1)])
+            # /api/events keyset sayfalama: (date, _id) sırası, şehir/kategori eşitlik filtreleriyle
+            events_collection.create_index([("date", 1), ("_id", 1)])
+            events_collection.create_index([("city", 1), ("date", 1), ("_id", 1)])
+            events_collection.create_index([("city", 1), ("category", 1), ("date", 1), ("_id", 1)])
+            catalogue.ensure_indexes(db)
+        except Exception as e:
+            logger.warning(f"Index creation warning: {e}")
+        
+        # Katalog revizyonu: sohbet isteklerinde Mongo'ya gitmeden index'in güncelliği kontrol edilir
+        catalogue_revision = catalogue.RevisionCache(db)
+        if os.getenv('CATALOGUE_CHANGE_STREAM', '1') == '1':
+            catalogue_revision.start_watcher()
+        
+        logger.info("✅ MongoDB connected successfully")
     except Exception as e:
-        logger.warning(f"Index creation warning: {e}")
-    
-    logger.info("✅ MongoDB connected successfully")
-except Exception as e:
-    logger.error(f"❌ MongoDB connection failed: {e}")
-    logger.error("Please make sure MongoDB is running or update MONGO_URI in .env")
-    logger.error("For local MongoDB: brew services start mongodb-community")
-    logger.error("Or use MongoDB Atlas and update MONGO_URI in .env")
-    # Create dummy objects to prevent crashes
-    db = None
-    events_collection = None
+        logger.error(f"❌ MongoDB connection failed: {e}")
+        logger.error("Please make sure MongoDB is running or update MONGO_URI in .env")
+        logger.error("For local MongoDB: brew services start mongodb-community")
+        logger.error("Or use MongoDB Atlas and update MONGO_URI in .env")
+        # Create dummy objects to prevent crashes
+        db = None
+        events_collection = None
+        catalogue_revision = None
+
+if MONGO_AUTOCONNECT:
+    connect_mongo()
 
 # JSON serialization için helper
 from flask.json.provider import DefaultJSONProvider
@@ -90,8 +156,184 @@ def check_mongodb():
         return False, jsonify({"success": False, "error": "MongoDB not connected. Please check your MongoDB connection."}), 503
     return True, None, None
 
+# Okuma endpoint'lerinin (/api/events, /api/cities, /api/categories) yanıt cache'i
+# Yanıtlar katalog revizyonuna bağlıdır: scrape'ler arasında Mongo'ya gidilmez
+RESPONSE_CACHE_BYTES = int(os.getenv('RESPONSE_CACHE_BYTES', str(32 * 1024 * 1024)))  # 0: kapalı (ETag yine gönderilir)
+RESPONSE_CACHE_MAX_BODY = int(os.getenv('RESPONSE_CACHE_MAX_BODY', str(1024 * 1024)))  # Daha büyük gövdeler cache'lenmez
+RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', '60'))  # Cache-Control max-age (saniye)
+
+class ResponseCache:
+    """
+    Hazır JSON yanıt gövdelerinin toplam boyutla sınırlı LRU cache'i (thread-safe)
+
+    Anahtar (route + normalize edilmiş query string, katalog revizyonu) olduğu için
+    scraper veya başka bir worker revizyonu artırınca eski gövdeler artık eşleşmez
+    ve LRU ile düşer. Bu süreçteki yazmalar cache'i ayrıca hemen temizler.
+    Sınır gövde sayısı değil bayttır: limit=500 gibi büyük sayfalar birkaç tanesiyle
+    belleği doldurmasın diye max_body'den büyük gövdeler hiç cache'lenmez.
+    """
+
+    def __init__(self, max_bytes, max_body=RESPONSE_CACHE_MAX_BODY):
+        self.max_bytes = max_bytes
+        self.max_body = min(max_body, max_bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.skipped = 0  # Çok büyük olduğu için cache'lenmeyen gövdeler
+        self._items = OrderedDict()  # (key, revision) -> body
+        self._lock = Lock()
+
+    def get(self, key, revision):
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            body = self._items.get((key, revision))
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end((key, revision))
+            self.hits += 1
+            return body
+
+    def put(self, key, revision, body):
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            if len(body) > self.max_body:
+                self.skipped += 1
+                return
+            old = self._items.pop((key, revision), None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._items[(key, revision)] = body
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'max_body': self.max_body,
+                'max_age': RESPONSE_CACHE_MAX_AGE,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'skipped': self.skipped,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+
+def response_cache_key(path, args):
+    """Route + sıralanmış query parametreleri (?b=2&a=1 ile ?a=1&b=2 aynı anahtar)"""
+    return f"{path}?{urlencode(sorted(args))}"
+
+def response_versioned(args):
+    """Yanıt tamamen katalog revizyonuyla mı belirlenir (fields= EVENT_UNVERSIONED_FIELDS'tan birini istemiyorsa)"""
+    requested = (field.strip() for field in args.get('fields', '').split(','))
+    return not any(field in EVENT_UNVERSIONED_FIELDS for field in requested)
+
+def response_cacheable(args):
+    """
+    Yanıt gövdesi cache'e yazılır mı
+
+    cursor'lı (2. ve sonraki) sayfalar cache'lenmez: her token ayrı bir anahtar olduğu
+    için derin sayfalar LRU'da sık okunan ilk sayfaları düşürür. ETag yine gönderilir.
+    """
+    return 'cursor' not in args
+
+def response_etag(key, revision):
+    """Strong ETag: katalog revizyonu + anahtar özeti (revizyon aynıysa yanıt da aynıdır)"""
+    return f"{revision}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+def cached_catalogue_revision():
+    """Yanıt cache'i için katalog revizyonu (Mongo yoksa veya okunamazsa None: cache atlanır)"""
+    if catalogue_revision is None:
+        return None
+    try:
+        return catalogue_revision.get()
+    except Exception as e:
+        logger.warning(f"Katalog revizyonu okunamadı, yanıt cache'i atlanıyor: {e}")
+        return None
+
+def record_catalogue_changes(event_ids, op):
+    """Yazmayı kataloga kaydet; bu süreçteki revizyon ve yanıt cache'i hemen güncellenir"""
+    revision = catalogue.record_changes(db, event_ids, op)
+    if revision is not None and catalogue_revision is not None:
+        catalogue_revision.advance(revision)
+    response_cache.clear()
+    return revision
+
+def cached_response(build):
+    """
+    Okuma endpoint'i yanıtını revizyona bağlı cache ve ETag ile döndür
+
+    Args:
+        build: () -> (payload, status); sadece cache'te yoksa çağrılır, 200 yanıtlar
+            (response_cacheable ve boyut sınırı izin verirse) cache'lenir
+
+    If-None-Match güncel ETag'i içeriyorsa gövde hazırlanmadan 304 döner. Revizyona
+    bağlı olmayan yanıtlar (response_versioned) her seferinde hazırlanır ve ETag almaz.
+    """
+    revision = cached_catalogue_revision() if response_versioned(request.args) else None
+    if revision is None:
+        payload, status = build()
+        return jsonify(payload), status
+    
+    key = response_cache_key(request.path, request.args.items(multi=True))
+    etag = response_etag(key, revision)
+    if request.if_none_match.contains(etag):
+        response_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        body = response_cache.get(key, revision)
+        if body is None:
+            payload, status = build()
+            if status != 200:
+                return jsonify(payload), status
+            body = app.json.dumps(payload).encode('utf-8')
+            if response_cacheable(request.args):
+                response_cache.put(key, revision, body)
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={RESPONSE_CACHE_MAX_AGE}'
+    return response
+
 # ============ FLASK API ENDPOINTS ============
 
+def chat_message(data):
+    """
+    Sohbet isteği gövdesinden kullanıcı mesajı (Flask ve ASGI sunucusu ortak)
+    
+    Returns:
+        (message, error) tuple'ı; gövde geçersizse message None, error 400 mesajıdır
+    """
+    if not data:
+        return None, "Invalid JSON"
+    message = data.get('message', '')
+    if not message:
+        return None, "Message is required"
+    return message, None
+
+def chat_rag_arguments(user_message):
+    """Web sohbetinin RAG engine'e verdiği sorgu argümanları (Flask ve ASGI sunucusu ortak)"""
+    return dict(query=user_message, city_filter='antalya', top_k=5, **parse_rag_filters(user_message))
+
 # Chat API endpoint for web interface (MUST be before catch-all route)
 @app.route('/api/chat', methods=['POST', 'OPTIONS'])
 def chat_api():
@@ -105,14 +347,9 @@ def chat_api():
         return response
     
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"success": False, "error": "Invalid JSON"}), 400
-            
-        user_message = data.get('message', '')
-        
-        if not user_message:
-            return jsonify({"success": False, "error": "Message is required"}), 400
+        user_message, error = chat_message(request.get_json(silent=True))
+        if error:
+            return jsonify({"success": False, "error": error}), 400
         
         logger.info(f"Web chat API - message: {user_message}")
         
@@ -121,11 +358,7 @@ def chat_api():
         
         if rag_engine:
             try:
-                result = rag_engine.answer_question(
-                    query=user_message,
-                    city_filter='antalya',
-                    top_k=5
-                )
+                result = rag_engine.answer_question(**chat_rag_arguments(user_message))
                 answer = result.get('answer', '')
                 if answer:
                     response = jsonify({"success": True, "answer": answer})
@@ -153,6 +386,58 @@ def chat_api():
         response.headers.add('Access-Control-Allow-Origin', '*')
         return response, 500
 
+def _sse(data, event=None):
+    """Tek bir Server-Sent Events mesajı"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST', 'OPTIONS'])
+def chat_stream_api():
+    """Chat API'nin Server-Sent Events versiyonu - yanıt parçaları Gemini'den geldikçe gönderilir"""
+    # Handle CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        return response
+    
+    user_message, error = chat_message(request.get_json(silent=True))
+    if error:
+        return jsonify({"success": False, "error": error}), 400
+    
+    logger.info(f"Web chat stream API - message: {user_message}")
+    started = time.perf_counter()
+    rag_engine = get_rag_engine()
+    
+    def generate():
+        sent = False
+        if rag_engine:
+            try:
+                for chunk in rag_engine.answer_question_stream(**chat_rag_arguments(user_message)):
+                    if not sent:
+                        logger.info(f"⏱️ Chat stream ilk parça: {(time.perf_counter() - started) * 1000:.0f} ms")
+                    sent = True
+                    yield _sse({"delta": chunk})
+            except Exception as e:
+                logger.error(f"RAG engine error in web stream API: {e}")
+        
+        if not sent:
+            # Fallback: Simple search
+            try:
+                params = parse_message(user_message)
+                yield _sse({"delta": format_events_message(search_events(params), params)})
+            except Exception as e:
+                logger.error(f"Chat stream API error: {e}")
+                yield _sse({"error": str(e)}, event='error')
+        yield _sse({}, event='done')
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx parçaları tamponlamasın
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
 # Web interface routes (AFTER API routes)
 @app.route('/')
 def index():
@@ -178,9 +463,185 @@ def serve_static(path):
     else:
         return jsonify({"error": "Not found"}), 404
 
+def health_status():
+    """/health yanıtı (Flask ve ASGI sunucusu ortak)"""
+    from rag_engine import answer_cache_stats, gemini_stats
+    return {"status": "healthy", "timestamp": datetime.now().isoformat(),
+            "rag": rag_index_status(), "answer_cache": answer_cache_stats(), "gemini": gemini_stats(),
+            "response_cache": response_cache.stats()}
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    return jsonify(health_status())
+
+# /api/events sayfa boyutu üst sınırı ve fields= ile istenebilecek alanlar
+EVENTS_MAX_LIMIT = int(os.getenv('EVENTS_MAX_LIMIT', '500'))
+# Revizyon artırılmadan güncellenen alanlar (scraper'ın görülme zamanı): varsayılan yanıtlara
+# girmez, fields= ile istenirse yanıt cache'lenmez ve ETag almaz (aynı ETag farklı dokümanları gösterirdi)
+EVENT_UNVERSIONED_FIELDS = ('last_scraped',)
+EVENT_FIELDS = ('title', 'description', 'city', 'category', 'date', 'time', 'venue', 'address',
+                'price', 'url', 'image_url', 'organizer', 'tags', 'source', 'created_at', 'updated_at',
+                *EVENT_UNVERSIONED_FIELDS)
+EVENT_PROJECTION = dict.fromkeys(EVENT_UNVERSIONED_FIELDS, 0)
+EVENTS_SORT = [('date', 1), ('_id', 1)]
+# 'date' alanının tipleri, Mongo'nun sıralamadaki tip sırasıyla (eksik alan null gibi sıralanır)
+EVENTS_CURSOR_TYPES = ('null', 'number', 'string', 'date')
+
+def _cursor_type(value):
+    """date değeri -> EVENTS_CURSOR_TYPES'tan biri (beklenmeyen tipler string sayılır)"""
+    if value is None:
+        return 'null'
+    if isinstance(value, datetime):
+        return 'date'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 'number'
+    return 'string'
+
+def encode_events_cursor(event):
+    """Sayfanın son etkinliği -> opak 'next' token'ı ((date tipi, date, _id) konumu)"""
+    date = event.get('date')
+    date_type = _cursor_type(date)
+    if date_type == 'date':
+        date = date.isoformat()
+    elif date_type == 'string':
+        date = str(date)
+    raw = json.dumps([date_type, date, str(event['_id'])]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_events_cursor(token):
+    """'next' token'ı -> (date tipi, date, ObjectId); geçersizse ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        date_type, date, event_id = json.loads(raw)
+        if date_type == 'date':
+            date = datetime.fromisoformat(date)
+        if date_type not in EVENTS_CURSOR_TYPES or _cursor_type(date) != date_type:
+            raise ValueError(date_type)
+        return date_type, date, ObjectId(event_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def events_after_cursor(date_type, date, event_id):
+    """
+    Sıralamada (date, _id) konumundan sonra gelen etkinliklerin sorgusu
+    
+    Mongo $gt sadece aynı tipteki değerleri karşılaştırır: sıralamada sonra gelen
+    tipler (null -> sayı -> string -> tarih) ayrıca $type ile eklenir. null/eksik
+    tarih için $gt kullanılmaz, sadece _id ile ilerlenir.
+    """
+    if date_type == 'null':
+        conditions = [{'date': None, '_id': {'$gt': event_id}}]
+    else:
+        conditions = [{'date': {'$gt': date}}, {'date': date, '_id': {'$gt': event_id}}]
+    later = list(EVENTS_CURSOR_TYPES[EVENTS_CURSOR_TYPES.index(date_type) + 1:])
+    if later:
+        conditions.append({'date': {'$type': later}})
+    return {'$or': conditions}
+
+def build_events_query(args):
+    """
+    Etkinlik listesi parametreleri (query string) -> (Mongo sorgusu, limit, projection)
+    
+    cursor: önceki sayfanın 'next' token'ı. Sayfalama (date, _id) üzerinde keyset ile
+    yapılır; skip kullanılmadığı için derin sayfalar ilk sayfa kadar ucuzdur.
+    fields: virgülle ayrılmış alan listesi (_id ve date her zaman döner); verilmezse
+    EVENT_UNVERSIONED_FIELDS dışındaki tüm alanlar döner
+    
+    Raises:
+        ValueError: Geçersiz limit (1..EVENTS_MAX_LIMIT dışı), cursor veya bilinmeyen alan
+    """
+    city = args.get('city', '').lower()
+    category = args.get('category', 'all').lower()
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    limit = int(args.get('limit', 50))
+    if not 1 <= limit <= EVENTS_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {EVENTS_MAX_LIMIT}")
+    
+    query = {}
+    if city and city != 'all':
+        query['city'] = city
+    if category and category != 'all':
+        query['category'] = category
+    
+    if start_date or end_date:
+        date_query = {}
+        if start_date:
+            date_query['$gte'] = start_date
+        if end_date:
+            date_query['$lte'] = end_date
+        if date_query:
+            query['date'] = date_query
+    
+    cursor = args.get('cursor')
+    if cursor:
+        after = events_after_cursor(*decode_events_cursor(cursor))
+        query = {'$and': [query, after]} if query else after
+    
+    projection = EVENT_PROJECTION
+    fields = args.get('fields')
+    if fields:
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in EVENT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        projection = dict.fromkeys(requested, 1)
+        projection['date'] = 1  # Sonraki sayfanın cursor'ı için
+    return query, limit, projection
+
+def events_page(events, limit):
+    """
+    limit + 1 sonuçtan /api/events yanıtı (Flask ve ASGI sunucusu ortak)
+    
+    Returns:
+        (payload, status) tuple'ı
+    """
+    events, next_cursor = paginate_events(events, limit)
+    for event in events:
+        event['_id'] = str(event['_id'])
+    return {"success": True, "count": len(events), "events": events, "next": next_cursor}, 200
+
+def paginate_events(events, limit):
+    """
+    limit + 1 sonuçtan sayfayı ve 'next' token'ını ayır
+    
+    Returns:
+        (events, next_cursor) tuple'ı; son sayfada next_cursor None
+    """
+    if len(events) <= limit:
+        return events, None
+    events = events[:limit]
+    return events, encode_events_cursor(events[-1])
+
+def new_event_document(data):
+    """
+    API'den gelen veriden etkinlik dokümanı oluştur
+    
+    Returns:
+        (event, error) tuple'ı; zorunlu alan eksikse event None, error mesajdır
+    """
+    required_fields = ['title', 'city', 'date', 'category']
+    for field in required_fields:
+        if field not in data:
+            return None, f"Missing field: {field}"
+    
+    return {
+        'title': data['title'],
+        'description': data.get('description', ''),
+        'city': data['city'].lower(),
+        'category': data['category'].lower(),
+        'date': data['date'],
+        'time': data.get('time', ''),
+        'venue': data.get('venue', ''),
+        'address': data.get('address', ''),
+        'price': data.get('price', 'Ücretsiz'),
+        'url': data.get('url', ''),
+        'image_url': data.get('image_url', ''),
+        'organizer': data.get('organizer', ''),
+        'tags': data.get('tags', []),
+        'created_at': datetime.now(),
+        'updated_at': datetime.now()
+    }, None
 
 @app.route('/api/events', methods=['GET'])
 def get_events():
@@ -188,33 +649,17 @@ def get_events():
         if events_collection is None:
             return jsonify({"success": False, "error": "MongoDB not connected"}), 503
         
-        city = request.args.get('city', '').lower()
-        category = request.args.get('category', 'all').lower()
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        limit = int(request.args.get('limit', 50))
-        
-        query = {}
-        if city and city != 'all':
-            query['city'] = city
-        if category and category != 'all':
-            query['category'] = category
-        
-        if start_date or end_date:
-            date_query = {}
-            if start_date:
-                date_query['$gte'] = start_date
-            if end_date:
-                date_query['$lte'] = end_date
-            if date_query:
-                query['date'] = date_query
-        
-        events = list(events_collection.find(query).sort('date', 1).limit(limit))
-        
-        for event in events:
-            event['_id'] = str(event['_id'])
+        def build():
+            try:
+                query, limit, projection = build_events_query(request.args)
+            except ValueError as e:
+                return {"success": False, "error": str(e)}, 400
+            
+            # Bir fazlası okunur: varsa sonraki sayfa vardır
+            events = list(events_collection.find(query, projection).sort(EVENTS_SORT).limit(limit + 1))
+            return events_page(events, limit)
         
-        return jsonify({"success": True, "count": len(events), "events": events})
+        return cached_response(build)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -225,31 +670,13 @@ def create_event():
         if not is_connected:
             return error_response, status_code
         
-        data = request.get_json()
-        required_fields = ['title', 'city', 'date', 'category']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"success": False, "error": f"Missing field: {field}"}), 400
-        
-        event = {
-            'title': data['title'],
-            'description': data.get('description', ''),
-            'city': data['city'].lower(),
-            'category': data['category'].lower(),
-            'date': data['date'],
-            'time': data.get('time', ''),
-            'venue': data.get('venue', ''),
-            'address': data.get('address', ''),
-            'price': data.get('price', 'Ücretsiz'),
-            'url': data.get('url', ''),
-            'image_url': data.get('image_url', ''),
-            'organizer': data.get('organizer', ''),
-            'tags': data.get('tags', []),
-            'created_at': datetime.now(),
-            'updated_at': datetime.now()
-        }
+        event, error = new_event_document(request.get_json())
+        if error:
+            return jsonify({"success": False, "error": error}), 400
         
         result = events_collection.insert_one(event)
+        record_catalogue_changes([result.inserted_id], catalogue.OP_UPSERT)
+        sync_rag_engine()
         event['_id'] = str(result.inserted_id)
         
         return jsonify({"success": True, "event": event}), 201
@@ -263,11 +690,14 @@ def get_event(event_id):
         if not is_connected:
             return error_response, status_code
         
-        event = events_collection.find_one({'_id': ObjectId(event_id)})
-        if not event:
-            return jsonify({"success": False, "error": "Event not found"}), 404
-        event['_id'] = str(event['_id'])
-        return jsonify({"success": True, "event": event})
+        def build():
+            event = events_collection.find_one({'_id': ObjectId(event_id)}, EVENT_PROJECTION)
+            if not event:
+                return {"success": False, "error": "Event not found"}, 404
+            event['_id'] = str(event['_id'])
+            return {"success": True, "event": event}, 200
+        
+        return cached_response(build)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -283,6 +713,8 @@ def update_event(event_id):
         result = events_collection.update_one({'_id': ObjectId(event_id)}, {'$set': data})
         if result.matched_count == 0:
             return jsonify({"success": False, "error": "Event not found"}), 404
+        record_catalogue_changes([ObjectId(event_id)], catalogue.OP_UPSERT)
+        sync_rag_engine()
         return jsonify({"success": True, "message": "Event updated"})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -297,6 +729,8 @@ def delete_event(event_id):
         result = events_collection.delete_one({'_id': ObjectId(event_id)})
         if result.deleted_count == 0:
             return jsonify({"success": False, "error": "Event not found"}), 404
+        record_catalogue_changes([ObjectId(event_id)], catalogue.OP_DELETE)
+        sync_rag_engine()
         return jsonify({"success": True, "message": "Event deleted"})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -308,8 +742,7 @@ def get_cities():
         if not is_connected:
             return error_response, status_code
         
-        cities = events_collection.distinct('city')
-        return jsonify({"success": True, "cities": cities})
+        return cached_response(lambda: ({"success": True, "cities": events_collection.distinct('city')}, 200))
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -320,8 +753,7 @@ def get_categories():
         if not is_connected:
             return error_response, status_code
         
-        categories = events_collection.distinct('category')
-        return jsonify({"success": True, "categories": categories})
+        return cached_response(lambda: ({"success": True, "categories": events_collection.distinct('category')}, 200))
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -332,7 +764,9 @@ def seed_database():
         if not is_connected:
             return error_response, status_code
         
+        old_ids = [doc['_id'] for doc in events_collection.find({}, {'_id': 1})]
         events_collection.delete_many({})
+        record_catalogue_changes(old_ids, catalogue.OP_DELETE)
         sample_events = [
             {
                 'title': 'Rock Konseri - Duman',
@@ -415,7 +849,9 @@ def seed_database():
                 'updated_at': datetime.now()
             }
         ]
-        events_collection.insert_many(sample_events)
+        result = events_collection.insert_many(sample_events)
+        record_catalogue_changes(result.inserted_ids, catalogue.OP_UPSERT)
+        sync_rag_engine()
         return jsonify({"success": True, "message": f"{len(sample_events)} events created"})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -545,12 +981,24 @@ def parse_message(text):
         'end_date': end_date
     }
 
-def search_events(params):
-    """Veritabanından etkinlik arar - Sadece Antalya için"""
-    if events_collection is None:
-        logger.warning("MongoDB not connected - cannot search events")
-        return []
+def parse_rag_filters(text):
+    """
+    RAG araması için kategori ve tarih filtrelerini çıkar
+    Sorguda tarih yoksa sadece bugünden sonraki etkinlikler aranır
+    """
+    category = parse_message(text)['category']
+    start_date, end_date = parse_turkish_date_query(text)
     
+    return {
+        'category_filter': None if category == 'all' else category,
+        'date_range': (start_date or datetime.now().strftime('%Y-%m-%d'), end_date)
+    }
+
+# Basit aramanın (RAG yanıt veremediğinde) döndürdüğü en fazla etkinlik
+SEARCH_EVENTS_LIMIT = 20
+
+def search_events_query(params):
+    """parse_message parametreleri -> Mongo sorgusu (Flask ve ASGI sunucusu ortak)"""
     # Her zaman Antalya için ara
     query = {'city': 'antalya'}
     
@@ -562,8 +1010,16 @@ def search_events(params):
     
     # Debug logging
     logger.info(f"Search query: {query}")
+    return query
+
+def search_events(params):
+    """Veritabanından etkinlik arar - Sadece Antalya için"""
+    if events_collection is None:
+        logger.warning("MongoDB not connected - cannot search events")
+        return []
     
-    events = list(events_collection.find(query).sort('date', 1).limit(20))
+    query = search_events_query(params)
+    events = list(events_collection.find(query).sort('date', 1).limit(SEARCH_EVENTS_LIMIT))
     logger.info(f"Found {len(events)} events matching query")
     
     return events
@@ -658,21 +1114,121 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
 # RAG Engine (lazy initialization)
-_rag_engine = None
-_rag_events_cache = None
+# Aktif index durumu tek bir dict referansında tutulur; delta'lar ve tam rebuild
+# tek bir arka plan worker'ında yapılır, istekler o sırada mevcut index'i kullanır.
+# {'engine', 'revision', 'version', 'build_seconds', 'built_at'}
+_rag_state = None
+_rag_version_counter = itertools.count(1)
+_rag_update_thread = None
+_rag_update_lock = Lock()
+_rag_init_lock = Lock()  # Single-flight: ilk kurulumu tek thread yapar, diğerleri bekler
+_rag_sync_lock = Lock()  # Delta'ları aynı anda tek thread uygular
 
-def get_rag_engine():
-    """Get or create RAG engine instance (lazy loading)"""
-    global _rag_engine, _rag_events_cache
+# Bu süreyi aşan index kurulumları uyarı olarak loglanır (alarm için /health'te de görünür)
+RAG_SLOW_BUILD_SECONDS = float(os.getenv('RAG_SLOW_BUILD_SECONDS', '60'))
+# Revizyon ilerlemiş ama değişiklik kaydı okunamıyorsa (yazıcı henüz yazmadı veya öldü)
+# 1, 2, 4... saniye beklenir; bu kadar denemeden sonra index tamamen yeniden kurulur
+RAG_DELTA_RETRIES = int(os.getenv('RAG_DELTA_RETRIES', '6'))
+
+def _new_rag_state(engine, revision, started):
+    """Yeni kurulan/yüklenen engine için index durumu oluştur"""
+    engine.catalogue_revision = revision  # Yanıt cache anahtarı: revizyon değişince eski yanıtlar eşleşmez
+    return {
+        'engine': engine,
+        'revision': revision,  # Index'e uygulanmış son katalog revizyonu
+        'version': next(_rag_version_counter),
+        'build_seconds': round(time.monotonic() - started, 3),
+        'built_at': datetime.now().isoformat()
+    }
+
+def _apply_rag_changes(state):
+    """
+    Katalog değişiklik kaydındaki delta'ları verilen index durumuna uygula
+    (sadece değişen etkinlikler encode edilir, engine yeniden kurulmaz)
     
-    if events_collection is None:
+    Returns: True - index güncel, False - tam rebuild gerekli
+    """
+    try:
+        changes = catalogue.fetch_changes(db, state['revision'])
+        if changes is None:
+            return False
+        
+        revision, upserted_ids, deleted_ids = changes
+        if revision == state['revision']:
+            return True
+        
+        retriever = state['engine'].retriever
+        if upserted_ids:
+            docs = list(events_collection.find({'_id': {'$in': upserted_ids}}))
+            antalya_docs = [doc for doc in docs if doc.get('city') == 'antalya']
+            found_ids = {doc['_id'] for doc in antalya_docs}
+            # Şehri değişen veya bu arada silinen etkinlikler index'ten çıkarılır
+            deleted_ids = deleted_ids + [event_id for event_id in upserted_ids if event_id not in found_ids]
+            retriever.upsert(antalya_docs)
+        if deleted_ids:
+            retriever.remove(deleted_ids)
+        
+        state['revision'] = revision
+        state['engine'].catalogue_revision = revision
+        logger.info(f"🔄 RAG index revizyon {revision}'e güncellendi")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to apply RAG index changes: {e}")
+        return False
+
+def sync_rag_engine():
+    """Katalog değişikliklerini aktif RAG index'ine arka planda uygula (yazma isteği beklemez)"""
+    if _rag_state is None or events_collection is None:
+        return
+    _schedule_rag_update()
+
+def _load_rag_artifact():
+    """
+    Diskteki RAG index artifact'ini yükle ve sonraki değişiklikleri delta olarak uygula
+    (yeniden encode etmeden, mmap ile worker'lar arasında paylaşılan index)
+    
+    Returns: Index durumu veya artifact yoksa/eskiyse None
+    """
+    started = time.monotonic()
+    from rag_retriever import FAISSRetriever
+    loaded = FAISSRetriever.load()
+    if loaded is None:
+        return None
+    
+    retriever, manifest = loaded
+    from rag_engine import RAGEngine
+    state = _new_rag_state(RAGEngine(None, retriever=retriever), manifest['revision'], started)
+    if not _apply_rag_changes(state):
         return None
+    return state
+
+def _build_rag_state(use_artifact=True):
+    """
+    RAG index'ini kur (önce diskteki artifact denenir, yoksa tüm katalog encode edilir)
+    Aktif durumu değiştirmez; çağıran tek atamayla yerine koyar.
     
-    # Check if we need to rebuild (events changed or first time)
-    current_count = events_collection.count_documents({})
+    Args:
+        use_artifact: False ise artifact atlanır (delta'larla güncellenemeyen index için)
     
-    if _rag_engine is None or _rag_events_cache != current_count:
+    Returns: Index durumu veya etkinlik yoksa None
+    """
+    from rag_retriever import RAG_INDEX_DIR
+    os.makedirs(RAG_INDEX_DIR, exist_ok=True)
+    # Aynı anda başlayan worker'lardan sadece biri index kurar, diğerleri onun artifact'ini yükler
+    with open(os.path.join(RAG_INDEX_DIR, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
         try:
+            try:
+                state = _load_rag_artifact() if use_artifact else None
+                if state is not None:
+                    return state
+            except Exception as e:
+                logger.warning(f"RAG index artifact kullanılamadı: {e}")
+            
+            started = time.monotonic()
+            # Revizyonu etkinliklerden önce oku: sonraki değişiklikler delta olarak uygulanır
+            revision = catalogue.current_revision(db)
+            
             # Get all Antalya events from database
             all_events = list(events_collection.find({'city': 'antalya'}))
             
@@ -682,16 +1238,162 @@ def get_rag_engine():
             
             logger.info(f"🔄 Initializing RAG engine with {len(all_events)} events...")
             from rag_engine import RAGEngine
-            _rag_engine = RAGEngine(all_events)
-            _rag_events_cache = current_count
-            logger.info("✅ RAG engine initialized")
-        except Exception as e:
-            logger.error(f"Failed to initialize RAG engine: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return None
+            state = _new_rag_state(RAGEngine(all_events), revision, started)
+            
+            try:
+                state['engine'].retriever.save(revision=revision)
+            except Exception as e:
+                logger.warning(f"RAG index artifact kaydedilemedi: {e}")
+            return state
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _activate_rag_state(state):
+    """Yeni index durumunu tek referans atamasıyla devreye al"""
+    global _rag_state
+    _rag_state = state
+    log = logger.warning if state['build_seconds'] > RAG_SLOW_BUILD_SECONDS else logger.info
+    log(f"✅ RAG index v{state['version']} devrede (revizyon {state['revision']}, "
+        f"kurulum {state['build_seconds']:.1f}s)")
+
+def _rebuild_rag_engine():
+    """Arka plan worker'ı: yeni index'i istek yolunun dışında kurup değiştir"""
+    try:
+        state = _build_rag_state(use_artifact=False)
+        if state is not None:
+            _activate_rag_state(state)
+    except Exception as e:
+        logger.error(f"Background RAG rebuild failed: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+
+def _update_rag_engine():
+    """
+    Arka plan worker'ı: değişiklik kaydındaki delta'ları aktif index'e uygula,
+    uygulanamazsa index'i yeniden kur (değişen etkinliklerin okunması ve encode'u istek yolunda yapılmaz)
+    """
+    stalled = 0
+    while True:
+        state = _rag_state
+        if state is None:
+            return
+        applied_revision = state['revision']
+        with _rag_sync_lock:
+            applied = _apply_rag_changes(state)
+        if applied and state['revision'] == applied_revision and stalled >= RAG_DELTA_RETRIES:
+            logger.warning(f"Revizyon {catalogue_revision.get()} için değişiklik kaydı bulunamadı "
+                           f"(index revizyon {applied_revision})")
+            applied = False
+        if not applied:
+            logger.info("🔄 RAG index arka planda yeniden kuruluyor (istekler mevcut index'le devam ediyor)")
+            _rebuild_rag_engine()
+            return
+        # Uygulama sırasında yeni değişiklik geldiyse onlar da bu worker'da uygulanır
+        if catalogue_revision is None or catalogue_revision.get() <= state['revision']:
+            return
+        if state['revision'] == applied_revision:
+            # İlerleme yok: kayıt henüz yazılmamış olabilir, Mongo'yu döngüde yorma
+            time.sleep(2 ** stalled)
+            stalled += 1
+        else:
+            stalled = 0
+
+def _schedule_rag_update():
+    """Arka planda delta/rebuild worker'ını başlat (zaten çalışıyorsa tekrar başlatılmaz)"""
+    global _rag_update_thread
+    with _rag_update_lock:
+        if _rag_update_thread is not None and _rag_update_thread.is_alive():
+            return
+        _rag_update_thread = Thread(target=_update_rag_engine, daemon=True)
+        _rag_update_thread.start()
+
+def rag_index_status():
+    """Aktif RAG index'inin versiyonu ve kurulum süresi (/health için)"""
+    state = _rag_state
+    update_thread = _rag_update_thread
+    status = {'ready': state is not None,
+              'rebuilding': update_thread is not None and update_thread.is_alive()}
+    if state is not None:
+        status.update({key: state[key] for key in ('version', 'revision', 'build_seconds', 'built_at')})
+        status['slow_build'] = state['build_seconds'] > RAG_SLOW_BUILD_SECONDS
+    return status
+
+def get_rag_engine():
+    """Get or create RAG engine instance (lazy loading)"""
+    if events_collection is None:
+        return None
+    
+    state = _rag_state
+    if state is None:
+        # İlk istek: servis edilecek eski bir index yok. Sadece bir thread kurar,
+        # aynı anda gelen diğer istekler bekleyip onun sonucunu kullanır
+        with _rag_init_lock:
+            state = _rag_state
+            if state is None:
+                try:
+                    state = _build_rag_state()
+                    if state is None:
+                        return None
+                    _activate_rag_state(state)
+                except Exception as e:
+                    logger.error(f"Failed to initialize RAG engine: {e}")
+                    import traceback
+                    logger.error(traceback.format_exc())
+                    return None
+        return state['engine']
+    
+    # Katalog değişti mi? (revizyon bellekte cache'li, normalde Mongo'ya gidilmez)
+    # Delta'lar (olmazsa tam rebuild) arka planda uygulanır; bu istek mevcut index'le cevaplanır
+    if catalogue_revision.get() > state['revision']:
+        _schedule_rag_update()
     
-    return _rag_engine
+    return state['engine']
+
+async def _edit_text(message, text, **kwargs):
+    """Mesajı düzenle; Telegram'ın reddettiği düzenlemeler (değişmeyen metin vb.) yok sayılır"""
+    try:
+        await message.edit_text(text, **kwargs)
+        return True
+    except BadRequest as e:
+        logger.debug(f"Telegram edit skipped: {e}")
+        return False
+
+async def _stream_reply(message, chunks):
+    """
+    Akış yanıtını Telegram'a gönder
+    
+    Hemen bir mesaj gönderilir, parçalar geldikçe bu mesaj TELEGRAM_EDIT_INTERVAL
+    aralıklarla düzenlenir. Yarım markdown geçersiz olabileceği için ara
+    düzenlemeler düz metin, son düzenleme Markdown'dır.
+    
+    Args:
+        message: Yanıtlanan Telegram mesajı
+        chunks: Yanıt parçalarını üreten async iterator (answer_question_stream_async)
+    
+    Returns:
+        str: Gönderilen yanıtın tamamı (hiç parça gelmediyse boş)
+    """
+    reply = await message.reply_text("🔎 Etkinliklere bakıyorum...")
+    text = ''
+    last_edit = None
+    try:
+        async for chunk in chunks:
+            text += chunk
+            now = time.monotonic()
+            if last_edit is None or now - last_edit >= TELEGRAM_EDIT_INTERVAL:
+                await _edit_text(reply, text + " ▌")
+                last_edit = now
+    except Exception:
+        if not text:
+            await reply.delete()
+        raise
+    
+    if not text:
+        await reply.delete()
+        return ''
+    if not await _edit_text(reply, text, parse_mode='Markdown', disable_web_page_preview=False):
+        await _edit_text(reply, text)  # Markdown geçersizse düz metin
+    return text
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Kullanıcı mesajlarını işler - RAG sistemi kullanır"""
@@ -705,28 +1407,22 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"User {user_name} (ID: {user_id}, @{username}) message: {user_message}")
         
         # Try RAG engine first (semantic search with embeddings)
-        rag_engine = get_rag_engine()
+        rag_engine = await _run_blocking(get_rag_engine)
         
         if rag_engine:
             try:
-                # Use RAG for semantic search and AI-generated response
-                result = rag_engine.answer_question(
+                # Use RAG for semantic search and AI-generated response (streamed as it arrives)
+                # Retrieval loop'un executor'ında, Gemini çağrısı bu event loop'ta çalışır
+                chunks = rag_engine.answer_question_stream_async(
                     query=user_message,
                     city_filter='antalya',
-                    top_k=5
+                    top_k=5,
+                    **parse_rag_filters(user_message)
                 )
-                
-                answer = result.get('answer', '')
-                sources = result.get('sources', [])
+                answer = await _stream_reply(update.message, chunks)
                 
                 if answer:
-                    # Send AI-generated response
-                    await update.message.reply_text(
-                        answer, 
-                        parse_mode='Markdown', 
-                        disable_web_page_preview=False  # Enable preview for links
-                    )
-                    logger.info(f"RAG response sent - {len(sources)} events used")
+                    logger.info(f"RAG response streamed - {len(answer)} chars")
                     return
             except Exception as e:
                 logger.error(f"RAG engine error: {e}")
@@ -738,7 +1434,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         params = parse_message(user_message)
         logger.info(f"Parsed message '{user_message}' -> params: {params}")
         
-        events = search_events(params)
+        events = await _run_blocking(search_events, params)
         response = format_events_message(events, params)
         
         await update.message.reply_text(response, parse_mode='Markdown', disable_web_page_preview=True)
@@ -757,20 +1453,104 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Hata yakalayıcı"""
     logger.error(f"Update {update} caused error {context.error}")
 
+def build_telegram_application(webhook=False):
+    """Handler'ları kayıtlı Telegram uygulaması (polling ve webhook aynı handler'ları kullanır)"""
+    # Update'ler sırayla değil, en fazla TELEGRAM_CONCURRENT_UPDATES tanesi aynı anda işlenir
+    builder = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(TELEGRAM_CONCURRENT_UPDATES)
+    if webhook:
+        builder = builder.updater(None)  # getUpdates döngüsü yok
+    application = builder.build()
+    
+    # Komutları ekle
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_error_handler(error_handler)
+    return application
+
+async def run_telegram_webhook_async():
+    """
+    Webhook modu: polling yok, update'ler TELEGRAM_WEBHOOK_PATH route'una gelir
+    ve bu event loop'ta aynı handler'larla işlenir
+    """
+    global _telegram_application, _telegram_loop
+    application = build_telegram_application(webhook=True)
+    
+    logger.info("Telegram bot starting (webhook mode)...")
+    try:
+        async with application:
+            await application.start()
+            if TELEGRAM_WEBHOOK_URL:
+                await application.bot.set_webhook(
+                    url=TELEGRAM_WEBHOOK_URL.rstrip('/') + TELEGRAM_WEBHOOK_PATH,
+                    secret_token=TELEGRAM_WEBHOOK_SECRET,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            _telegram_loop = asyncio.get_running_loop()
+            _telegram_application = application
+            logger.info(f"✅ Telegram bot is running and receiving updates on {TELEGRAM_WEBHOOK_PATH}")
+            
+            try:
+                while True:
+                    await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                logger.info("Telegram bot stopping...")
+                _telegram_application = None
+                await application.stop()
+    except Exception as e:
+        logger.error(f"Telegram webhook error: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+
+def telegram_webhook_configured():
+    """
+    Webhook modu başlatılabilir mi
+
+    Secret olmadan webhook URL'ini bilen herkes sahte update POST edebilir. Polling'e
+    düşülmez: birden fazla worker aynı bot için getUpdates yaparsa birbirini keser.
+    """
+    if TELEGRAM_WEBHOOK_SECRET:
+        return True
+    logger.error("❌ TELEGRAM_WEBHOOK_SECRET is not set, Telegram bot is not started in webhook mode")
+    return False
+
+def telegram_webhook_authorized(secret):
+    """X-Telegram-Bot-Api-Secret-Token başlığı secret ile eşleşiyor mu (secret yoksa hiçbir istek geçmez)"""
+    # Bayt karşılaştırması: compare_digest ASCII dışı str'lerde TypeError verir (500 yerine 403)
+    return bool(TELEGRAM_WEBHOOK_SECRET) and hmac.compare_digest(secret.encode('utf-8'),
+                                                                 TELEGRAM_WEBHOOK_SECRET.encode('utf-8'))
+
+@app.route(TELEGRAM_WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    """Telegram webhook endpoint'i - update bot'un event loop'una aktarılır, yanıt hemen döner"""
+    application = _telegram_application
+    if application is None:
+        # Bot henüz hazır değil (veya polling modu): Telegram update'i sonra tekrar gönderir
+        return jsonify({"ok": False, "error": "Telegram webhook is not active"}), 503
+    
+    if not telegram_webhook_authorized(request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')):
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+    
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"ok": False, "error": "Invalid JSON"}), 400
+    
+    update = Update.de_json(data, application.bot)
+    asyncio.run_coroutine_threadsafe(application.update_queue.put(update), _telegram_loop)
+    return jsonify({"ok": True})
+
 async def run_telegram_bot_async():
     """Telegram botunu async olarak çalıştır"""
     if not TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
         return
     
-    # Bot uygulaması oluştur
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    if TELEGRAM_MODE == 'webhook':
+        if telegram_webhook_configured():
+            await run_telegram_webhook_async()
+        return
     
-    # Komutları ekle
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    application.add_error_handler(error_handler)
+    application = build_telegram_application()
     
     # Botu başlat
     logger.info("Telegram bot starting...")
@@ -806,6 +1586,8 @@ def run_telegram_bot():
     # Python 3.12+ için yeni event loop oluştur (thread için)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    # Engine'in async metotları bloklayan işleri (encode, FAISS) bu sınırlı havuzda çalıştırır
+    loop.set_default_executor(_telegram_executor)
     
     try:
         loop.run_until_complete(run_telegram_bot_async())
@@ -855,7 +1637,7 @@ def start_flask():
 
 # Gunicorn ile çalışırken bot'u başlat (tüm fonksiyonlar tanımlandıktan sonra)
 # Modül import edildiğinde çalışır (Production'da)
-if os.getenv('FLASK_ENV') != 'development':  # Production'da (Gunicorn) otomatik başlat
+if os.getenv('FLASK_ENV') != 'development' and TELEGRAM_AUTOSTART:  # Production'da (Gunicorn) otomatik başlat
     start_telegram_bot_thread()
 
 if __name__ == '__main__':
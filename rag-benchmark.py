@@ -0,0 +1,701 @@
+"""
+RAG Benchmark - Retriever doğruluk ve performans ölçümleri
+Sentetik Antalya kataloğu üzerinde çalışır (MongoDB gerekmez)
+
+Kullanım:
+    python rag-benchmark.py onnx --backend onnx-int8   # ONNX vs torch recall + encode latency
+    python rag-benchmark.py batch --concurrency 16     # Mikro-batch encoder throughput
+    python rag-benchmark.py index --sizes 1000,10000,100000  # flat/HNSW/IVF recall vs latency
+    python rag-benchmark.py storage --events 50000     # float32/float16/PQ bellek vs recall (filtreli dahil)
+    python rag-benchmark.py singleflight --threads 32  # get_rag_engine() eşzamanlı çağrıda tek kurulum
+    python rag-benchmark.py memory --events 50000      # Etkinlik başına retriever belleği (doküman vs kayıt)
+    python rag-benchmark.py format --k 5               # İstek başına context/yanıt formatlama maliyeti
+    python rag-benchmark.py replay --log backend.log   # Sorgu logunu tekrar oynat, kaydedilen Gemini çağrıları
+    python rag-benchmark.py coalesce --threads 32      # Aynı anda gelen aynı soru: tek Gemini çağrısı
+
+Her komut hedef değerin altında kalırsa 1 ile çıkar (CI/deploy kontrolü için).
+"""
+
+import argparse
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.WARNING
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+
+_TITLES = ['Duman Konseri', 'Hamlet', 'Caz Gecesi', 'Modern Sanat Sergisi', 'Stand-up Gösterisi',
+           'Senfoni Orkestrası', 'Bale: Kuğu Gölü', 'Rock Festivali', 'Çocuk Tiyatrosu', 'Film Gösterimi',
+           'Seramik Atölyesi', 'Antalyaspor Maçı', 'Opera Gecesi', 'Akustik Performans', 'Fotoğraf Sergisi']
+_VENUES = ['AKM', 'Hangar', 'Aspendos Antik Tiyatrosu', 'Antalya Devlet Tiyatrosu', 'Kaleiçi Sahne',
+           'Cam Piramit', 'Corendon Airlines Park', 'Konyaaltı Açıkhava']
+_CATEGORIES = ['music', 'theater', 'exhibition', 'workshop', 'sports', 'cinema']
+_WORDS = ['muhteşem', 'canlı', 'müzik', 'sahne', 'gece', 'sanatçı', 'eser', 'performans', 'bilet',
+          'ünlü', 'yeni', 'albüm', 'klasik', 'modern', 'aile', 'çocuk', 'festival', 'turne', 'özel']
+
+SAMPLE_QUERIES = [
+    'bu hafta sonu konser var mı', 'bugün tiyatro', 'yarın sinema', 'kasım ayı etkinlikleri',
+    'Duman konseri ne zaman', 'Hamlet oyunu', 'AKM etkinlikleri', 'çocuklar için etkinlik',
+    'caz gecesi', 'sergi önerisi', 'maç bileti', 'ücretsiz etkinlikler', 'açıkhava konseri',
+    'stand up gösterisi', 'bale izlemek istiyorum', 'atölye çalışması',
+]
+
+# Aynı soruların farklı yazılışları (--log verilmezse replay bunları kullanır)
+PARAPHRASE_QUERIES = [
+    ['hafta sonu konser var mı', 'bu haftasonu konserler', 'hafta sonu konser var mı?', 'Hafta sonu hangi konserler var'],
+    ['caz gecesi', 'caz gecesi var mı', 'caz gecesi etkinlikleri', 'Caz gecesi!'],
+    ['çocuklar için etkinlik', 'çocuklara uygun etkinlikler', 'çocuk etkinlikleri', 'çocuklarla gidilecek etkinlik'],
+    ['Duman konseri ne zaman', 'duman konseri ne zaman?', 'Duman konseri hangi tarihte', 'duman konser tarihi'],
+    ['tiyatro oyunları', 'tiyatro oyunu önerisi', 'hangi tiyatro oyunları var', 'tiyatro'],
+    ['ücretsiz etkinlikler', 'bedava etkinlikler', 'ücretsiz etkinlik var mı', 'Ücretsiz etkinlikler'],
+]
+_LOG_MESSAGE = re.compile(r' message: (.+)$')
+
+
+def synthetic_events(n, seed=42):
+    """Gerçek kataloğa benzeyen sentetik etkinlikler üret"""
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        events.append({
+            '_id': f"{i:024x}",
+            'title': f"{rng.choice(_TITLES)} {rng.randint(1, 999)}",
+            'description': ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(20, 60))),
+            'city': 'antalya',
+            'category': rng.choice(_CATEGORIES),
+            'date': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'time': f"{rng.randint(10, 22)}:00",
+            'venue': rng.choice(_VENUES),
+            'price': f"{rng.randint(0, 20) * 50} TL",
+            'url': f"https://example.com/etkinlik/{i}",
+        })
+    return events
+
+
+def percentile(values, p):
+    return float(np.percentile(np.asarray(values), p)) if len(values) else 0.0
+
+
+def recall_at_k(reference_ids, candidate_ids):
+    """Her sorgu için |referans ∩ aday| / k ortalaması"""
+    scores = []
+    for ref, cand in zip(reference_ids, candidate_ids):
+        ref = set(int(i) for i in ref if i >= 0)
+        if ref:
+            scores.append(len(ref & set(int(i) for i in cand)) / len(ref))
+    return float(np.mean(scores)) if scores else 0.0
+
+
+def _encode(model, texts):
+    return model.encode(texts, show_progress_bar=False, convert_to_numpy=True,
+                        normalize_embeddings=True, batch_size=16).astype('float32')
+
+
+def backend_recall(reference_model, candidate_model, texts, queries, k):
+    """
+    İki encoder'ın aynı katalogda aynı top-k sonuçları verme oranı
+
+    Returns:
+        (recall@k, doküman başına cosine benzerliği) tuple'ı
+    """
+    reference_docs, candidate_docs = _encode(reference_model, texts), _encode(candidate_model, texts)
+    reference_queries, candidate_queries = _encode(reference_model, queries), _encode(candidate_model, queries)
+    reference_top = np.argsort(-(reference_queries @ reference_docs.T), axis=1)[:, :k]
+    candidate_top = np.argsort(-(candidate_queries @ candidate_docs.T), axis=1)[:, :k]
+    return recall_at_k(reference_top, candidate_top), (reference_docs * candidate_docs).sum(axis=1)
+
+
+def bench_onnx(args):
+    """ONNX backend'inin torch ile aynı sonuçları verdiğini ve hızını ölç"""
+    from rag_retriever import _get_or_load_model, _build_searchable_text
+
+    torch_model = _get_or_load_model(args.model, backend='torch')
+    onnx_model = _get_or_load_model(args.model, backend=args.backend)
+    if getattr(onnx_model, 'backend', 'torch') == 'torch':
+        print(f"❌ {args.backend} backend yüklenemedi (onnxruntime kurulu mu?)")
+        return 1
+
+    texts = [_build_searchable_text(e) for e in synthetic_events(args.events)]
+    k = args.k
+    recall, cosine = backend_recall(torch_model, onnx_model, texts, SAMPLE_QUERIES, k)
+
+    latencies = {}
+    for name, model in (('torch', torch_model), (args.backend, onnx_model)):
+        timings = []
+        for _ in range(args.repeat):
+            for query in SAMPLE_QUERIES:
+                start = time.perf_counter()
+                _encode(model, [query])
+                timings.append((time.perf_counter() - start) * 1000)
+        latencies[name] = timings
+
+    print(f"📊 {args.backend} vs torch ({args.events} etkinlik, {len(SAMPLE_QUERIES)} sorgu)")
+    print(f"   cosine(doc): min={cosine.min():.4f} ortalama={cosine.mean():.4f}")
+    print(f"   recall@{k}: {recall:.3f} (hedef >= {args.min_recall})")
+    for name, timings in latencies.items():
+        print(f"   {name:10s} encode p50={percentile(timings, 50):.2f}ms p99={percentile(timings, 99):.2f}ms")
+
+    return 0 if recall >= args.min_recall else 1
+
+
+def bench_batch(args):
+    """Eşzamanlı sorgularda mikro-batch encoder'ın throughput'unu ölç"""
+    from rag_retriever import _get_or_load_model, QueryEncodeBatcher
+
+    model = _get_or_load_model(args.model)
+    # Her sorgu farklı olsun (batch içi tekrar eliminasyonu sonucu etkilemesin)
+    queries = [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} {i}" for i in range(args.queries)]
+
+    def run(batcher):
+        pending = list(queries)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    query = pending.pop()
+                batcher.encode(query)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(queries) / (time.perf_counter() - start)
+
+    baseline = run(QueryEncodeBatcher(model, max_batch_size=1))
+    batcher = QueryEncodeBatcher(model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    batched = run(batcher)
+    stats = batcher.stats()
+
+    print(f"📊 Mikro-batch encoder ({args.queries} sorgu, {args.concurrency} eşzamanlı istemci)")
+    print(f"   batch yok : {baseline:.1f} sorgu/sn")
+    print(f"   batch     : {batched:.1f} sorgu/sn (x{batched / baseline:.2f})")
+    print(f"   ortalama batch={stats['avg_batch_size']:.1f} en büyük={stats['largest_batch']} "
+          f"latency p50={stats['latency_p50_ms']:.1f}ms p99={stats['latency_p99_ms']:.1f}ms")
+    return 0
+
+
+def synthetic_embeddings(n, dimension, seed=42, latent_dimension=32):
+    """
+    Normalize sentetik embedding'ler: düşük boyutlu gizli uzaydan rastgele izdüşüm + gürültü
+    (cümle embedding'leri gibi asıl bilgi az sayıda yönde toplanır)
+    """
+    rng = np.random.default_rng(seed)
+    projection = rng.standard_normal((latent_dimension, dimension)).astype('float32')
+    vectors = rng.standard_normal((n, latent_dimension)).astype('float32') @ projection
+    vectors += 0.2 * np.sqrt(latent_dimension) * rng.standard_normal((n, dimension)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_index(args):
+    """Index tiplerini flat (tam arama) referansına karşı recall@k ve latency ile karşılaştır"""
+    from rag_retriever import build_faiss_index, resolve_index_type, _inner_index
+    import faiss
+
+    failed = False
+    for size in [int(s) for s in args.sizes.split(',')]:
+        # Sorgular aynı dağılımdan, index'te olmayan vektörler
+        vectors = synthetic_embeddings(size + args.queries, args.dimension)
+        embeddings, queries = vectors[:size], vectors[size:]
+        ids = np.arange(size, dtype='int64')
+
+        reference = None
+        auto_type = resolve_index_type(size)
+        print(f"📊 {size} vektör (boyut {args.dimension}, {args.queries} sorgu, k={args.k}) - auto: {auto_type}")
+        for index_type in ('flat', 'hnsw', 'ivf'):
+            start = time.perf_counter()
+            index = build_faiss_index(embeddings, ids, index_type)
+            build_seconds = time.perf_counter() - start
+            inner = _inner_index(index)
+            if index_type == 'hnsw':
+                inner.hnsw.efSearch = max(args.ef_search, args.k)
+            elif index_type == 'ivf':
+                inner.nprobe = min(args.nprobe, inner.nlist)
+
+            # Tek sorgu latency'si (production'daki gibi tek thread)
+            threads = faiss.omp_get_max_threads()
+            faiss.omp_set_num_threads(1)
+            timings, found = [], []
+            for query in queries:
+                start = time.perf_counter()
+                _, labels = index.search(query.reshape(1, -1), args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+                found.append(labels[0])
+            faiss.omp_set_num_threads(threads)
+            if reference is None:
+                reference = found
+            recall = recall_at_k(reference, found)
+            if index_type == auto_type and recall < args.min_recall:
+                failed = True
+
+            print(f"   {index_type:5s} kurulum={build_seconds:6.2f}s recall@{args.k}={recall:.3f} "
+                  f"p50={percentile(timings, 50):.3f}ms p99={percentile(timings, 99):.3f}ms")
+
+    return 1 if failed else 0
+
+
+def bench_storage(args):
+    """Vektör saklama tiplerinin bellek kullanımını ve recall etkisini ölç"""
+    from rag_retriever import build_faiss_index, resolve_vector_storage
+    import faiss
+
+    vectors = synthetic_embeddings(args.events + args.queries, args.dimension)
+    embeddings, queries = vectors[:args.events], vectors[args.events:]
+    ids = np.arange(args.events, dtype='int64')
+
+    # Önceki düzen: flat index içinde bir kopya + retriever'da ayrı float32 NumPy matrisi
+    before_mb = 2 * embeddings.nbytes / 1024 ** 2
+    print(f"📊 {args.events} vektör (boyut {args.dimension}, {args.index_type}, k={args.k})")
+    print(f"   önceki düzen (index + NumPy kopyası): {before_mb:.1f} MB")
+
+    # Sohbet yolu her zaman şehir/tarih filtresiyle arar: etkinliklerin ~%10'u filtreye uyar
+    allowed = ids[::10]
+
+    reference = reference_filtered = None
+    failed = False
+    built = set()
+    for storage in ('float32', 'float16', 'pq'):
+        resolved = resolve_vector_storage(args.events, args.dimension, storage)
+        if resolved in built:
+            print(f"   {storage:8s} -> {resolved} (katalog küçük, yukarıdaki satır geçerli)")
+            continue
+        built.add(resolved)
+        index = build_faiss_index(embeddings, ids, args.index_type, resolved)
+        size_mb = len(faiss.serialize_index(index)) / 1024 ** 2
+        _, labels = index.search(queries, args.k)
+        try:
+            _, filtered = filtered_search(index, queries, args.k, allowed)
+        except RuntimeError as e:
+            print(f"   {resolved:8s} filtreli arama desteklenmiyor: {str(e).splitlines()[0]}")
+            failed = True
+            continue
+        if reference is None:
+            reference, reference_filtered = labels, filtered
+        recall = recall_at_k(reference, labels)
+        filtered_recall = recall_at_k(reference_filtered, filtered)
+        if not np.isin(filtered[filtered >= 0], allowed).all():
+            failed = True
+        if resolved == os.getenv('RAG_VECTOR_STORAGE', 'float32') and min(recall, filtered_recall) < args.min_recall:
+            failed = True
+        print(f"   {resolved:8s} {size_mb:7.1f} MB ({before_mb / size_mb:4.1f}x daha az) "
+              f"recall@{args.k}={recall:.3f} filtreli={filtered_recall:.3f}")
+
+    return 1 if failed else 0
+
+
+def filtered_search(index, queries, k, allowed):
+    """Sadece allowed slotlarında ara (retriever'ın ID selector'lı filtreli araması gibi)"""
+    import faiss
+
+    selector = faiss.IDSelectorBatch(allowed)
+    if isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=index.nlist)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
+
+
+class _FakeEventsCollection:
+    """Mongo'suz kontrol için bellek içi etkinlik koleksiyonu (count_documents/find)"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def count_documents(self, query):
+        return len(self.events)
+
+    def find(self, query):
+        city = query.get('city')
+        return [e for e in self.events if city is None or e.get('city') == city]
+
+
+def bench_singleflight(args):
+    """get_rag_engine() çok sayıda thread'den aynı anda çağrıldığında tam olarak bir kurulum yapılmalı"""
+    import tempfile
+    import types
+
+    # Telegram bot'u başlatılmasın, Mongo'ya bağlanılmasın (sahte koleksiyon kullanılır)
+    os.environ['TELEGRAM_BOT_TOKEN'] = ''
+    os.environ['MONGO_AUTOCONNECT'] = '0'
+    import events_backend
+    import rag_engine
+    import rag_retriever
+
+    builds = []
+    build_lock = threading.Lock()
+
+    class CountingEngine:
+        """Yavaş kurulan sahte engine (kurulum sayısını sayar)"""
+
+        def __init__(self, events, retriever=None):
+            with build_lock:
+                builds.append(len(events or []))
+            time.sleep(args.build_seconds)
+            self.retriever = types.SimpleNamespace(save=lambda revision=0: None,
+                                                   upsert=lambda events: None, remove=lambda ids: None)
+
+    collection = _FakeEventsCollection(synthetic_events(50))
+    revision = [0]
+    rag_engine.RAGEngine = CountingEngine
+    rag_retriever.RAG_INDEX_DIR = tempfile.mkdtemp(prefix='rag-singleflight-')
+    events_backend.events_collection = collection
+    events_backend.catalogue_revision = types.SimpleNamespace(get=lambda: revision[0])
+    events_backend.catalogue = types.SimpleNamespace(current_revision=lambda db: revision[0],
+                                                     fetch_changes=lambda db, revision: None)
+
+    def hammer():
+        engines, timings = [], []
+        barrier = threading.Barrier(args.threads)
+
+        def worker():
+            barrier.wait()
+            start = time.perf_counter()
+            engines.append(events_backend.get_rag_engine())
+            timings.append((time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return engines, timings
+
+    # 1) Soğuk başlangıç: herkes tek kurulumu bekler ve aynı engine'i alır
+    engines, timings = hammer()
+    cold_ok = len(builds) == 1 and len({id(e) for e in engines}) == 1 and engines[0] is not None
+    print(f"📊 Soğuk başlangıç ({args.threads} thread): kurulum={len(builds)} "
+          f"farklı engine={len({id(e) for e in engines})} bekleme p99={percentile(timings, 99):.0f}ms "
+          f"{'✅' if cold_ok else '❌'}")
+
+    # 2) Katalog değişti, delta uygulanamıyor: tek arka plan rebuild, istekler eski engine ile döner
+    old_engine = engines[0]
+    collection.events = synthetic_events(60)
+    revision[0] += 1
+    engines, timings = hammer()
+    events_backend._rag_update_thread.join()
+    swapped = events_backend.get_rag_engine()
+    rebuild_ok = (len(builds) == 2 and all(e is old_engine for e in engines)
+                  and swapped is not old_engine and percentile(timings, 99) < args.build_seconds * 1000)
+    print(f"📊 Rebuild ({args.threads} thread): kurulum={len(builds) - 1} "
+          f"eski engine dönen={sum(e is old_engine for e in engines)}/{args.threads} "
+          f"latency p99={percentile(timings, 99):.0f}ms {'✅' if rebuild_ok else '❌'}")
+
+    return 0 if cold_ok and rebuild_ok else 1
+
+
+def _mongo_like_events(n, seed=42):
+    """Scraper'ın yazdığı dokümanlara benzeyen etkinlikler (ObjectId, datetime, ek alanlar, uzun açıklama)"""
+    from bson import ObjectId
+    from datetime import datetime
+
+    rng = random.Random(seed)
+    events = []
+    for event in synthetic_events(n, seed):
+        event.update({
+            '_id': ObjectId(),
+            'description': ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(50, 300))),
+            'address': f"{rng.choice(_VENUES)}, Muratpaşa/Antalya",
+            'image_url': f"https://example.com/img/{rng.randint(0, 10 ** 9)}.jpg",
+            'organizer': 'Biletinial',
+            'tags': [],
+            'source': 'Biletinial',
+            'last_scraped': datetime.now(),
+            'updated_at': datetime.now(),
+        })
+        events.append(event)
+    return events
+
+
+def bench_memory(args):
+    """Retriever'ın etkinlik başına belleği: tam Mongo dokümanı + metin listesi vs kompakt kayıt"""
+    import gc
+    import tracemalloc
+    from rag_retriever import EventRecord, _build_searchable_text
+
+    tracemalloc.start()
+    events = _mongo_like_events(args.events)
+    gc.collect()
+    documents_bytes = tracemalloc.get_traced_memory()[0]
+    texts = [_build_searchable_text(e) for e in events]
+    gc.collect()
+    before_bytes = tracemalloc.get_traced_memory()[0]
+
+    # Yeni düzen: sadece kayıtlar tutulur, dokümanlar ve metinler bırakılır
+    del texts
+    records = [EventRecord(e) for e in events]
+    del events
+    gc.collect()
+    after_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    before, after = before_bytes / args.events, after_bytes / args.events
+    print(f"📊 {args.events} etkinlik (vektörler hariç)")
+    print(f"   önceki: {before:7.0f} byte/etkinlik (doküman {documents_bytes / args.events:.0f} + metin "
+          f"{(before_bytes - documents_bytes) / args.events:.0f}) toplam {before_bytes / 1024 ** 2:.1f} MB")
+    print(f"   kayıt : {after:7.0f} byte/etkinlik, toplam {after_bytes / 1024 ** 2:.1f} MB "
+          f"({(1 - after / before) * 100:.0f}% daha az)")
+    del records
+    return 0
+
+
+def _legacy_format(results):
+    """Önceki RAGEngine: context ve basit yanıt her istekte alan alan birleştiriliyordu"""
+    context_text = "İlgili Etkinlikler:\n\n"
+    for i, result in enumerate(results, 1):
+        event = result['event']
+        context_text += f"{i}. {event.get('title', 'Etkinlik')}\n"
+        if event.get('date'):
+            context_text += f"   Tarih: {event['date']}\n"
+        if event.get('venue'):
+            context_text += f"   Yer: {event['venue']}\n"
+        if event.get('city'):
+            context_text += f"   Şehir: {event['city']}\n"
+        if event.get('url'):
+            context_text += f"   Link: {event['url']}\n"
+        if event.get('price'):
+            context_text += f"   Fiyat: {event['price']}\n"
+        if event.get('description'):
+            context_text += f"   Açıklama: {event['description'][:100]}...\n"
+        context_text += "\n"
+
+    response = "🎉 Antalya'da bulduğum etkinlikler:\n\n"
+    for i, result in enumerate(results, 1):
+        event = result['event']
+        title = event.get('title', 'Etkinlik')
+        url = event.get('url', '')
+        if url:
+            response += f"{i}. [{title}]({url})\n"
+        else:
+            response += f"{i}. {title}\n"
+        if event.get('date'):
+            response += f"   📅 {event['date']}\n"
+        if event.get('venue'):
+            response += f"   📍 {event['venue']}\n"
+        if event.get('price'):
+            response += f"   💰 {event['price']}\n"
+        response += "\n"
+    response += "💡 Başka ne aramak istersin?"
+    return context_text, response
+
+
+def bench_format(args):
+    """İstek başına context + basit yanıt formatlama: alan alan birleştirme vs hazır snippet join"""
+    from rag_engine import RAGEngine, render_context_snippet, render_simple_snippet
+    from rag_retriever import EventRecord
+
+    records = [EventRecord(e) for e in synthetic_events(1000)]
+    for record in records:
+        record.snippets = (render_context_snippet(record), render_simple_snippet(record))
+    rng = random.Random(1)
+    requests = [[{'event': record, 'score': 1.0} for record in rng.sample(records, args.k)]
+                for _ in range(args.requests)]
+
+    engine = RAGEngine.__new__(RAGEngine)  # Sadece formatlama metotları kullanılır
+
+    def precomputed(results):
+        return engine._build_context(results), engine._format_simple_response(results)
+
+    same = all(_legacy_format(results) == precomputed(results) for results in requests[:100])
+    timings = {}
+    for name, func in (('önceki', _legacy_format), ('snippet', precomputed)):
+        start = time.perf_counter()
+        for results in requests:
+            func(results)
+        timings[name] = (time.perf_counter() - start) / len(requests) * 1e6
+
+    print(f"📊 İstek başına formatlama (k={args.k}, {args.requests} istek)")
+    print(f"   önceki : {timings['önceki']:.1f} µs")
+    print(f"   snippet: {timings['snippet']:.1f} µs (x{timings['önceki'] / timings['snippet']:.1f})")
+    print(f"   çıktılar aynı: {'✅' if same else '❌'}")
+    return 0 if same else 1
+
+
+class _CountingModel:
+    """Gemini yerine: çağrıları sayar, isteğe bağlı gecikmeyle yanıt verir"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False):
+        with self._lock:
+            self.calls += 1
+            text = f"yanıt {self.calls}"
+        time.sleep(self.delay)
+        response = type('Response', (), {'text': text})()
+        return iter([response]) if stream else response
+
+
+def _replay_queries(args):
+    """Backend logundaki kullanıcı mesajları (log yoksa sentetik yeniden yazımlar)"""
+    if args.log:
+        queries = []
+        with open(args.log, encoding='utf-8') as f:
+            for line in f:
+                match = _LOG_MESSAGE.search(line.rstrip('\n'))
+                if match:
+                    queries.append(match.group(1))
+                elif ' - ' not in line and line.strip():
+                    queries.append(line.strip())  # Satır başına bir sorgu
+        return queries
+    rng = random.Random(7)
+    return [rng.choice(rng.choice(PARAPHRASE_QUERIES)) for _ in range(args.queries)]
+
+
+def bench_replay(args):
+    """Sorgu logunu tekrar oynat: sadece tam eşleşme cache'i vs + semantik cache, Gemini çağrı sayısı"""
+    import rag_engine
+    from rag_engine import AnswerCache, RAGEngine, SemanticAnswerCache
+
+    queries = _replay_queries(args)
+    if not queries:
+        print("❌ Logda sorgu bulunamadı")
+        return 1
+
+    engine = RAGEngine(synthetic_events(args.events))
+    calls = {}
+    for name, threshold in (('tam eşleşme', 2.0), ('+ semantik', args.threshold)):
+        # Her koşu boş cache'lerle başlar
+        rag_engine._answer_cache = AnswerCache(4096, 3600)
+        rag_engine._semantic_cache = SemanticAnswerCache(4096, threshold, 3600)
+        engine.model = _CountingModel()
+        for query in queries:
+            engine.answer_question(query, top_k=args.k)
+        calls[name] = engine.model.calls
+    stats = rag_engine.answer_cache_stats()
+
+    saved = calls['tam eşleşme'] - calls['+ semantik']
+    print(f"📊 Replay: {len(queries)} sorgu, {args.events} etkinlik, eşik {args.threshold}")
+    print(f"   Gemini çağrısı (sadece tam eşleşme cache): {calls['tam eşleşme']}")
+    print(f"   Gemini çağrısı (+ semantik cache)        : {calls['+ semantik']}")
+    print(f"   kaydedilen çağrı: {saved} ({saved / max(calls['tam eşleşme'], 1):.0%}), "
+          f"semantik hit oranı: {stats['semantic']['hit_rate']:.0%}")
+    return 0
+
+
+def bench_coalesce(args):
+    """Aynı soru çok sayıda thread'den aynı anda sorulduğunda tek hesaplama (tek Gemini çağrısı) yapılmalı"""
+    import rag_engine
+    from rag_engine import RAGEngine
+
+    engine = RAGEngine(synthetic_events(200))
+    engine.model = _CountingModel(delay=args.gemini_seconds)
+    engine.answer_question('ısınma sorusu')  # Model yüklensin, sayaç sıfırlansın
+    engine.model.calls = 0
+
+    answers, timings = [], []
+    barrier = threading.Barrier(args.threads)
+
+    def worker(index):
+        barrier.wait()
+        start = time.perf_counter()
+        if index % 2:
+            answers.append(''.join(engine.answer_question_stream(args.query)))
+        else:
+            answers.append(engine.answer_question(args.query)['answer'])
+        timings.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = rag_engine.answer_cache_stats()['inflight']
+    ok = engine.model.calls == 1 and len(set(answers)) == 1
+    print(f"📊 {args.threads} eşzamanlı aynı soru (yarısı akışlı): Gemini çağrısı={engine.model.calls} "
+          f"farklı yanıt={len(set(answers))} birleştirilen={stats['coalesced']} "
+          f"latency p99={percentile(timings, 99):.0f}ms {'✅' if ok else '❌'}")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RAG retriever benchmark')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    onnx_parser = subparsers.add_parser('onnx', help='ONNX backend recall ve latency (torch ile karşılaştırma)')
+    onnx_parser.add_argument('--model', default=DEFAULT_MODEL)
+    onnx_parser.add_argument('--backend', default='onnx-int8', choices=['onnx', 'onnx-int8'])
+    onnx_parser.add_argument('--events', type=int, default=1000)
+    onnx_parser.add_argument('--k', type=int, default=5)
+    onnx_parser.add_argument('--repeat', type=int, default=5)
+    onnx_parser.add_argument('--min-recall', type=float, default=0.9)
+    onnx_parser.set_defaults(func=bench_onnx)
+
+    batch_parser = subparsers.add_parser('batch', help='Mikro-batch sorgu encoder throughput')
+    batch_parser.add_argument('--model', default=DEFAULT_MODEL)
+    batch_parser.add_argument('--queries', type=int, default=512)
+    batch_parser.add_argument('--concurrency', type=int, default=16)
+    batch_parser.add_argument('--max-batch-size', type=int, default=16)
+    batch_parser.add_argument('--max-wait-ms', type=float, default=5)
+    batch_parser.set_defaults(func=bench_batch)
+
+    index_parser = subparsers.add_parser('index', help='Index tipleri (flat/HNSW/IVF) recall ve arama latency')
+    index_parser.add_argument('--sizes', default='1000,10000,100000')
+    index_parser.add_argument('--dimension', type=int, default=384)
+    index_parser.add_argument('--queries', type=int, default=200)
+    index_parser.add_argument('--k', type=int, default=20)
+    index_parser.add_argument('--ef-search', type=int, default=int(os.getenv('RAG_HNSW_EF_SEARCH', '64')))
+    index_parser.add_argument('--nprobe', type=int, default=int(os.getenv('RAG_IVF_NPROBE', '32')))
+    index_parser.add_argument('--min-recall', type=float, default=0.9)
+    index_parser.set_defaults(func=bench_index)
+
+    storage_parser = subparsers.add_parser('storage', help='Vektör saklama tipleri (float32/float16/PQ) bellek ve recall')
+    storage_parser.add_argument('--events', type=int, default=50000)
+    storage_parser.add_argument('--dimension', type=int, default=384)
+    storage_parser.add_argument('--index-type', default='flat', choices=['flat', 'hnsw', 'ivf'])
+    storage_parser.add_argument('--queries', type=int, default=200)
+    storage_parser.add_argument('--k', type=int, default=20)
+    storage_parser.add_argument('--min-recall', type=float, default=0.9)
+    storage_parser.set_defaults(func=bench_storage)
+
+    singleflight_parser = subparsers.add_parser('singleflight', help='Eşzamanlı get_rag_engine() çağrılarında tek kurulum kontrolü')
+    singleflight_parser.add_argument('--threads', type=int, default=32)
+    singleflight_parser.add_argument('--build-seconds', type=float, default=0.5)
+    singleflight_parser.set_defaults(func=bench_singleflight)
+
+    memory_parser = subparsers.add_parser('memory', help='Etkinlik başına retriever belleği (doküman vs kompakt kayıt)')
+    memory_parser.add_argument('--events', type=int, default=50000)
+    memory_parser.set_defaults(func=bench_memory)
+
+    format_parser = subparsers.add_parser('format', help='İstek başına prompt/yanıt formatlama maliyeti')
+    format_parser.add_argument('--k', type=int, default=5)
+    format_parser.add_argument('--requests', type=int, default=20000)
+    format_parser.set_defaults(func=bench_format)
+
+    replay_parser = subparsers.add_parser('replay', help='Sorgu logu replay: semantik cache ile kaydedilen Gemini çağrıları')
+    replay_parser.add_argument('--log', help='Backend logu veya satır başına bir sorgu (yoksa sentetik)')
+    replay_parser.add_argument('--queries', type=int, default=500)
+    replay_parser.add_argument('--events', type=int, default=2000)
+    replay_parser.add_argument('--k', type=int, default=5)
+    replay_parser.add_argument('--threshold', type=float, default=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9')))
+    replay_parser.set_defaults(func=bench_replay)
+
+    coalesce_parser = subparsers.add_parser('coalesce', help='Eşzamanlı aynı sorularda tek hesaplama kontrolü')
+    coalesce_parser.add_argument('--threads', type=int, default=32)
+    coalesce_parser.add_argument('--gemini-seconds', type=float, default=0.5)
+    coalesce_parser.add_argument('--query', default='bu hafta sonu konser var mı')
+    coalesce_parser.set_defaults(func=bench_coalesce)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
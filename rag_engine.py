@@ -13,12 +13,528 @@ os.environ['HF_HOME'] = CACHE_DIR
 os.environ['TRANSFORMERS_CACHE'] = CACHE_DIR
 os.makedirs(CACHE_DIR, exist_ok=True)
 import google.generativeai as genai
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import hashlib
+import json
 import logging
-from rag_retriever import FAISSRetriever
+import queue
+import sqlite3
+import threading
+import time
+import faiss
+import numpy as np
+from rag_retriever import FAISSRetriever, tokenize
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Yanıt cache'i: aynı soru + filtreler + katalog revizyonu için Gemini tekrar çağrılmaz
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '1024'))  # 0 = kapalı
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', '')  # SQLite dosyası (boş = sadece bellek)
+
+# Semantik cache: farklı yazılmış ama aynı anlama gelen sorular için Gemini yanıtını tekrar kullan
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '2048'))  # 0 = kapalı
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9'))  # Kosinüs benzerliği
+
+# Gemini süre bütçesi: aşılırsa şablon yanıt döner (akışta: ilk parça ve parçalar arası süre)
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '8'))
+GEMINI_MAX_WORKERS = int(os.getenv('GEMINI_MAX_WORKERS', '4'))  # Eşzamanlı Gemini çağrısı üst sınırı
+GEMINI_LATE_ANSWER_CACHE = os.getenv('GEMINI_LATE_ANSWER_CACHE', '1') == '1'  # Geç gelen yanıt cache'e yazılsın
+# Devre kesici: art arda bu kadar hata/zaman aşımında Gemini bekleme süresince hiç çağrılmaz
+GEMINI_BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', '3'))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv('GEMINI_BREAKER_COOLDOWN', '30'))
+# Aynı soruyu hesaplayan lideri en fazla bu kadar bekle, sonra kendin hesapla (akış uzun sürebilir)
+INFLIGHT_WAIT_TIMEOUT = float(os.getenv('INFLIGHT_WAIT_TIMEOUT', str(2 * GEMINI_TIMEOUT)))
+
+NO_RESULTS_ANSWER = '😔 Üzgünüm, Antalya için kriterlerine uygun etkinlik bulamadım. Farklı bir arama yapmak ister misin?'
+ERROR_ANSWER = "⚠️ Üzgünüm, bir hata oluştu. Lütfen tekrar dener misin?"
+
+# record.snippets içindeki sıra (RAGEngine retriever'a bu sırayla renderer verir)
+SNIPPET_CONTEXT = 0
+SNIPPET_SIMPLE = 1
+
+
+def render_context_snippet(event):
+    """Prompt context'indeki etkinlik bloğu (numara hariç)"""
+    snippet = f"{event.get('title', 'Etkinlik')}\n"
+    if event.get('date'):
+        snippet += f"   Tarih: {event['date']}\n"
+    if event.get('venue'):
+        snippet += f"   Yer: {event['venue']}\n"
+    if event.get('city'):
+        snippet += f"   Şehir: {event['city']}\n"
+    if event.get('url'):
+        snippet += f"   Link: {event['url']}\n"
+    if event.get('price'):
+        snippet += f"   Fiyat: {event['price']}\n"
+    if event.get('description'):
+        snippet += f"   Açıklama: {event['description'][:100]}...\n"
+    return snippet + "\n"
+
+
+def render_simple_snippet(event):
+    """Gemini olmadan verilen yanıttaki etkinlik satırları (numara hariç)"""
+    title = event.get('title', 'Etkinlik')
+    url = event.get('url', '')
+    snippet = f"[{title}]({url})\n" if url else f"{title}\n"
+    if event.get('date'):
+        snippet += f"   📅 {event['date']}\n"
+    if event.get('venue'):
+        snippet += f"   📍 {event['venue']}\n"
+    if event.get('price'):
+        snippet += f"   💰 {event['price']}\n"
+    return snippet + "\n"
+
+
+class AnswerCache:
+    """
+    Yanıt cache'i: TTL'li sınırlı LRU, isteğe bağlı SQLite dosyası (thread-safe)
+
+    Anahtar katalog revizyonunu içerdiği için index yeni revizyona geçince eski
+    yanıtlar artık eşleşmez ve LRU/TTL ile düşer. SQLite dosyası restart ve
+    deploy'lar arasında, aynı makinedeki worker'lar arasında paylaşılır.
+    """
+
+    PRUNE_EVERY = 256  # Bu kadar yazmada bir diskteki eski kayıtlar silinir
+
+    def __init__(self, maxsize, ttl, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        if path and maxsize > 0:
+            self._open(path)
+
+    def _open(self, path):
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS answers '
+                             '(key TEXT PRIMARY KEY, expires_at REAL, result TEXT)')
+            self._prune()
+            logger.info(f"💾 Yanıt cache dosyası: {path}")
+        except sqlite3.Error as e:
+            logger.warning(f"Yanıt cache dosyası açılamadı, sadece bellek kullanılacak: {e}")
+            self._db = None
+
+    def _prune(self):
+        """Süresi dolan ve en yeni maxsize*4 dışında kalan disk kayıtlarını sil"""
+        self._db.execute('DELETE FROM answers WHERE expires_at < ?', (time.time(),))
+        self._db.execute('DELETE FROM answers WHERE key NOT IN '
+                         '(SELECT key FROM answers ORDER BY expires_at DESC LIMIT ?)', (self.maxsize * 4,))
+        self._db.commit()
+
+    def _remember(self, key, expires_at, result):
+        self._items[key] = (expires_at, result)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def get(self, key):
+        if self.maxsize <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self._items.pop(key, None)
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute('SELECT expires_at, result FROM answers WHERE key = ? AND expires_at > ?',
+                                           (key, now)).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Yanıt cache okunamadı: {e}")
+                    row = None
+                if row is not None:
+                    result = json.loads(row[1])
+                    self._remember(key, row[0], result)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, result)
+            if self._db is not None:
+                try:
+                    self._db.execute('INSERT OR REPLACE INTO answers VALUES (?, ?, ?)',
+                                     (key, expires_at, json.dumps(result, ensure_ascii=False, default=str)))
+                    self._puts += 1
+                    if self._puts % self.PRUNE_EVERY == 0:
+                        self._prune()
+                    else:
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Yanıt cache yazılamadı: {e}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'persistent': self._db is not None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+class SemanticAnswerCache:
+    """
+    Anlamca aynı sorular için yanıt cache'i (thread-safe)
+
+    Cevaplanan sorguların embedding'leri küçük bir FAISS index'inde tutulur. Yeni
+    sorgu eskisine eşiğin üstünde benzerse, kapsamı (filtreler + katalog revizyonu)
+    aynıysa ve retrieval tam olarak aynı etkinlik kümesini bulduysa eski yanıt döner.
+    """
+
+    SEARCH_K = 16  # Eşik üstündeki bu kadar komşu kapsam/kaynak için kontrol edilir
+
+    def __init__(self, maxsize, threshold, ttl):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._entries = OrderedDict()  # id -> (scope, source_ids, expires_at, result)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, embedding, scope, source_ids):
+        if self.maxsize <= 0:
+            return None
+        query = np.asarray(embedding, dtype='float32').reshape(1, -1)
+        now = time.time()
+        with self._lock:
+            if self._index is not None and self._index.d == query.shape[1] and self._index.ntotal:
+                scores, ids = self._index.search(query, min(self.SEARCH_K, self._index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break  # Skorlar azalan sırada
+                    entry = self._entries.get(int(entry_id))
+                    if entry and entry[0] == scope and entry[1] == source_ids and entry[2] > now:
+                        self._entries.move_to_end(int(entry_id))
+                        self.hits += 1
+                        return entry[3]
+            self.misses += 1
+            return None
+
+    def put(self, embedding, scope, source_ids, result):
+        if self.maxsize <= 0:
+            return
+        query = np.asarray(embedding, dtype='float32').reshape(1, -1)
+        with self._lock:
+            if self._index is None or self._index.d != query.shape[1]:
+                # İlk kayıt veya embedding modeli değişti
+                self._index = faiss.IndexIDMap(faiss.IndexFlatIP(query.shape[1]))
+                self._entries.clear()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(query, np.array([entry_id], dtype='int64'))
+            self._entries[entry_id] = (scope, source_ids, time.time() + self.ttl, result)
+
+            evicted = []
+            while len(self._entries) > self.maxsize:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if evicted:
+                self._index.remove_ids(np.array(evicted, dtype='int64'))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'threshold': self.threshold,
+                'hits': self.hits,  # = kaydedilen Gemini çağrısı
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+class CircuitBreaker:
+    """
+    Gemini için devre kesici + sayaçlar (thread-safe)
+
+    Art arda max_failures hata veya zaman aşımından sonra devre açılır ve cooldown
+    süresince çağrı yapılmaz. Süre dolunca tek bir deneme çağrısına izin verilir
+    (half-open); başarılıysa devre kapanır, değilse tekrar açılır.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, max_failures, cooldown):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.opened = 0
+        self.late_answers = 0
+        self.abandoned = 0
+        self.busy = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Gemini çağrılabilir mi? (açık devrede skipped sayacı artar)"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                return True  # Deneme çağrısı
+            if self.state == self.CLOSED:
+                return True
+            self.skipped += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self, timeout=False):
+        with self._lock:
+            self.failures += 1
+            if timeout:
+                self.timeouts += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self.consecutive_failures >= self.max_failures):
+                if self.state == self.CLOSED:
+                    logger.warning(f"⚡ Gemini devre kesici açıldı ({self.consecutive_failures} art arda hata), "
+                                   f"{self.cooldown:g}s şablon yanıt kullanılacak")
+                self.state = self.OPEN
+                self.opened += 1
+                self._opened_at = time.monotonic()
+
+    def record_abandoned(self, busy=False):
+        """
+        Çağrı sonuçlanmadan bırakıldı (istemci koptu, havuz dolu): hata sayılmaz
+
+        Half-open deneme çağrısıysa devre açık duruma döner; cooldown zaten
+        dolduğu için sıradaki istek yeni bir deneme yapar.
+        """
+        with self._lock:
+            if busy:
+                self.busy += 1
+            else:
+                self.abandoned += 1
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_late_answer(self):
+        with self._lock:
+            self.late_answers += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'successes': self.successes,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'skipped': self.skipped,
+                'opened': self.opened,
+                'late_answers': self.late_answers,
+                'abandoned': self.abandoned,
+                'busy': self.busy
+            }
+
+
+class GeminiBusyError(Exception):
+    """Süre bütçesi Gemini'den değil havuz kuyruğundan tükendi (devre kesiciye hata yazılmaz)"""
+
+
+class InflightRequests:
+    """
+    Aynı anahtarlı eşzamanlı soruları tek hesaplamada birleştirir (thread-safe)
+
+    İlk gelen istek (lider) hesaplar, aynı anda gelen diğerleri onun Future'ını
+    bekler. Flask thread'leri ve Telegram'ın executor thread'leri aynı tabloyu
+    kullanır. Lider yanıt üretemezse (ör. akış yarıda kesildi) veya yanıtı
+    INFLIGHT_WAIT_TIMEOUT içinde gelmezse (ör. yavaş okunan bir akış) bekleyenler
+    None alır ve kendileri hesaplar.
+    """
+
+    def __init__(self, wait_timeout=INFLIGHT_WAIT_TIMEOUT):
+        self.wait_timeout = wait_timeout
+        self.leaders = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """(future, lider_mi) - lider hesaplayıp finish() çağırmalıdır"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            # Çalışıyor durumundaki Future iptal edilemez: bekleyen iptal edilse de finish() sonucu yazabilir
+            future.set_running_or_notify_cancel()
+            self.leaders += 1
+            return future, True
+
+    def wait(self, future):
+        """Liderin sonucu; wait_timeout içinde gelmezse None"""
+        try:
+            return future.result(timeout=self.wait_timeout)
+        except FutureTimeoutError:
+            self._timed_out()
+            return None
+
+    async def wait_async(self, future):
+        """wait()'in asyncio versiyonu (event loop thread'i bloklanmaz)"""
+        try:
+            # shield: bekleyenin iptali veya zaman aşımı liderin Future'ına dokunmaz
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self._timed_out()
+            return None
+
+    def _timed_out(self):
+        with self._lock:
+            self.wait_timeouts += 1
+
+    def finish(self, key, future, result):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'wait_timeouts': self.wait_timeouts
+            }
+
+
+_answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_PATH or None)
+_inflight = InflightRequests()
+_gemini_breaker = CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN)
+# Gemini çağrıları bu havuzda çalışır: istek thread'i sadece süre bütçesi kadar bekler
+_gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS, thread_name_prefix='gemini')
+_semantic_cache = SemanticAnswerCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, ANSWER_CACHE_TTL)
+
+
+class GeminiCall:
+    """
+    Gemini havuzunda tek çağrı, kuyruk dahil tek bir uçtan uca süre bütçesiyle
+
+    Süre bütçesi çağrı havuza verildiğinde başlar: kullanıcı en fazla GEMINI_TIMEOUT
+    bekler. Bütçe dolduğunda çağrı hiç başlamadıysa iptal edilir; başladı ama
+    bütçenin yarısından azını kullanabildiyse zaman aşımı Gemini'ye yazılmaz
+    (GeminiBusyError), yoksa FutureTimeoutError.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.deadline = time.monotonic() + GEMINI_TIMEOUT
+        self.started_at = None
+        self.future = _gemini_executor.submit(self._run, func, args, kwargs)
+
+    def _run(self, func, args, kwargs):
+        self.started_at = time.monotonic()
+        return func(*args, **kwargs)
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def timed_out(self):
+        """Bütçe doldu: uygun exception'ı döndür (başlamamış çağrı iptal edilir)"""
+        started_at = self.started_at
+        if self.future.cancel() or started_at is None:
+            return GeminiBusyError(f"Gemini çağrısı {GEMINI_TIMEOUT:g}s içinde havuzda yer bulamadı")
+        if self.deadline - started_at < GEMINI_TIMEOUT / 2:
+            return GeminiBusyError(f"Gemini çağrısı havuzda {started_at - self.deadline + GEMINI_TIMEOUT:.1f}s bekledi")
+        return FutureTimeoutError()
+
+    def result(self):
+        """Çağrının sonucu; bütçe dolarsa GeminiBusyError veya FutureTimeoutError"""
+        try:
+            return self.future.result(timeout=self.remaining())
+        except FutureTimeoutError:
+            raise self.timed_out() from None
+
+
+def answer_cache_stats():
+    """Yanıt cache istatistikleri (hit/miss sayaçları, semantik cache dahil)"""
+    stats = _answer_cache.stats()
+    stats['semantic'] = _semantic_cache.stats()
+    stats['inflight'] = _inflight.stats()
+    return stats
+
+
+def gemini_stats():
+    """Gemini süre bütçesi ve devre kesici sayaçları"""
+    stats = _gemini_breaker.stats()
+    stats['timeout'] = GEMINI_TIMEOUT
+    stats['cooldown'] = GEMINI_BREAKER_COOLDOWN
+    return stats
+
+
+def _answer_scope(city_filter, top_k, category_filter, date_range, catalogue_revision):
+    """Sorgu dışındaki her şey: filtreler + katalog revizyonu"""
+    return json.dumps([(city_filter or '').lower(), top_k, category_filter,
+                       list(date_range) if date_range else None, catalogue_revision], ensure_ascii=False)
+
+
+def answer_cache_key(query, city_filter, top_k, category_filter, date_range, catalogue_revision):
+    """Normalize sorgu (küçük harf, noktalama yok) + filtreler + katalog revizyonu -> cache anahtarı"""
+    scope = _answer_scope(city_filter, top_k, category_filter, date_range, catalogue_revision)
+    return hashlib.sha1(f"{' '.join(tokenize(query))}\n{scope}".encode('utf-8')).hexdigest()
+
+
+def _cacheable(plan):
+    """
+    Hazır yanıt cache'e yazılabilir mi?
+
+    plan yoksa yanıt ya başarılı bir retrieval'ın "sonuç yok" cevabı ya da semantik
+    cache yanıtıdır; retrieval hatası retrieve()'dan exception olarak gelir ve
+    hata yanıtı hiçbir zaman cache'lenmez.
+    """
+    return plan is None or plan['cacheable']
+
+
+def _snippet(event, index, render):
+    """Index zamanında üretilmiş metni kullan (yoksa şimdi üret)"""
+    snippets = getattr(event, 'snippets', None)
+    return snippets[index] if snippets else render(event)
+
 
 class RAGEngine:
     """
@@ -26,10 +542,15 @@ class RAGEngine:
     FAISS vektor DB + Embeddings + Gemini AI = Akıllı etkinlik asistanı
     """
     
-    def __init__(self, events):
+    def __init__(self, events, retriever=None):
         # 🗄️ FAISS + Embedding tabanlı arama motoru
+        # (retriever verildiyse diskten yüklenmiş hazır index kullanılır)
         logger.info("🔄 FAISS Retriever başlatılıyor...")
-        self.retriever = FAISSRetriever(events)
+        self.retriever = retriever if retriever is not None else FAISSRetriever(events)
+        # Etkinlik metinleri index zamanında bir kez üretilir (her yanıtta formatlama yok)
+        self.retriever.set_snippet_renderers((render_context_snippet, render_simple_snippet))
+        # Index'in yansıttığı katalog revizyonu (backend günceller, yanıt cache anahtarının parçası)
+        self.catalogue_revision = 0
         
         # 🤖 Gemini AI istemcisi
         api_key = os.getenv('GEMINI_API_KEY')
@@ -55,7 +576,7 @@ class RAGEngine:
         
         logger.info("✅ RAG Engine başlatıldı (FAISS + Embeddings + Gemini)")
     
-    def answer_question(self, query, city_filter='antalya', top_k=5):
+    def answer_question(self, query, city_filter='antalya', top_k=5, category_filter=None, date_range=None):
         """
         Kullanıcı sorusuna RAG tabanlı yanıt üret
         
@@ -63,43 +584,468 @@ class RAGEngine:
             query: Kullanıcının sorusu
             city_filter: Şehir filtresi (varsayılan: "antalya")
             top_k: Kaç etkinlik alınacak (varsayılan: 5)
+            category_filter: Kategori filtresi (örn: "music")
+            date_range: (başlangıç, bitiş) ISO tarih tuple'ı
         
         Returns:
             dict: {'answer': str, 'sources': list} - AI yanıtı ve kullanılan kaynaklar
         """
+        # Aynı soru, aynı filtreler ve aynı katalog revizyonu: cache'ten cevapla
+        key = answer_cache_key(query, city_filter, top_k, category_filter, date_range, self.catalogue_revision)
+        cached = _answer_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # Aynı soru şu an başka bir istekte hesaplanıyorsa onun sonucunu bekle
+        future, leader = _inflight.join(key)
+        if not leader:
+            result = _inflight.wait(future)
+            if result is not None:
+                return result
+        
+        result = None
+        try:
+            result, cacheable = self._answer(key, query, city_filter, top_k, category_filter, date_range)
+            if cacheable:
+                _answer_cache.put(key, result)
+        finally:
+            if leader:
+                _inflight.finish(key, future, result)
+        return result
+    
+    def answer_question_stream(self, query, city_filter='antalya', top_k=5, category_filter=None, date_range=None):
+        """
+        answer_question'ın akış versiyonu: Gemini yanıtını parça parça, geldikçe üretir
+        
+        Cache'ten veya Gemini'siz cevaplanan sorularda tüm yanıt tek parça gelir.
+        Akış başarıyla biterse yanıt answer_question ile aynı cache'lere yazılır.
+        
+        Yields:
+            str: Yanıtın sıradaki parçası (parçaların birleşimi yanıtın tamamıdır)
+        """
+        key = answer_cache_key(query, city_filter, top_k, category_filter, date_range, self.catalogue_revision)
+        cached = _answer_cache.get(key)
+        if cached is not None:
+            yield cached['answer']
+            return
+        
+        # Aynı soru şu an hesaplanıyorsa (akışlı veya değil) yanıtın tamamını bekle
+        future, leader = _inflight.join(key)
+        if not leader:
+            result = _inflight.wait(future)
+            if result is not None:
+                yield result['answer']
+                return
+        
+        result = None
+        try:
+            result = yield from self._stream(key, query, city_filter, top_k, category_filter, date_range)
+        finally:
+            # Akış kapatılsa da (GeneratorExit) bekleyenler serbest kalır; yarım akışta None alırlar
+            if leader:
+                _inflight.finish(key, future, result)
+    
+    def _stream(self, key, query, city_filter, top_k, category_filter, date_range):
+        """
+        answer_question_stream'in cache'siz gövdesi
+        
+        Returns:
+            dict: Gönderilen yanıt (bekleyen eşzamanlı istekler için); yarım kaldıysa None
+        """
+        try:
+            ready, plan = self._prepare(query, city_filter, top_k, category_filter, date_range)
+        except Exception as e:
+            logger.error(f"RAG engine error: {e}")
+            yield ERROR_ANSWER
+            return {'answer': ERROR_ANSWER, 'sources': []}
+        
+        if ready is None and not self.model:
+            ready = self._finish(plan, self._format_simple_response(plan['results']))
+        if ready is not None:
+            if _cacheable(plan):
+                _answer_cache.put(key, ready)
+            yield ready['answer']
+            return ready
+        
+        if not _gemini_breaker.allow():
+            fallback = self._finish(plan, self._format_simple_response(plan['results']), cacheable=False)
+            yield fallback['answer']
+            return fallback
+        
+        parts = []
+        try:
+            for text in self._generate_stream(plan['prompt']):
+                parts.append(text)
+                yield text
+        except Exception as e:
+            if isinstance(e, GeminiBusyError):
+                logger.warning(f"🚦 Gemini havuzu dolu, şablon yanıt kullanılıyor: {e}")
+                _gemini_breaker.record_abandoned(busy=True)
+            else:
+                if isinstance(e, FutureTimeoutError):
+                    logger.warning(f"⏱️ Gemini akışı {GEMINI_TIMEOUT:g}s içinde parça göndermedi")
+                else:
+                    logger.error(f"Gemini streaming error: {e}")
+                _gemini_breaker.record_failure(timeout=isinstance(e, FutureTimeoutError))
+            if parts:
+                return None
+            # Henüz hiçbir şey gönderilmediyse basit listeye düş (cache'lenmez)
+            fallback = self._finish(plan, self._format_simple_response(plan['results']), cacheable=False)
+            yield fallback['answer']
+            return fallback
+        except BaseException:
+            # İstemci akışı kapattı (GeneratorExit): half-open deneme açık kalmasın
+            _gemini_breaker.record_abandoned()
+            raise
+        
+        _gemini_breaker.record_success()
+        result = self._finish(plan, ''.join(parts).strip())
+        if plan['cacheable']:
+            _answer_cache.put(key, result)
+        return result
+    
+    def _answer(self, key, query, city_filter, top_k, category_filter, date_range):
+        """
+        Retrieval + generation (cache'siz)
+        
+        Returns:
+            (result, cacheable) tuple'ı; hata, Gemini fallback'i ve sadece BM25
+            sonuçlarından (model yüklenmeden) üretilen yanıt cache'lenmez
+        """
         try:
-            # 1. RETRIEVAL: En alakalı etkinlikleri bul (FAISS + Embeddings ile semantik arama)
-            results = self.retriever.retrieve(query, k=top_k, city_filter=city_filter)
+            ready, plan = self._prepare(query, city_filter, top_k, category_filter, date_range)
+            if ready is not None:
+                return ready, _cacheable(plan)
             
-            if not results:
-                return {
-                    'answer': '😔 Üzgünüm, Antalya için kriterlerine uygun etkinlik bulamadım. Farklı bir arama yapmak ister misin?',
-                    'sources': []
-                }
+            # 3. GENERATION: Gemini AI ile doğal dil yanıtı üret (süre bütçesi + devre kesici)
+            if self.model:
+                answer = self._generate(key, plan)
+                if answer is None:
+                    # Fallback to simple format (Gemini düzelince gerçek yanıt üretilsin diye cache'lenmez)
+                    return self._finish(plan, self._format_simple_response(plan['results']), cacheable=False), False
+            else:
+                # Fallback to simple format if Gemini not available
+                answer = self._format_simple_response(plan['results'])
             
-            # 2. CONTEXT OLUŞTURMA: Bulunan etkinlikleri metin formatına çevir
-            context_text = "İlgili Etkinlikler:\n\n"
-            for i, result in enumerate(results, 1):
-                event = result['event']
-                context_text += f"{i}. {event.get('title', 'Etkinlik')}\n"
-                if event.get('date'):
-                    context_text += f"   Tarih: {event['date']}\n"
-                if event.get('venue'):
-                    context_text += f"   Yer: {event['venue']}\n"
-                if event.get('city'):
-                    context_text += f"   Şehir: {event['city']}\n"
-                if event.get('url'):
-                    context_text += f"   Link: {event['url']}\n"
-                if event.get('price'):
-                    context_text += f"   Fiyat: {event['price']}\n"
-                if event.get('description'):
-                    context_text += f"   Açıklama: {event['description'][:100]}...\n"
-                context_text += "\n"
+            return self._finish(plan, answer), plan['cacheable']
             
-            # 3. GENERATION: Gemini AI ile doğal dil yanıtı üret
-            if self.model:
+        except Exception as e:
+            logger.error(f"RAG engine error: {e}")
+            return {
+                'answer': ERROR_ANSWER,
+                'sources': []
+            }, False
+    
+    def _generate(self, key, plan):
+        """
+        Gemini yanıtını GEMINI_TIMEOUT içinde üret
+        
+        Returns:
+            str: Yanıt; devre açık, hata veya zaman aşımında None (çağıran şablon yanıta düşer)
+        """
+        if not _gemini_breaker.allow():
+            return None
+        
+        call = GeminiCall(self.model.generate_content, plan['prompt'])
+        try:
+            answer = call.result().text.strip()
+        except (GeminiBusyError, FutureTimeoutError) as e:
+            if isinstance(e, GeminiBusyError):
+                # Gemini'nin değil havuzun sorunu: devre kesiciye hata yazılmaz
+                logger.warning(f"🚦 Gemini havuzu dolu, şablon yanıt kullanılıyor: {e}")
+                _gemini_breaker.record_abandoned(busy=True)
+            else:
+                logger.warning(f"⏱️ Gemini {GEMINI_TIMEOUT:g}s içinde yanıt vermedi, şablon yanıt kullanılıyor")
+                _gemini_breaker.record_failure(timeout=True)
+            if GEMINI_LATE_ANSWER_CACHE and not call.future.cancelled():
+                # Çağrı arka planda sürer; yanıt gelirse aynı soru bir dahakine cache'ten cevaplanır
+                call.future.add_done_callback(lambda done: self._store_late_answer(done, key, plan))
+            return None
+        except Exception as e:
+            logger.error(f"Gemini generation error: {e}")
+            _gemini_breaker.record_failure()
+            return None
+        
+        _gemini_breaker.record_success()
+        return answer
+    
+    def _generate_stream(self, prompt):
+        """
+        Gemini parçaları; akışın tamamı havuzda tek thread'de okunur
+
+        İlk parça GEMINI_TIMEOUT içinde (havuz kuyruğu dahil), sonraki her parça bir
+        önceki gönderildikten sonra GEMINI_TIMEOUT içinde gelmezse GeminiCall
+        exception'ı (GeminiBusyError veya FutureTimeoutError).
+        """
+        chunks = queue.Queue()
+        closed = threading.Event()
+
+        def read_stream():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if closed.is_set():
+                        return  # Okuyan taraf vazgeçti: thread'i hemen bırak
+                    if chunk.text:
+                        chunks.put(chunk.text)
+                chunks.put(None)
+            except Exception as e:
+                chunks.put(e)
+
+        call = GeminiCall(read_stream)
+        try:
+            while True:
                 try:
-                    prompt = f"""Sen Antalya Etkinlik Botu'sun, Antalya'daki etkinliklerin uzmanı bir asistansın.
+                    item = chunks.get(timeout=call.remaining())
+                except queue.Empty:
+                    raise call.timed_out() from None
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                call.deadline = time.monotonic() + GEMINI_TIMEOUT
+        finally:
+            closed.set()
+    
+    def _store_late_answer(self, future, key, plan):
+        """Süre bütçesini aşan Gemini yanıtını cache'lere yaz"""
+        if future.cancelled():
+            return
+        try:
+            answer = future.result().text.strip()
+        except Exception as e:
+            logger.debug(f"Late Gemini answer failed: {e}")
+            return
+        result = self._finish(plan, answer)
+        if plan['cacheable']:
+            _answer_cache.put(key, result)
+        _gemini_breaker.record_late_answer()
+    
+    async def answer_question_async(self, query, city_filter='antalya', top_k=5, category_filter=None, date_range=None):
+        """
+        answer_question'ın asyncio versiyonu (ASGI sunucusu ve Telegram bot'u için)
+        
+        Retrieval (encode + FAISS) event loop'un executor'ında, Gemini çağrısı
+        event loop'ta çalışır; beklerken thread tutulmaz. Cache'ler, eşzamanlı istek
+        birleştirme ve devre kesici thread'li versiyonla ortaktır.
+        """
+        key = answer_cache_key(query, city_filter, top_k, category_filter, date_range, self.catalogue_revision)
+        cached = _answer_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        future, leader = _inflight.join(key)
+        if not leader:
+            result = await _inflight.wait_async(future)
+            if result is not None:
+                return result
+        
+        result = None
+        try:
+            result, cacheable = await self._answer_async(key, query, city_filter, top_k, category_filter, date_range)
+            if cacheable:
+                _answer_cache.put(key, result)
+        finally:
+            if leader:
+                _inflight.finish(key, future, result)
+        return result
+    
+    async def answer_question_stream_async(self, query, city_filter='antalya', top_k=5, category_filter=None, date_range=None):
+        """answer_question_stream'in asyncio versiyonu (async generator)"""
+        key = answer_cache_key(query, city_filter, top_k, category_filter, date_range, self.catalogue_revision)
+        cached = _answer_cache.get(key)
+        if cached is not None:
+            yield cached['answer']
+            return
+        
+        future, leader = _inflight.join(key)
+        if not leader:
+            result = await _inflight.wait_async(future)
+            if result is not None:
+                yield result['answer']
+                return
+        
+        outcome = {}  # Async generator değer döndüremez: _stream_async sonucu buraya yazar
+        try:
+            async for text in self._stream_async(key, query, city_filter, top_k, category_filter, date_range, outcome):
+                yield text
+        finally:
+            # Akış kapatılsa da (GeneratorExit, CancelledError) bekleyenler serbest kalır
+            if leader:
+                _inflight.finish(key, future, outcome.get('result'))
+    
+    async def _answer_async(self, key, query, city_filter, top_k, category_filter, date_range):
+        """_answer'ın asyncio versiyonu"""
+        loop = asyncio.get_running_loop()
+        try:
+            ready, plan = await loop.run_in_executor(None, self._prepare, query, city_filter, top_k, category_filter, date_range)
+            if ready is not None:
+                return ready, _cacheable(plan)
+            
+            if self.model:
+                answer = await self._generate_async(key, plan)
+                if answer is None:
+                    return self._finish(plan, self._format_simple_response(plan['results']), cacheable=False), False
+            else:
+                answer = self._format_simple_response(plan['results'])
+            
+            return self._finish(plan, answer), plan['cacheable']
+            
+        except Exception as e:
+            logger.error(f"RAG engine error: {e}")
+            return {
+                'answer': ERROR_ANSWER,
+                'sources': []
+            }, False
+    
+    async def _stream_async(self, key, query, city_filter, top_k, category_filter, date_range, outcome):
+        """_stream'in asyncio versiyonu; gönderilen yanıt outcome['result']'a yazılır"""
+        loop = asyncio.get_running_loop()
+        try:
+            ready, plan = await loop.run_in_executor(None, self._prepare, query, city_filter, top_k, category_filter, date_range)
+        except Exception as e:
+            logger.error(f"RAG engine error: {e}")
+            outcome['result'] = {'answer': ERROR_ANSWER, 'sources': []}
+            yield ERROR_ANSWER
+            return
+        
+        if ready is None and not self.model:
+            ready = self._finish(plan, self._format_simple_response(plan['results']))
+        if ready is not None:
+            if _cacheable(plan):
+                _answer_cache.put(key, ready)
+            outcome['result'] = ready
+            yield ready['answer']
+            return
+        
+        fallback = None
+        if _gemini_breaker.allow():
+            parts = []
+            try:
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(plan['prompt'], stream=True), GEMINI_TIMEOUT)
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), GEMINI_TIMEOUT)
+                    except StopAsyncIteration:
+                        break
+                    if chunk.text:
+                        parts.append(chunk.text)
+                        yield chunk.text
+            except Exception as e:
+                timeout = isinstance(e, (asyncio.TimeoutError, FutureTimeoutError))
+                if timeout:
+                    logger.warning(f"⏱️ Gemini akışı {GEMINI_TIMEOUT:g}s içinde parça göndermedi")
+                else:
+                    logger.error(f"Gemini streaming error: {e}")
+                _gemini_breaker.record_failure(timeout=timeout)
+                if parts:
+                    return
+                fallback = self._finish(plan, self._format_simple_response(plan['results']), cacheable=False)
+            except BaseException:
+                # İstemci koptu (GeneratorExit, CancelledError): half-open deneme açık kalmasın
+                _gemini_breaker.record_abandoned()
+                raise
+            else:
+                _gemini_breaker.record_success()
+                outcome['result'] = self._finish(plan, ''.join(parts).strip())
+                if plan['cacheable']:
+                    _answer_cache.put(key, outcome['result'])
+                return
+        else:
+            fallback = self._finish(plan, self._format_simple_response(plan['results']), cacheable=False)
+        
+        # Devre açık veya hiçbir parça gelmeden hata: basit liste (cache'lenmez)
+        outcome['result'] = fallback
+        yield fallback['answer']
+    
+    async def _generate_async(self, key, plan):
+        """_generate'in asyncio versiyonu (Gemini'nin async istemcisiyle)"""
+        if not _gemini_breaker.allow():
+            return None
+        
+        task = asyncio.ensure_future(self.model.generate_content_async(plan['prompt']))
+        try:
+            # shield: zaman aşımında istek iptal edilmez, geç gelen yanıt cache'e yazılabilir
+            response = await asyncio.wait_for(asyncio.shield(task), GEMINI_TIMEOUT)
+            answer = response.text.strip()
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Gemini {GEMINI_TIMEOUT:g}s içinde yanıt vermedi, şablon yanıt kullanılıyor")
+            _gemini_breaker.record_failure(timeout=True)
+            if GEMINI_LATE_ANSWER_CACHE:
+                task.add_done_callback(lambda done: self._store_late_answer(done, key, plan))
+            else:
+                task.cancel()
+            return None
+        except Exception as e:
+            logger.error(f"Gemini generation error: {e}")
+            _gemini_breaker.record_failure()
+            return None
+        except BaseException:
+            # İstek iptal edildi (CancelledError): half-open deneme açık kalmasın
+            _gemini_breaker.record_abandoned()
+            task.cancel()
+            raise
+        
+        _gemini_breaker.record_success()
+        return answer
+    
+    def _prepare(self, query, city_filter, top_k, category_filter, date_range):
+        """
+        Retrieval, context ve semantik cache kontrolü (generation öncesi her şey)
+        
+        Returns:
+            (ready, plan) tuple'ı: Gemini gerekmiyorsa ready hazır yanıttır, yoksa
+            plan generation için gerekenleri (results, prompt, cache bilgisi) taşır
+        """
+        # 1. RETRIEVAL: En alakalı etkinlikleri bul (FAISS + Embeddings ile semantik arama)
+        results = self.retriever.retrieve(
+            query,
+            k=top_k,
+            city_filter=city_filter,
+            category_filter=category_filter,
+            date_range=date_range
+        )
+        
+        if not results:
+            return {
+                'answer': NO_RESULTS_ANSWER,
+                'sources': []
+            }, None
+        
+        # Model yüklenmeden dönen sadece BM25 sonuçlarıyla üretilen yanıt cache'lenmez:
+        # model hazır olunca aynı soru hibrit aramayla tekrar cevaplanır
+        plan = {'results': results, 'query_embedding': None,
+                'cacheable': not any(r.get('degraded') for r in results)}
+        if self.model:
+            # Benzer bir soru aynı etkinliklerle zaten cevaplandıysa Gemini'ye gitme
+            # (retrieval'ın hesapladığı sorgu embedding'i kullanılır; yoksa atlanır)
+            plan['scope'] = _answer_scope(city_filter, top_k, category_filter, date_range, self.catalogue_revision)
+            plan['source_ids'] = frozenset(r['event']['_id'] for r in results)
+            plan['query_embedding'] = self.retriever.cached_query_embedding(query)
+            if plan['query_embedding'] is not None:
+                cached = _semantic_cache.get(plan['query_embedding'], plan['scope'], plan['source_ids'])
+                if cached is not None:
+                    return cached, None
+            
+            # 2. CONTEXT OLUŞTURMA: Bulunan etkinliklerin hazır metinlerini birleştir
+            plan['prompt'] = self._build_prompt(query, self._build_context(results))
+        return None, plan
+    
+    def _finish(self, plan, answer, cacheable=True):
+        """Yanıt sözlüğünü oluştur, Gemini yanıtıysa semantik cache'e ekle"""
+        result = {
+            'answer': answer,
+            'sources': [r['event'].to_dict() for r in plan['results']]
+        }
+        if cacheable and plan['cacheable'] and plan['query_embedding'] is not None:
+            _semantic_cache.put(plan['query_embedding'], plan['scope'], plan['source_ids'], result)
+        return result
+    
+    def _build_prompt(self, query, context_text):
+        """Gemini prompt'u"""
+        return f"""Sen Antalya Etkinlik Botu'sun, Antalya'daki etkinliklerin uzmanı bir asistansın.
 Doğal, samimi ve yardımsever bir Türkçe konuşma tarzın var.
 
 Kullanıcının sorusuna aşağıdaki etkinlik bilgilerine dayanarak yanıt ver:
@@ -118,53 +1064,21 @@ Yanıt Kuralları:
 - Antalya'ya özel odaklan
 
 Yanıt:"""
-                    
-                    response = self.model.generate_content(prompt)
-                    answer = response.text.strip()
-                except Exception as e:
-                    logger.error(f"Gemini generation error: {e}")
-                    # Fallback to simple format
-                    answer = self._format_simple_response(results)
-            else:
-                # Fallback to simple format if Gemini not available
-                answer = self._format_simple_response(results)
-            
-            return {
-                'answer': answer,
-                'sources': [r['event'] for r in results]
-            }
-            
-        except Exception as e:
-            logger.error(f"RAG engine error: {e}")
-            return {
-                'answer': f"⚠️ Üzgünüm, bir hata oluştu. Lütfen tekrar dener misin?",
-                'sources': []
-            }
+    
+    def _build_context(self, results):
+        """Prompt için etkinlik listesi (index zamanında üretilmiş snippet'lerden)"""
+        return "İlgili Etkinlikler:\n\n" + "".join(
+            f"{i}. {_snippet(result['event'], SNIPPET_CONTEXT, render_context_snippet)}"
+            for i, result in enumerate(results, 1)
+        )
     
     def _format_simple_response(self, results):
         """Simple response formatting when Gemini is not available"""
         if not results:
             return "😔 Üzgünüm, etkinlik bulamadım."
         
-        response = "🎉 Antalya'da bulduğum etkinlikler:\n\n"
-        for i, result in enumerate(results, 1):
-            event = result['event']
-            title = event.get('title', 'Etkinlik')
-            url = event.get('url', '')
-            
-            if url:
-                response += f"{i}. [{title}]({url})\n"
-            else:
-                response += f"{i}. {title}\n"
-            
-            if event.get('date'):
-                response += f"   📅 {event['date']}\n"
-            if event.get('venue'):
-                response += f"   📍 {event['venue']}\n"
-            if event.get('price'):
-                response += f"   💰 {event['price']}\n"
-            response += "\n"
-        
-        response += "💡 Başka ne aramak istersin?"
-        return response
+        return "🎉 Antalya'da bulduğum etkinlikler:\n\n" + "".join(
+            f"{i}. {_snippet(result['event'], SNIPPET_SIMPLE, render_simple_snippet)}"
+            for i, result in enumerate(results, 1)
+        ) + "💡 Başka ne aramak istersin?"
 
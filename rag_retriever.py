@@ -6,32 +6,251 @@ RAM Optimizasyonu:
 - Model singleton pattern ile paylaşılıyor (her process'te bir kez yükleniyor)
 - Model cache mekanizması (disk cache)
 - Lazy loading (sadece gerektiğinde yükleniyor)
+- Kalıcı embedding cache (değişmeyen etkinlikler yeniden encode edilmiyor)
+- Sorgu embedding LRU cache'i (sık sorulan sorgular yeniden encode edilmiyor)
+- Mikro-batch sorgu encoder'ı (eşzamanlı sorgular tek forward pass'te encode ediliyor)
+
+Hibrit arama: FAISS vektör sonuçları ile Türkçe BM25 anahtar kelime sonuçları
+reciprocal rank fusion (RRF) ile birleştiriliyor (sanatçı/mekan adları için).
 """
 
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import hashlib
+import heapq
+import inspect
+import json
 import logging
+import fcntl
+import math
 import os
+import queue
+import re
+import shutil
+import sys
 import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 # Global model cache (process-level singleton)
 _model_cache = {}
+_loaded_backends = {}  # (istenen backend, model) -> gerçekten yüklenen backend (ONNX yüklenemezse 'torch')
 _model_lock = threading.Lock()
+_model_warmup_thread = None
+_model_warmup_lock = threading.Lock()
+
+# Embedding backend: 'torch' (varsayılan), 'onnx' veya 'onnx-int8' (ONNX Runtime, dinamik int8)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+
+# Sorgu embedding cache boyutu (0 = kapalı)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+
+# Mikro-batch: en fazla N sorgu veya ilk sorgudan sonra X ms beklenir (1 = batch kapalı)
+QUERY_BATCH_MAX_SIZE = int(os.getenv('QUERY_BATCH_MAX_SIZE', '16'))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv('QUERY_BATCH_MAX_WAIT_MS', '5'))
+
+# Hibrit arama (BM25 + vektör, RRF ile birleştirme). 0 = sadece vektör araması
+RAG_HYBRID_SEARCH = os.getenv('RAG_HYBRID_SEARCH', '1') == '1'
+RRF_K = 60  # Reciprocal rank fusion sabiti (standart değer)
+
+# Açıklamalar index'e alınırken bu uzunlukta kesilir (model zaten ~128 token görür)
+RAG_DESCRIPTION_MAX_CHARS = int(os.getenv('RAG_DESCRIPTION_MAX_CHARS', '400'))
+
+# FAISS index tipi: 'auto' (katalog boyutuna göre), 'flat' (tam arama), 'hnsw' veya 'ivf' (yaklaşık arama)
+RAG_INDEX_TYPE = os.getenv('RAG_INDEX_TYPE', 'auto').lower()
+RAG_ANN_MIN_EVENTS = int(os.getenv('RAG_ANN_MIN_EVENTS', '20000'))  # auto: bu boyuttan itibaren HNSW
+RAG_HNSW_M = int(os.getenv('RAG_HNSW_M', '32'))
+RAG_HNSW_EF_SEARCH = int(os.getenv('RAG_HNSW_EF_SEARCH', '64'))
+RAG_IVF_NPROBE = int(os.getenv('RAG_IVF_NPROBE', '32'))
+# Filtre en fazla bu kadar etkinlik bırakıyorsa yaklaşık index yerine tam (brute-force) arama yapılır
+RAG_EXACT_SEARCH_MAX = int(os.getenv('RAG_EXACT_SEARCH_MAX', '4096'))
+# Vektör saklama: 'float32' (tam), 'float16' (yarı boyut) veya 'pq' (product quantization, ~32x küçük)
+# Vektörler sadece FAISS index'inde tutulur, ayrıca NumPy kopyası yoktur
+RAG_VECTOR_STORAGE = os.getenv('RAG_VECTOR_STORAGE', 'float32').lower()
+RAG_PQ_M = int(os.getenv('RAG_PQ_M', '96'))  # PQ alt vektör sayısı (vektör başına byte)
+PQ_MIN_TRAIN = 39 * 256  # PQ kod kitabı eğitimi için gereken en az vektör
+# HNSW silmeyi desteklemez: silinen slotlar işaretlenir, oran bunu aşınca index yeniden kurulur
+TOMBSTONE_REBUILD_RATIO = 0.2
+
+# Diske kaydedilen retriever artifact'i (FAISS index + etkinlik tablosu)
+# Worker'lar FAISS index'ini mmap ile açar, vektörlerin fiziksel bellek sayfaları paylaşılır.
+# Etkinlik kayıtları, BM25 ve metadata Python nesneleridir: her worker events.json'dan kendi kopyasını kurar
+RAG_INDEX_DIR = os.getenv('RAG_INDEX_DIR', os.path.join(os.getenv('HF_HOME', '/app/model_cache'), 'rag_index'))
+ARTIFACT_FORMAT_VERSION = 4  # 4: flat + pq tek listeli IVFPQ (filtreli arama)
+
+
+def _load_torch_model(model_name, cache_dir):
+    """PyTorch SentenceTransformer modelini yükle (varsayılan backend)"""
+    from sentence_transformers import SentenceTransformer
+
+    # Model cache mekanizması - disk'ten yükle
+    # RAM optimizasyonu: model'i daha verimli yükle
+    import torch
+    
+    # PyTorch bellek optimizasyonu
+    torch.set_num_threads(1)  # Tek thread kullan (bellek tasarrufu)
+    
+    model = SentenceTransformer(
+        model_name,
+        cache_folder=cache_dir,
+        device='cpu',  # CPU kullan (GPU yoksa)
+        model_kwargs={
+            'low_cpu_mem_usage': True,  # Düşük bellek kullanımı
+        }
+    )
+    
+    # Model'i eval moduna al (training modundan daha az bellek kullanır)
+    model.eval()
+    
+    # PyTorch cache'i temizle (bellek tasarrufu)
+    if hasattr(torch, 'empty_cache'):
+        torch.empty_cache()
+    
+    return model
+
+
+def _export_onnx(model_name, cache_dir, onnx_dir):
+    """
+    SentenceTransformer modelini ONNX'e export et (tek seferlik, torch gerektirir)
+    Tokenizer ve pooling ayarları ONNX modeli ile aynı dizine yazılır.
+    """
+    import torch
+
+    logger.info(f"🔄 {model_name} ONNX formatına export ediliyor: {onnx_dir}")
+    st_model = _load_torch_model(model_name, cache_dir)
+    transformer = st_model[0].auto_model
+
+    class _TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
 
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
 
-def _get_or_load_model(model_name, cache_dir=None):
+    os.makedirs(onnx_dir, exist_ok=True)
+    dummy = st_model.tokenizer(['örnek etkinlik'], return_tensors='pt')
+    # Yeni torch sürümleri varsayılan olarak dynamo exporter'ı (onnxscript) kullanıyor
+    export_kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    tmp_path = os.path.join(onnx_dir, f"model.onnx.{os.getpid()}.tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            _TokenEmbeddings(transformer).eval(),
+            (dummy['input_ids'], dummy['attention_mask']),
+            tmp_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['token_embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'token_embeddings': {0: 'batch', 1: 'sequence'},
+            },
+            opset_version=14,
+            **export_kwargs
+        )
+    st_model.tokenizer.save_pretrained(onnx_dir)
+    with open(os.path.join(onnx_dir, 'encoder_config.json'), 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'max_seq_length': st_model.max_seq_length,
+            'dimension': st_model.get_sentence_embedding_dimension(),
+            'pad_token': st_model.tokenizer.pad_token,
+            'pad_token_id': st_model.tokenizer.pad_token_id,
+        }, f)
+    os.replace(tmp_path, os.path.join(onnx_dir, 'model.onnx'))
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime ile çalışan SentenceTransformer muadili (mean pooling)
+
+    SentenceTransformer.encode ile aynı arayüzü sunar; torch yüklenmeden
+    çalışır (export hariç). quantize=True ise model dinamik int8'e çevrilir.
+    """
+
+    def __init__(self, model_name, cache_dir, quantize=False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.backend = 'onnx-int8' if quantize else 'onnx'
+        onnx_dir = os.path.join(cache_dir, 'onnx', model_name.replace('/', '__'))
+        model_path = os.path.join(onnx_dir, 'model.onnx')
+        if not os.path.exists(model_path):
+            _export_onnx(model_name, cache_dir, onnx_dir)
+
+        if quantize:
+            quantized_path = os.path.join(onnx_dir, 'model-int8.onnx')
+            if not os.path.exists(quantized_path):
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                logger.info("🔄 ONNX modeli int8'e quantize ediliyor...")
+                tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+                quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+                os.replace(tmp_path, quantized_path)
+            model_path = quantized_path
+
+        with open(os.path.join(onnx_dir, 'encoder_config.json')) as f:
+            config = json.load(f)
+        self._dimension = config['dimension']
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(onnx_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=config['pad_token_id'], pad_token=config['pad_token'])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(os.getenv('ONNX_NUM_THREADS', '1'))
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+    def get_sentence_embedding_dimension(self):
+        return self._dimension
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False,
+               convert_to_numpy=True, normalize_embeddings=False):
+        """SentenceTransformer.encode ile uyumlu: (n, dim) float32 numpy dizisi döner"""
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        outputs = []
+        for i in range(0, len(sentences), batch_size):
+            encodings = self.tokenizer.encode_batch(list(sentences[i:i+batch_size]))
+            input_ids = np.array([e.ids for e in encodings], dtype='int64')
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype='int64')
+            token_embeddings = self.session.run(
+                None, {'input_ids': input_ids, 'attention_mask': attention_mask}
+            )[0]
+
+            # Mean pooling (padding token'ları hariç)
+            mask = attention_mask[:, :, None].astype('float32')
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(embeddings.astype('float32'))
+
+        if not outputs:
+            return np.zeros((0, self._dimension), dtype='float32')
+        return np.vstack(outputs)
+
+
+def _get_or_load_model(model_name, cache_dir=None, backend=None):
     """
     Model'i singleton pattern ile yükle (process-level cache)
     Her process'te sadece bir kez yüklenir, thread-safe
+    
+    Args:
+        backend: 'torch' (varsayılan), 'onnx' veya 'onnx-int8' (EMBEDDING_BACKEND)
     """
     global _model_cache, _model_lock
     
+    if backend is None:
+        backend = EMBEDDING_BACKEND
+    key = (backend, model_name)
+    
     with _model_lock:
-        if model_name not in _model_cache:
-            logger.info(f"🔄 Embedding model yükleniyor: {model_name} (ilk yükleme, cache'e alınıyor)")
+        if key not in _model_cache:
+            logger.info(f"🔄 Embedding model yükleniyor: {model_name} [{backend}] (ilk yükleme, cache'e alınıyor)")
             
             # Cache dizini ayarla
             if cache_dir is None:
@@ -39,36 +258,669 @@ def _get_or_load_model(model_name, cache_dir=None):
             
             # Model'i cache dizininden yükle (disk cache kullan)
             try:
-                # Model cache mekanizması - disk'ten yükle
-                # RAM optimizasyonu: model'i daha verimli yükle
-                import torch
-                
-                # PyTorch bellek optimizasyonu
-                torch.set_num_threads(1)  # Tek thread kullan (bellek tasarrufu)
-                
-                model = SentenceTransformer(
-                    model_name,
-                    cache_folder=cache_dir,
-                    device='cpu',  # CPU kullan (GPU yoksa)
-                    model_kwargs={
-                        'low_cpu_mem_usage': True,  # Düşük bellek kullanımı
-                    }
-                )
-                
-                # Model'i eval moduna al (training modundan daha az bellek kullanır)
-                model.eval()
-                
-                # PyTorch cache'i temizle (bellek tasarrufu)
-                if hasattr(torch, 'empty_cache'):
-                    torch.empty_cache()
+                loaded_backend = backend
+                if backend in ('onnx', 'onnx-int8'):
+                    try:
+                        model = OnnxSentenceEncoder(model_name, cache_dir, quantize=(backend == 'onnx-int8'))
+                    except Exception as e:
+                        logger.warning(f"⚠️ ONNX backend kullanılamıyor, torch'a dönülüyor: {e}")
+                        model = _load_torch_model(model_name, cache_dir)
+                        loaded_backend = 'torch'
+                else:
+                    model = _load_torch_model(model_name, cache_dir)
                 
                 logger.info(f"✅ Embedding model hazır (boyut: {model.get_sentence_embedding_dimension()}, cache: {cache_dir}, RAM optimized)")
-                _model_cache[model_name] = model
+                _model_cache[key] = model
+                _loaded_backends[key] = loaded_backend
             except Exception as e:
                 logger.error(f"❌ Model yükleme hatası: {e}")
                 raise
         
-        return _model_cache[model_name]
+        return _model_cache[key]
+
+
+def turkish_lower(text):
+    """Türkçe kurallarıyla küçük harfe çevir (I -> ı, İ -> i)"""
+    return str(text).replace('I', 'ı').replace('İ', 'i').lower()
+
+
+def normalize_query(query):
+    """Sorguyu cache anahtarı için normalize et (Türkçe küçük harf, tek boşluk)"""
+    return ' '.join(turkish_lower(query).split())
+
+
+_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """BM25 için Türkçe küçük harfli kelime listesi"""
+    return _TOKEN_PATTERN.findall(turkish_lower(text))
+
+
+class BM25Index:
+    """
+    Bellek içi ters index (inverted index) + BM25 skorlama
+
+    Slot numaralarıyla çalışır (FAISSRetriever ile aynı), böylece etkinlikler
+    tek tek eklenip silinebilir ve metadata maskesi doğrudan uygulanabilir.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # kelime -> {slot: frekans}
+        self._doc_lengths = {}  # slot -> kelime sayısı
+        self._total_length = 0
+
+    def add(self, slot, text):
+        tokens = tokenize(text)
+        self._doc_lengths[slot] = len(tokens)
+        self._total_length += len(tokens)
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, tf in frequencies.items():
+            self._postings.setdefault(token, {})[slot] = tf
+
+    def remove(self, slot, text):
+        length = self._doc_lengths.pop(slot, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for token in set(tokenize(text)):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(slot, None)
+                if not postings:
+                    del self._postings[token]
+
+    def search(self, query, k, mask=None):
+        """
+        Returns:
+            list: (slot, skor) çiftleri, skora göre azalan sırada (en fazla k)
+        """
+        n_docs = len(self._doc_lengths)
+        if n_docs == 0:
+            return []
+        avg_length = self._total_length / n_docs
+
+        scores = {}
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for slot, tf in postings.items():
+                if mask is not None and not mask[slot]:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[slot] / avg_length)
+                scores[slot] = scores.get(slot, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class QueryEmbeddingCache:
+    """
+    Sorgu embedding'leri için sınırlı LRU cache (thread-safe)
+
+    Sorgu embedding'leri katalogdan bağımsızdır, bu yüzden cache process
+    seviyesinde tutulur ve index rebuild'lerinden etkilenmez.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def peek(self, key):
+        """Sayaçları ve LRU sırasını değiştirmeden oku"""
+        with self._lock:
+            return self._items.get(key)
+
+    def put(self, key, vector):
+        if self.maxsize <= 0:
+            return
+        vector.flags.writeable = False  # Paylaşılan vektör değiştirilmemeli
+        with self._lock:
+            self._items[key] = vector
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+_query_embedding_cache = QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def query_embedding_cache_stats():
+    """Sorgu embedding cache istatistikleri (hit/miss sayaçları)"""
+    return _query_embedding_cache.stats()
+
+
+class QueryEncodeBatcher:
+    """
+    Mikro-batch sorgu encoder'ı
+
+    Gunicorn thread'leri ve Telegram thread'i sorgularını kuyruğa bırakır; tek bir
+    worker thread birkaç ms içinde gelen sorguları (en fazla max_batch_size)
+    toplayıp tek forward pass'te encode eder ve her çağırana kendi vektörünü döndürür.
+    """
+
+    def __init__(self, model, max_batch_size=QUERY_BATCH_MAX_SIZE, max_wait_ms=QUERY_BATCH_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # İstatistikler
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self._latencies_ms = deque(maxlen=1000)  # kuyruk + encode süresi
+        self._batch_sizes = deque(maxlen=1000)
+
+    def encode(self, text):
+        """Tek sorguyu encode et (eşzamanlı çağrılarla aynı batch'te olabilir)"""
+        if self.max_batch_size <= 1:
+            return self._encode_batch([text])[0]
+
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        self._ensure_worker()
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='query-encode-batcher', daemon=True)
+                    self._thread.start()
+
+    def _encode_batch(self, texts):
+        return self.model.encode(
+            texts,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            batch_size=len(texts)
+        ).astype('float32')
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Aynı batch'teki tekrar eden sorgular bir kez encode edilir
+            unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = dict(zip(unique_texts, self._encode_batch(unique_texts)))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            with self._lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self._batch_sizes.append(len(batch))
+                self._latencies_ms.extend((done - started) * 1000 for _, _, started in batch)
+            for text, future, _ in batch:
+                future.set_result(vectors[text].copy())
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+            sizes = list(self._batch_sizes)
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches': self.batches,
+            'queries': self.queries,
+            'largest_batch': self.largest_batch,
+            'avg_batch_size': sum(sizes) / len(sizes) if sizes else 0.0,
+            'latency_p50_ms': percentile(latencies, 50),
+            'latency_p99_ms': percentile(latencies, 99)
+        }
+
+
+# Model başına bir batcher (process-level, model cache ile aynı ömür)
+_query_batchers = {}
+_query_batchers_lock = threading.Lock()
+
+
+def _get_query_batcher(embedding_id, model):
+    with _query_batchers_lock:
+        if embedding_id not in _query_batchers:
+            _query_batchers[embedding_id] = QueryEncodeBatcher(model)
+        return _query_batchers[embedding_id]
+
+
+def query_batcher_stats():
+    """Mikro-batch encoder istatistikleri (model başına batch boyutu ve gecikme)"""
+    with _query_batchers_lock:
+        batchers = dict(_query_batchers)
+    return {embedding_id: batcher.stats() for embedding_id, batcher in batchers.items()}
+
+
+def _default_model_name():
+    # Varsayılan olarak Türkçe destekleyen model kullan
+    # Environment variable ile override edilebilir
+    return os.getenv('EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+
+
+def _embedding_id(model_name):
+    """
+    Backend'ler sayısal olarak birebir aynı değil: cache anahtarları backend'e göre ayrılır
+
+    Model yüklendiyse gerçekten yüklenen backend kullanılır (ONNX yüklenemeyip torch'a
+    dönüldüyse torch vektörleri ONNX kimliğiyle saklanmaz); yüklenmediyse EMBEDDING_BACKEND.
+    """
+    backend = _loaded_backends.get((EMBEDDING_BACKEND, model_name), EMBEDDING_BACKEND)
+    return model_name if backend == 'torch' else f"{model_name}#{backend}"
+
+
+def resolve_index_type(n_events, index_type=None):
+    """RAG_INDEX_TYPE ayarını katalog boyutuna göre somut index tipine çevir"""
+    index_type = (index_type or RAG_INDEX_TYPE).lower()
+    if index_type == 'auto':
+        return 'hnsw' if n_events >= RAG_ANN_MIN_EVENTS else 'flat'
+    if index_type not in ('flat', 'hnsw', 'ivf'):
+        logger.warning(f"Bilinmeyen RAG_INDEX_TYPE '{index_type}', flat kullanılıyor")
+        return 'flat'
+    if index_type == 'ivf' and n_events < 39:
+        # IVF eğitimi için yeterli vektör yok
+        return 'flat'
+    return index_type
+
+
+def resolve_vector_storage(n_events, dimension, storage=None):
+    """RAG_VECTOR_STORAGE ayarını kullanılabilir saklama tipine çevir"""
+    storage = (storage or RAG_VECTOR_STORAGE).lower()
+    if storage not in ('float32', 'float16', 'pq'):
+        logger.warning(f"Bilinmeyen RAG_VECTOR_STORAGE '{storage}', float32 kullanılıyor")
+        return 'float32'
+    if storage == 'pq' and (n_events < PQ_MIN_TRAIN or dimension % _pq_m(dimension)):
+        # Küçük katalogda PQ kod kitabı eğitilemez, float16 yeterince küçük
+        return 'float16'
+    return storage
+
+
+def _pq_m(dimension):
+    """Boyutu tam bölen en büyük PQ alt vektör sayısı (<= RAG_PQ_M)"""
+    return next(m for m in range(min(RAG_PQ_M, dimension), 0, -1) if dimension % m == 0)
+
+
+def build_faiss_index(embeddings, ids, index_type='flat', storage='float32'):
+    """
+    Slot ID'li FAISS index'i kur
+
+    Args:
+        embeddings: float32 vektör matrisi
+        ids: Her vektörün slot numarası (int64)
+        index_type: 'flat', 'hnsw' veya 'ivf'
+        storage: 'float32', 'float16' veya 'pq' (index içindeki vektör kodlaması)
+
+    Returns:
+        faiss.IndexIDMap2 (tek etkinlik eklenip silinebilir). IVF slot ID'lerini
+        kendisi tuttuğu için sarılmadan döner. flat + pq tek listeli IVFPQ'dur:
+        IndexPQ ID selector (filtreli arama) desteklemez, tek liste yine tam tarama yapar.
+    """
+    dimension = embeddings.shape[1]
+    fp16 = faiss.ScalarQuantizer.QT_fp16
+    if index_type == 'hnsw':
+        if storage == 'float16':
+            inner = faiss.IndexHNSWSQ(dimension, fp16, RAG_HNSW_M)
+        elif storage == 'pq':
+            inner = faiss.IndexHNSWPQ(dimension, _pq_m(dimension), RAG_HNSW_M)
+        else:
+            inner = faiss.IndexHNSWFlat(dimension, RAG_HNSW_M)
+        inner.hnsw.efConstruction = max(40, RAG_HNSW_M * 2)
+        inner.hnsw.efSearch = RAG_HNSW_EF_SEARCH
+    elif index_type == 'ivf':
+        # Liste sayısı ~4*sqrt(n), her listede en az ~39 eğitim vektörü
+        nlist = max(1, min(int(4 * math.sqrt(len(embeddings))), len(embeddings) // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if storage == 'float16':
+            inner = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, fp16)
+        elif storage == 'pq':
+            inner = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_m(dimension), 8)
+        else:
+            inner = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        inner.nprobe = min(RAG_IVF_NPROBE, nlist)
+    elif storage == 'float16':
+        inner = faiss.IndexScalarQuantizer(dimension, fp16)
+    elif storage == 'pq':
+        inner = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, 1, _pq_m(dimension), 8)
+    else:
+        inner = faiss.IndexFlatL2(dimension)  # L2 mesafe metriği, tam arama
+
+    if not inner.is_trained:
+        inner.train(embeddings)
+    index = inner if isinstance(inner, faiss.IndexIVF) else faiss.IndexIDMap2(inner)
+    if len(ids):
+        index.add_with_ids(embeddings, ids)
+    return index
+
+
+def _index_settings():
+    """Index yapısını belirleyen ayarlar (artifact manifest'inde saklanır ve karşılaştırılır)"""
+    return {
+        'index_type': RAG_INDEX_TYPE,
+        'vector_storage': RAG_VECTOR_STORAGE,
+        'ann_min_events': RAG_ANN_MIN_EVENTS,
+        'hnsw_m': RAG_HNSW_M,
+        'pq_m': RAG_PQ_M,
+    }
+
+
+def _inner_index(index):
+    """IDMap ile sarılmış index'in asıl (HNSW/IVF/flat) index'i"""
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+
+def _index_type_of(index):
+    """Diskten okunan index'in tipini bul"""
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(inner, faiss.IndexIVF) and inner.nlist > 1:
+        return 'ivf'
+    return 'flat'
+
+
+def _reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Birden fazla sıralamayı reciprocal rank fusion ile birleştir
+
+    Args:
+        rankings: Her biri (slot, skor) listesi olan sıralamalar (en iyi önce)
+
+    Returns:
+        list: (slot, rrf_skoru) çiftleri, azalan sırada
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (slot, _) in enumerate(ranking):
+            fused[slot] = fused.get(slot, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _embedding_key(model_name, text):
+    """(model adı, aranabilir metin) çiftinin içerik hash'i"""
+    return hashlib.sha1(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+
+def _date_to_int(value):
+    """Etkinlik tarihini YYYYMMDD tamsayısına çevir (bilinmiyorsa 0)"""
+    if value is None:
+        return 0
+    if hasattr(value, 'year'):
+        return value.year * 10000 + value.month * 100 + value.day
+    digits = str(value)[:10].replace('-', '')
+    return int(digits) if len(digits) == 8 and digits.isdigit() else 0
+
+
+def _build_searchable_text(event):
+    """Etkinlik alanlarından aranabilir metin oluştur"""
+    return f"{event.get('title', '')} {event.get('description', '')} {event.get('city', '')} {event.get('category', '')} {event.get('venue', '')}"
+
+
+class EventRecord:
+    """
+    Retriever içinde tutulan kompakt etkinlik kaydı
+
+    Mongo dokümanının sadece arama ve prompt için gereken alanları saklanır
+    (__slots__, tekrar eden şehir/kategori/mekan string'leri intern edilir,
+    açıklama kesilir). dict gibi okunur: record.get('title'), record['date'].
+    'snippets': index zamanında bir kez üretilen prompt/yanıt metinleri.
+    """
+
+    FIELDS = ('_id', 'title', 'description', 'city', 'category', 'date', 'time', 'venue', 'price', 'url')
+    __slots__ = FIELDS + ('snippets',)
+    _INTERNED = ('city', 'category', 'date', 'time', 'venue', 'price')
+
+    def __init__(self, event):
+        self.snippets = None
+        for field in self.FIELDS:
+            value = event.get(field)
+            if value is None or value == '':
+                value = None
+            elif field in self._INTERNED:
+                value = sys.intern(str(value))
+            elif field == 'description':
+                value = str(value)[:RAG_DESCRIPTION_MAX_CHARS]
+            elif not isinstance(value, str):
+                value = str(value)  # ObjectId
+            setattr(self, field, value)
+
+    @classmethod
+    def from_event(cls, event):
+        """Mongo dokümanı (veya zaten kayıt) -> EventRecord"""
+        return event if isinstance(event, cls) else cls(event)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.FIELDS else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def to_dict(self):
+        """JSON'a yazılabilir dict (boş alanlar hariç)"""
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+    def __repr__(self):
+        return f"EventRecord({self._id!r}, {self.title!r})"
+
+
+class EmbeddingStore:
+    """
+    Diskte kalıcı embedding deposu (içerik hash'i -> vektör)
+
+    Rebuild sırasında sadece yeni veya değişen etkinlikler encode edilir,
+    geri kalanlar diskten okunur. Model başına iki dosya vardır:
+    - .npy: (key, vector) kayıtları; mmap ile açılır, vektörler RAM'e kopyalanmaz
+    - .log: sonradan eklenen kayıtlar; upsert sadece yeni vektörleri dosyanın sonuna yazar
+    Tam rebuild (save) log'u ana dosyaya katar. Süreç başına tek depo: embedding_store().
+    """
+
+    LOG_COMPACT_MIN = 1024  # Log bu kadar kaydı ve ana dosyanın %10'unu geçince ana dosyaya katılır
+
+    def __init__(self, model_name, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = _embedding_cache_dir()
+        slug = model_name.replace('/', '__')
+        self.path = os.path.join(cache_dir, f"{slug}.npy")
+        self.log_path = os.path.join(cache_dir, f"{slug}.log")
+        self._lock = threading.Lock()
+        self._records = None  # mmap'li (key, vector) kayıtları
+        self._rows = {}  # hash -> ana dosyadaki satır
+        self._new = {}  # hash -> vektör (log'da veya henüz hiç yazılmamış)
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                records = np.load(self.path, mmap_mode='r')
+                self._rows = {k.decode('ascii'): i for i, k in enumerate(records['key'])}
+                self._records = records
+                logger.info(f"📦 Embedding cache yüklendi: {len(self._rows)} vektör ({self.path})")
+            except Exception as e:
+                logger.warning(f"Embedding cache okunamadı, yeniden oluşturulacak: {e}")
+                self._records, self._rows = None, {}
+        elif os.path.exists(self.path[:-4] + '.npz'):
+            # Eski sürümün .npz deposu: vektörler bir sonraki save() ile yeni dosyaya taşınır
+            try:
+                with np.load(self.path[:-4] + '.npz') as data:
+                    self._new = {k.decode('ascii'): v for k, v in zip(data['keys'], data['vectors'].astype('float32'))}
+            except Exception as e:
+                logger.warning(f"Eski embedding cache okunamadı: {e}")
+        self._new.update(self._read_log())
+
+    def _read_log(self):
+        """Log'daki kayıtlar (yarım kalmış son yazma atlanır)"""
+        rows = {}
+        if not os.path.exists(self.log_path):
+            return rows
+        with open(self.log_path, 'rb') as f:
+            while True:
+                try:
+                    batch = np.load(f)
+                except Exception:
+                    break  # Dosya sonu veya yarım kayıt
+                rows.update((k.decode('ascii'), v) for k, v in zip(batch['key'], batch['vector']))
+        return rows
+
+    @staticmethod
+    def _to_records(keys, vectors):
+        vectors = np.asarray(vectors, dtype='float32')
+        records = np.empty(len(keys), dtype=[('key', 'S40'), ('vector', 'float32', vectors.shape[1:])])
+        records['key'] = [k.encode('ascii') for k in keys]
+        records['vector'] = vectors
+        return records
+
+    def get(self, key):
+        with self._lock:
+            vector = self._new.get(key)
+            if vector is None and key in self._rows:
+                vector = np.array(self._records['vector'][self._rows[key]])
+            return vector
+
+    def put_many(self, keys, vectors):
+        """Vektörleri depoya ekle (diske save() veya append() ile yazılır)"""
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._new[key] = vector
+
+    def append(self, keys, vectors):
+        """Yeni vektörleri ekle ve sadece onları log'un sonuna yaz (tüm depo yeniden yazılmaz)"""
+        if not len(keys):
+            return
+        self.put_many(keys, vectors)
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'ab') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                np.save(f, self._to_records(keys, vectors))
+        except Exception as e:
+            logger.warning(f"Embedding cache log'u yazılamadı: {e}")
+        if len(self._new) > max(self.LOG_COMPACT_MIN, len(self._rows) // 10):
+            self.save()
+
+    def save(self, keep_keys=None):
+        """
+        Depoyu (log dahil) tek dosyaya atomik olarak yaz ve log'u boşalt
+
+        Args:
+            keep_keys: Verilirse sadece bu hash'ler saklanır (silinen etkinlikler budanır)
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.log_path, 'ab') as log, self._lock:
+                # Diğer worker'ların log'a eklediği kayıtlar da kaybolmadan ana dosyaya katılır
+                fcntl.flock(log, fcntl.LOCK_EX)
+                new = self._read_log()
+                new.update(self._new)
+                keys = [k for k in self._rows if k not in new] + list(new)
+                if keep_keys is not None:
+                    keep_keys = set(keep_keys)
+                    keys = [k for k in keys if k in keep_keys]
+                if not keys:
+                    return
+                vectors = [new[k] if k in new else self._records['vector'][self._rows[k]] for k in keys]
+                records = self._to_records(keys, np.vstack(vectors))
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, records)
+                os.replace(tmp_path, self.path)
+                log.truncate(0)
+                if os.path.exists(self.path[:-4] + '.npz'):
+                    os.remove(self.path[:-4] + '.npz')
+                # Eski dosyanın mmap'i bırakılır, yeni dosya açılır
+                self._records = np.load(self.path, mmap_mode='r')
+                self._rows = {k: i for i, k in enumerate(keys)}
+                self._new = {}
+        except Exception as e:
+            logger.warning(f"Embedding cache yazılamadı: {e}")
+
+
+def _embedding_cache_dir():
+    return os.getenv('EMBEDDING_CACHE_DIR', os.path.join(os.getenv('HF_HOME', '/app/model_cache'), 'embedding_cache'))
+
+
+_embedding_stores = {}  # (dizin, embedding kimliği) -> EmbeddingStore (süreç başına tek depo)
+_embedding_stores_lock = threading.Lock()
+
+
+def embedding_store(embedding_id):
+    """Bu süreçteki EmbeddingStore (ilk çağrıda diskten açılır, sonra tekrar okunmaz)"""
+    cache_dir = _embedding_cache_dir()
+    with _embedding_stores_lock:
+        key = (cache_dir, embedding_id)
+        store = _embedding_stores.get(key)
+        if store is None:
+            store = _embedding_stores[key] = EmbeddingStore(embedding_id, cache_dir)
+        return store
+
+
+def _prune_artifacts(directory, keep, max_versions=2):
+    """Eski artifact versiyonlarını sil (son max_versions tutulur, açık mmap'ler etkilenmez)"""
+    try:
+        versions = sorted(
+            (name for name in os.listdir(directory) if name.startswith('v') and name != keep),
+            key=lambda name: os.path.getmtime(os.path.join(directory, name)),
+            reverse=True
+        )
+        for name in versions[max_versions - 1:]:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    except OSError as e:
+        logger.warning(f"Eski artifact'ler silinemedi: {e}")
 
 
 class FAISSRetriever:
@@ -87,125 +939,593 @@ class FAISSRetriever:
             events: Etkinlik listesi (MongoDB cursor veya list)
             model_name: Huggingface embedding model (varsayılan: Türkçe destekleyen model)
         """
+        texts = self._init_catalogue(events, model_name)
+
+        # 📦 Kalıcı embedding cache: değişmeyen etkinlikler diskten yüklenir
+        embeddings = self._stored_embeddings(texts, prune=True)
+
+        # Geçici listeyi temizle (aranabilir metinler embedding'lerden sonra tutulmaz)
+        texts = None
+
+        # 🗄️ FAISS vektor database oluştur (hızlı benzerlik araması için)
+        # IndexIDMap2: vektörler slot numarasıyla eklenir, böylece tek etkinlik
+        # eklenip silinebilir (tüm index'i yeniden kurmadan)
+        # Küçük kataloglarda tam arama (flat), büyüklerde yaklaşık arama (HNSW/IVF)
+        self.index_type = resolve_index_type(len(self.events))
+        self.vector_storage = resolve_vector_storage(len(self.events), embeddings.shape[1])
+        self.index = build_faiss_index(embeddings, np.arange(len(self.events), dtype='int64'),
+                                       self.index_type, self.vector_storage)
+
+        # Vektörler artık sadece index'te (sıkıştırılmış olabilir): NumPy kopyası tutulmaz
+        embeddings = None
+        import gc
+        gc.collect()
+        
+        logger.info(f"✅ FAISS Retriever hazır: {len(self.events)} etkinlik indekslendi "
+                    f"({self.index_type}/{self.vector_storage}, RAM optimized)")
+
+    def _init_catalogue(self, events, model_name=None):
+        """
+        Etkinlik listesi, metadata, BM25 ve model ayarları (embedding hariç ortak kurulum)
+
+        Returns:
+            list: Slot sırasıyla aranabilir metinler (silinen slotlar None)
+        """
         # Türkçe destekleyen model kullan (performans için kritik)
         # paraphrase-multilingual-MiniLM-L12-v2: ~120MB, 384 dim, Türkçe desteği var
         # all-MiniLM-L6-v2: ~80MB, 384 dim (İngilizce odaklı, Türkçe için performans düşük)
         if model_name is None:
-            # Varsayılan olarak Türkçe destekleyen model kullan
-            # Environment variable ile override edilebilir
-            model_name = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-        # Convert MongoDB cursor to list if needed
-        if hasattr(events, '__iter__') and not isinstance(events, (list, tuple)):
-            self.events = list(events)
-        else:
-            self.events = events
-        
-        # Model'i singleton pattern ile yükle (process-level cache)
-        cache_dir = os.getenv('HF_HOME', '/app/model_cache')
-        self.model = _get_or_load_model(model_name, cache_dir=cache_dir)
+            model_name = _default_model_name()
+        # MongoDB dokümanları kompakt kayıtlara çevrilir (tam doküman tutulmaz)
+        # self.events[slot] -> EventRecord, silinen slotlar None olur
+        self.events = [EventRecord.from_event(e) if e is not None else None for e in events]
+        self._slot_by_id = {str(e.get('_id')): slot for slot, e in enumerate(self.events) if e is not None}
+        self._lock = threading.RLock()
+
+        # 🏷️ Filtreleme için kolon bazlı metadata (slot sırasıyla, arama öncesi maske)
+        self._city_codes = {}
+        self._category_codes = {}
+        self._meta_city, self._meta_category, self._meta_date = self._build_metadata(self.events)
         
+        # Model sadece encode gerektiğinde yüklenir (singleton, process-level cache)
+        # Tüm embedding'ler cache'ten gelirse model yüklenmeden index kurulur
+        self._cache_dir = os.getenv('HF_HOME', '/app/model_cache')
+        self.model_name = model_name
+        self._model = None
+        self.embedding_id = _embedding_id(model_name)
+        self._mmapped = False  # True: index artifact'ten salt okunur mmap (worker'lar arasında paylaşılır)
+        self.index_type = 'flat'
+        self.vector_storage = 'float32'
+        self._tombstones = set()  # Silinmiş ama index'te duran slotlar (HNSW veya mmap'li index)
+        # mmap'li index'e dokunulmaz: sonradan eklenen vektörler bellekteki küçük flat overlay'e gider
+        self._overlay = None
+        self._overlay_start = len(self.events)  # Bu slot ve sonrası overlay'de
+        self._snippet_renderers = ()
+
         # Her etkinlik için aranabilir metin oluştur
-        self.texts = []
-        for e in self.events:
-            # Create searchable text from event fields
-            searchable_text = f"{e.get('title', '')} {e.get('description', '')} {e.get('city', '')} {e.get('category', '')} {e.get('venue', '')}"
-            self.texts.append(searchable_text)
-        
-        # 📊 Tüm etkinlikleri embedding'e çevir (vektör temsili)
-        # Batch processing ile bellek kullanımını optimize et
-        logger.info(f"🔄 {len(self.events)} etkinlik vektörlere dönüştürülüyor...")
-        
+        texts = [_build_searchable_text(e) if e is not None else None for e in self.events]
+
+        # 🔤 BM25 ters index'i (tam eşleşen sanatçı/mekan adları için)
+        self.bm25 = BM25Index()
+        for slot, text in enumerate(texts):
+            if text is not None:
+                self.bm25.add(slot, text)
+        return texts
+
+    @property
+    def model(self):
+        """Embedding modeli (ilk erişimde yüklenir)"""
+        if self._model is None:
+            self._model = _get_or_load_model(self.model_name, cache_dir=self._cache_dir)
+        return self._model
+
+    def _model_ready(self):
+        """Model bu process'te yüklü mü? (yüklemeyi tetiklemez)"""
+        return self._model is not None or (EMBEDDING_BACKEND, self.model_name) in _model_cache
+
+    def _warm_up_model(self):
+        """Modeli arka planda yükle (bu sırada sorgular BM25 ile cevaplanır)"""
+        global _model_warmup_thread
+        with _model_warmup_lock:
+            if _model_warmup_thread is None or not _model_warmup_thread.is_alive():
+                logger.info("🔄 Embedding model arka planda yükleniyor (BM25 hızlı yolu aktif)")
+                _model_warmup_thread = threading.Thread(target=lambda: self.model, daemon=True)
+                _model_warmup_thread.start()
+
+    def upsert(self, events):
+        """
+        Etkinlikleri index'e ekle veya güncelle (sadece verilen etkinlikler encode edilir)
+
+        Args:
+            events: Etkinlik listesi ('_id' alanı zorunlu)
+        """
+        events = [EventRecord.from_event(e) for e in events]
+        if not events:
+            return
+        texts = [_build_searchable_text(e) for e in events]
+        # Metni değişmeyen etkinliklerin vektörleri embedding deposundan gelir
+        embedding_id = self.embedding_id
+        embeddings = self._stored_embeddings(texts)
+        if self.embedding_id != embedding_id:
+            # Index'teki vektörler başka backend'in: karışık index yerine tam rebuild
+            self.embedding_id = embedding_id
+            raise RuntimeError("Embedding backend değişti, index yeniden kurulmalı")
+
+        with self._lock:
+            for event in events:
+                self._remove_slot(self._slot_by_id.pop(str(event['_id']), None))
+
+            first_slot = len(self.events)
+            slots = np.arange(first_slot, first_slot + len(events), dtype='int64')
+            for slot, event, text in zip(slots, events, texts):
+                self._render_snippets(event)
+                self.events.append(event)
+                self.bm25.add(int(slot), text)
+                self._slot_by_id[str(event['_id'])] = int(slot)
+            city, category, date = self._build_metadata(events)
+            self._meta_city = np.concatenate([self._meta_city, city])
+            self._meta_category = np.concatenate([self._meta_category, category])
+            self._meta_date = np.concatenate([self._meta_date, date])
+            self._add_vectors(embeddings, slots)
+            self._maybe_compact()
+
+        logger.info(f"➕ {len(events)} etkinlik index'e eklendi/güncellendi")
+
+    def remove(self, event_ids):
+        """
+        Etkinlikleri index'ten sil
+
+        Args:
+            event_ids: Silinecek etkinlik ID'leri (ObjectId veya str)
+        """
+        removed = 0
+        with self._lock:
+            for event_id in event_ids:
+                slot = self._slot_by_id.pop(str(event_id), None)
+                if slot is not None:
+                    self._remove_slot(slot)
+                    removed += 1
+            self._maybe_compact()
+        if removed:
+            logger.info(f"🗑️ {removed} etkinlik index'ten silindi")
+
+    def _remove_slot(self, slot):
+        """Slot'u index'ten çıkar (slot numaraları yeniden kullanılmaz)"""
+        if slot is None:
+            return
+        if self._overlay is not None and slot >= self._overlay_start:
+            self._overlay.remove_ids(np.array([slot], dtype='int64'))
+        elif self.index_type == 'hnsw' or self._mmapped:
+            self._tombstones.add(slot)
+        else:
+            self.index.remove_ids(np.array([slot], dtype='int64'))
+        # Aranabilir metin saklanmaz: kayıttan aynı metin yeniden üretilir
+        self.bm25.remove(slot, _build_searchable_text(self.events[slot]))
+        self.events[slot] = None
+        self._meta_city[slot] = -1
+        self._meta_category[slot] = -1
+        self._meta_date[slot] = 0
+
+    def set_snippet_renderers(self, renderers):
+        """
+        Etkinlik başına metin üreticilerini ayarla ve tüm kayıtlar için bir kez çalıştır
+
+        Sonuçlar record.snippets tuple'ında (renderer sırasıyla) saklanır; yanıt
+        üretirken her istekte yeniden formatlama yapılmaz. Sonraki upsert'ler de
+        aynı renderer'larla işlenir.
+
+        Args:
+            renderers: record -> str fonksiyonları
+        """
+        with self._lock:
+            self._snippet_renderers = tuple(renderers)
+            for event in self.events:
+                if event is not None:
+                    self._render_snippets(event)
+
+    def _render_snippets(self, event):
+        event.snippets = tuple(render(event) for render in self._snippet_renderers) or None
+
+    def _add_vectors(self, embeddings, slots):
+        """Vektörleri ekle (mmap'li index paylaşılmaya devam etsin diye overlay'e)"""
+        if not self._mmapped:
+            self.index.add_with_ids(embeddings, slots)
+            return
+        if self._overlay is None:
+            self._overlay = faiss.IndexIDMap2(faiss.IndexFlatL2(self.index.d))
+        self._overlay.add_with_ids(embeddings, slots)
+
+    def _pending_changes(self):
+        """Ana index'e yansımamış değişiklik sayısı (işaretli slotlar + overlay)"""
+        return len(self._tombstones) + (self._overlay.ntotal if self._overlay is not None else 0)
+
+    def _maybe_compact(self):
+        """
+        İşaretli slot ve overlay oranı yüksekse index'i canlı slotlardan bellekte yeniden kur
+
+        mmap'li index'te bu, o worker için paylaşımın bitmesi demektir; scraper sadece
+        değişen etkinlikleri yazdığı için normalde overlay küçük kalır.
+        """
+        if self._pending_changes() <= TOMBSTONE_REBUILD_RATIO * self.index.ntotal:
+            return
+        self.index = self._live_index()
+        self._tombstones = set()
+        self._overlay = None
+        self._mmapped = False
+        logger.info(f"🧹 FAISS index yeniden kuruldu ({self.index.ntotal} canlı etkinlik)")
+
+    def _live_index(self):
+        """Sadece canlı slotlardan (ana index + overlay) yeni bir index kur"""
+        live = np.array(sorted(self._slot_by_id.values()), dtype='int64')
+        embeddings = self._reconstruct(live) if len(live) else np.zeros((0, self.index.d), dtype='float32')
+        return build_faiss_index(embeddings, live, self.index_type, self.vector_storage)
+
+    def _reconstruct(self, slots):
+        """Slotların vektörleri (overlay'deki slotlar overlay'den okunur)"""
+        if isinstance(self.index, faiss.IndexIVF) and self.index.direct_map.type == faiss.DirectMap.NoMap:
+            # IVF slot -> liste konumu eşlemesini sadece gerektiğinde tutar
+            self.index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        if self._overlay is None:
+            return self.index.reconstruct_batch(slots)
+        in_overlay = slots >= self._overlay_start
+        vectors = np.empty((len(slots), self.index.d), dtype='float32')
+        if (~in_overlay).any():
+            vectors[~in_overlay] = self.index.reconstruct_batch(slots[~in_overlay])
+        if in_overlay.any():
+            vectors[in_overlay] = self._overlay.reconstruct_batch(slots[in_overlay])
+        return vectors
+
+    def save(self, directory=None, revision=0):
+        """
+        Retriever durumunu versiyonlu bir artifact olarak diske yaz
+
+        Yeni versiyon geçici dizine yazılır, sonra 'CURRENT' işaretçisi atomik
+        olarak güncellenir; okuyan worker'lar hiçbir zaman yarım dosya görmez.
+
+        Args:
+            directory: Artifact kök dizini (varsayılan: RAG_INDEX_DIR)
+            revision: Index'in içerdiği son katalog revizyonu
+
+        Returns:
+            str: Yazılan artifact dizini
+        """
+        directory = directory or RAG_INDEX_DIR
+        name = f"v{ARTIFACT_FORMAT_VERSION}-{int(time.time() * 1000)}-r{revision}"
+        tmp_dir = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+        os.makedirs(tmp_dir)
+
+        with self._lock:
+            # Overlay veya işaretli slot varsa tek parça index yazılır
+            index = self._live_index() if self._pending_changes() else self.index
+            faiss.write_index(index, os.path.join(tmp_dir, 'index.faiss'))
+            with open(os.path.join(tmp_dir, 'events.json'), 'w', encoding='utf-8') as f:
+                json.dump([e.to_dict() if e is not None else None for e in self.events], f, ensure_ascii=False)
+            manifest = {
+                'format_version': ARTIFACT_FORMAT_VERSION,
+                'embedding_id': self.embedding_id,
+                'dimension': self.index.d,
+                'count': len(self._slot_by_id),
+                'index_type': self.index_type,
+                'vector_storage': self.vector_storage,
+                'settings': _index_settings(),
+                'slots': len(self.events),
+                'revision': revision,
+                'created_at': time.time()
+            }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        final_dir = os.path.join(directory, name)
+        os.rename(tmp_dir, final_dir)
+        pointer_tmp = os.path.join(directory, f".CURRENT.{os.getpid()}.tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(name)
+        os.replace(pointer_tmp, os.path.join(directory, 'CURRENT'))
+        _prune_artifacts(directory, keep=name)
+
+        logger.info(f"💾 RAG index artifact kaydedildi: {final_dir} ({index.ntotal} etkinlik, revizyon {revision})")
+        return final_dir
+
+    @classmethod
+    def load(cls, directory=None, model_name=None):
+        """
+        Kaydedilmiş artifact'i aç (encode yok; index mmap ile)
+
+        Returns:
+            (retriever, manifest) tuple veya artifact yoksa/uyumsuzsa None
+        """
+        directory = directory or RAG_INDEX_DIR
+        pointer = os.path.join(directory, 'CURRENT')
+        if not os.path.exists(pointer):
+            return None
+
+        try:
+            with open(pointer) as f:
+                path = os.path.join(directory, f.read().strip())
+            with open(os.path.join(path, 'manifest.json')) as f:
+                manifest = json.load(f)
+
+            expected_id = _embedding_id(model_name or _default_model_name())
+            # Farklı RAG_INDEX_TYPE/RAG_VECTOR_STORAGE/HNSW/PQ ayarlarıyla kurulmuş index kullanılmaz
+            if (manifest.get('format_version') != ARTIFACT_FORMAT_VERSION
+                    or manifest.get('embedding_id') != expected_id
+                    or manifest.get('settings') != _index_settings()):
+                logger.info(f"RAG index artifact uyumsuz, yeniden oluşturulacak: {path}")
+                return None
+
+            with open(os.path.join(path, 'events.json'), encoding='utf-8') as f:
+                events = json.load(f)
+
+            retriever = cls.__new__(cls)
+            retriever._init_catalogue(events, model_name)
+            # IO_FLAG_MMAP_IFC: flat index kodları kopyalanmadan dosyadan okunur (eski faiss'te normal okuma)
+            flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+            retriever.index = faiss.read_index(os.path.join(path, 'index.faiss'), flags)
+            retriever.vector_storage = manifest['vector_storage']
+            retriever.index_type = _index_type_of(retriever.index)
+            if retriever.index_type == 'hnsw':
+                # Index'te duran ama silinmiş slotlar
+                indexed = faiss.vector_to_array(retriever.index.id_map)
+                retriever._tombstones = {int(slot) for slot in indexed if events[slot] is None}
+            retriever._mmapped = True
+        except Exception as e:
+            logger.warning(f"RAG index artifact okunamadı: {e}")
+            return None
+
+        logger.info(f"📂 RAG index artifact yüklendi: {path} ({manifest['count']} etkinlik, revizyon {manifest['revision']})")
+        return retriever, manifest
+
+    def _build_metadata(self, events):
+        """Şehir/kategori kodları ve YYYYMMDD tarihleri için kolon dizileri oluştur"""
+        def code(codes, event, field):
+            if event is None:  # Silinmiş slot
+                return -1
+            return codes.setdefault(str(event.get(field) or '').lower(), len(codes))
+
+        city = np.array([code(self._city_codes, e, 'city') for e in events], dtype='int32')
+        category = np.array([code(self._category_codes, e, 'category') for e in events], dtype='int32')
+        date = np.array([_date_to_int(e.get('date')) if e is not None else 0 for e in events], dtype='int32')
+        return city, category, date
+
+    def _filter_mask(self, city_filter=None, category_filter=None, date_range=None):
+        """
+        Metadata filtrelerine uyan slotların maskesi (filtre yoksa None)
+        Bilinmeyen şehir/kategori hiçbir slot ile eşleşmez.
+        """
+        start_date, end_date = date_range or (None, None)
+        if not (city_filter or category_filter or start_date or end_date):
+            return None
+
+        mask = self._meta_city >= 0
+        if city_filter:
+            mask &= self._meta_city == self._city_codes.get(city_filter.lower(), -2)
+        if category_filter:
+            mask &= self._meta_category == self._category_codes.get(category_filter.lower(), -2)
+        if start_date:
+            mask &= self._meta_date >= _date_to_int(start_date)
+        if end_date:
+            mask &= (self._meta_date > 0) & (self._meta_date <= _date_to_int(end_date))
+        return mask
+
+    def _to_results(self, ranked, degraded=False):
+        """(slot, skor) listesini {'event', 'score'} sonuçlarına çevir (degraded: sadece BM25)"""
+        with self._lock:
+            events = [self.events[slot] for slot, _ in ranked]
+        results = [{'event': event, 'score': score}
+                   for event, (_, score) in zip(events, ranked) if event is not None]
+        if degraded:
+            for result in results:
+                result['degraded'] = True
+        return results
+
+    def embed_query(self, query):
+        """
+        Sorguyu normalize edip embedding'e çevir (LRU cache'ten)
+
+        Returns:
+            np.ndarray: float32, normalize edilmiş, salt okunur vektör
+        """
+        normalized = normalize_query(query)
+        key = (self.embedding_id, normalized)
+        query_embedding = _query_embedding_cache.get(key)
+        if query_embedding is None:
+            # Normalize edilmiş metin encode edilir: aynı anahtar her zaman aynı vektörü verir
+            # Eşzamanlı sorgular mikro-batch ile tek forward pass'te encode edilir
+            query_embedding = _get_query_batcher(self.embedding_id, self.model).encode(normalized)
+            _query_embedding_cache.put(key, query_embedding)
+        return query_embedding
+
+    def cached_query_embedding(self, query):
+        """Sorgunun daha önce hesaplanmış embedding'i (yoksa None, encode tetiklemez)"""
+        return _query_embedding_cache.peek((self.embedding_id, normalize_query(query)))
+
+    def _stored_embeddings(self, texts, prune=False):
+        """
+        Metinlerin embedding'leri: içerik hash'i EmbeddingStore'da olanlar encode edilmez
+
+        Args:
+            texts: Aranabilir metinler
+            prune: True ise depoda sadece bu metinlerin vektörleri kalır (tam rebuild)
+
+        Returns:
+            np.ndarray: float32, metin sırasıyla
+        """
+        store = embedding_store(self.embedding_id)
+        keys = [_embedding_key(self.embedding_id, text) for text in texts]
+        cached = [store.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+
+        # 📊 Sadece yeni/değişen etkinlikleri embedding'e çevir (vektör temsili)
+        logger.info(f"🔄 {len(missing)}/{len(texts)} etkinlik vektörlere dönüştürülüyor "
+                    f"({len(texts) - len(missing)} cache'ten)...")
+        if missing and self._resolve_embedding_id():
+            # Beklenen backend yüklenemedi: vektörler yüklenen backend'in kimliğiyle aranır
+            return self._stored_embeddings(texts, prune)
+        if missing:
+            new_embeddings = self._encode_texts([texts[i] for i in missing])
+            for i, vector in zip(missing, new_embeddings):
+                cached[i] = vector
+            if prune:
+                # Tam rebuild: depo bu katalogla yeniden yazılır (silinen etkinlikler budanır)
+                store.put_many([keys[i] for i in missing], new_embeddings)
+                store.save(keep_keys=keys)
+            else:
+                store.append([keys[i] for i in missing], new_embeddings)
+        return np.vstack(cached).astype('float32')
+
+    def _resolve_embedding_id(self):
+        """
+        Modeli yükle ve embedding kimliğini gerçekten yüklenen backend'e göre güncelle
+
+        Returns:
+            bool: Kimlik değiştiyse True (örn. ONNX yüklenemedi, torch'a dönüldü)
+        """
+        self.model
+        embedding_id = _embedding_id(self.model_name)
+        if embedding_id == self.embedding_id:
+            return False
+        logger.warning(f"⚠️ Embedding kimliği {self.embedding_id} -> {embedding_id} (yüklenen backend farklı)")
+        self.embedding_id = embedding_id
+        return True
+
+    def _encode_texts(self, texts):
+        """Metinleri batch'ler halinde normalize embedding'lere çevir"""
         # Batch size ile bellek kullanımını kontrol et (büyük listeler için)
         # Daha küçük batch size = daha az bellek kullanımı
         batch_size = 16  # 32'den 16'ya düşürüldü (bellek tasarrufu)
         embeddings_list = []
-        
-        for i in range(0, len(self.texts), batch_size):
-            batch_texts = self.texts[i:i+batch_size]
+
+        for i in range(0, len(texts), batch_size):
+            batch_texts = texts[i:i+batch_size]
             # Normalize embeddings ve bellek optimizasyonu
             batch_embeddings = self.model.encode(
-                batch_texts, 
-                show_progress_bar=False, 
+                batch_texts,
+                show_progress_bar=False,
                 convert_to_numpy=True,
                 normalize_embeddings=True,  # Normalize et (bellek tasarrufu)
                 batch_size=8  # Model encode için daha küçük batch
             )
             embeddings_list.append(batch_embeddings.astype('float32'))
-            
+
             # Her batch'ten sonra bellek temizliği
             if i % (batch_size * 4) == 0:  # Her 4 batch'te bir
                 import gc
                 gc.collect()
-        
-        # Tüm batch'leri birleştir
-        self.embeddings = np.vstack(embeddings_list).astype('float32')
-        
-        # Geçici listeyi temizle
-        embeddings_list = None
-        import gc
-        gc.collect()
-        
-        # 🗄️ FAISS vektor database oluştur (hızlı benzerlik araması için)
-        dimension = self.embeddings.shape[1]  # Vektör boyutu (384)
-        self.index = faiss.IndexFlatL2(dimension)  # L2 mesafe metriği
-        self.index.add(self.embeddings)  # Vektörleri FAISS'e ekle
-        
-        logger.info(f"✅ FAISS Retriever hazır: {len(self.events)} etkinlik indekslendi (RAM optimized)")
-    
-    def retrieve(self, query, k=5, city_filter=None):
+
+        return np.vstack(embeddings_list).astype('float32')
+
+    def _vector_search(self, query_embedding, n, allowed=None):
+        """
+        En yakın n vektörü bul (self._lock altında çağrılır)
+
+        Args:
+            query_embedding: Normalize sorgu vektörü
+            n: Sonuç sayısı
+            allowed: Filtreye uyan slotlar (None = hepsi)
+
+        Returns:
+            (distances, slots) tuple'ı, 1 boyutlu diziler
         """
-        Kullanıcı sorgusuna en yakın etkinlikleri bul (semantik arama)
+        exact = self.index_type != 'flat' and allowed is not None and len(allowed) <= RAG_EXACT_SEARCH_MAX
+        if exact and self.index_type == 'hnsw':
+            # Seçici filtre: yaklaşık index filtreli aramada sonuç kaçırabilir,
+            # kalan az sayıda aday üzerinde tam arama hem doğru hem hızlı
+            distances = ((self._reconstruct(allowed) - query_embedding) ** 2).sum(axis=1)
+            order = np.argsort(distances)[:n]
+            return distances[order], allowed[order]
+
+        selector = None
+        if allowed is not None:
+            selector = faiss.IDSelectorBatch(allowed)
+        elif self._tombstones:
+            tombstones = faiss.IDSelectorBatch(np.fromiter(self._tombstones, dtype='int64'))
+            selector = faiss.IDSelectorNot(tombstones)
+        inner = _inner_index(self.index)
+        if self.index_type == 'hnsw':
+            # efSearch en az istenen sonuç sayısı kadar olmalı
+            inner.hnsw.efSearch = max(RAG_HNSW_EF_SEARCH, n)
+            params = None if selector is None else faiss.SearchParameters(sel=selector)
+        elif isinstance(inner, faiss.IndexIVF):
+            # Seçici filtrede tüm listeler taranır (filtreye uyan her vektör değerlendirilir)
+            # (flat + pq da tek listeli IVF'tir)
+            nprobe = inner.nlist if exact else min(RAG_IVF_NPROBE, inner.nlist)
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        else:
+            params = None if selector is None else faiss.SearchParameters(sel=selector)
+        distances, indices = self.index.search(query_embedding.reshape(1, -1), n, params=params)
+        if self._overlay is None or self._overlay.ntotal == 0:
+            return distances[0], indices[0]
+
+        # Overlay'deki (mmap sonrası eklenen) vektörler ayrıca aranıp mesafeye göre birleştirilir
+        params = None if allowed is None else faiss.SearchParameters(sel=selector)
+        overlay_distances, overlay_indices = self._overlay.search(query_embedding.reshape(1, -1), n, params=params)
+        distances = np.concatenate([distances[0], overlay_distances[0]])
+        indices = np.concatenate([indices[0], overlay_indices[0]])
+        order = np.argsort(np.where(indices >= 0, distances, np.inf))[:n]
+        return distances[order], indices[order]
+
+    def retrieve(self, query, k=5, city_filter=None, category_filter=None, date_range=None):
+        """
+        Kullanıcı sorgusuna en yakın etkinlikleri bul (semantik + BM25 hibrit arama)
+        
+        Filtreler arama sonrasında değil, FAISS araması içinde (ID selector ile)
+        uygulanır; filtre ne kadar seçici olursa olsun k sonuç döner.
+        Embedding modeli henüz yüklenmediyse veya vektör araması hata verdiyse
+        sadece BM25 sonuçları döner; bu sonuçlar 'degraded': True taşır
+        (yanıtları cache'lenmez).
         
         Args:
             query: Kullanıcının arama sorgusu
             k: Kaç etkinlik döndürülecek (varsayılan: 5)
             city_filter: Şehir filtresi (örn: "antalya")
+            category_filter: Kategori filtresi (örn: "music")
+            date_range: (başlangıç, bitiş) ISO tarih tuple'ı, parse_turkish_date_query çıktısı
         
         Returns:
-            list: Her biri {'event': dict, 'score': float} içeren liste (benzerlik skoruna göre sıralı)
+            list: Her biri {'event': EventRecord, 'score': float} içeren liste (sıralama skoruna göre sıralı);
+            boş liste gerçekten sonuç olmadığı anlamına gelir
+
+        Raises:
+            Exception: Arama yapılamadı (hata "sonuç yok" olarak dönmez, cache'lenmez)
         """
+        # Füzyon için her iki aramadan k'dan fazla aday alınır
+        n_candidates = max(k * 4, 20) if RAG_HYBRID_SEARCH else k
+
+        with self._lock:
+            mask = self._filter_mask(city_filter, category_filter, date_range)
+            allowed = None if mask is None else np.flatnonzero(mask).astype('int64')
+            candidates = len(self._slot_by_id) if allowed is None else len(allowed)
+            if candidates == 0:
+                return []
+            # 🔤 BM25 anahtar kelime araması (transformer gerektirmez)
+            keyword_hits = self.bm25.search(query, n_candidates, mask) if RAG_HYBRID_SEARCH else []
+
+        # ⚡ Hızlı yol: model henüz yüklenmediyse sonuçlar BM25'ten, model arka planda yüklenir
+        if keyword_hits and not self._model_ready() and (self.embedding_id, normalize_query(query)) not in _query_embedding_cache:
+            self._warm_up_model()
+            return self._to_results(keyword_hits[:k], degraded=True)
+
         try:
-            # 🔍 Kullanıcı sorgusunu embedding'e çevir
-            # Normalize embeddings ve bellek optimizasyonu
-            query_embedding = self.model.encode(
-                [query], 
-                show_progress_bar=False,
-                convert_to_numpy=True,
-                normalize_embeddings=True
-            )[0].astype('float32')
-            
-            # 🗄️ FAISS ile en yakın vektörleri bul (k*2 al, filtreleme için)
-            distances, indices = self.index.search(
-                query_embedding.reshape(1, -1),
-                min(k * 2, len(self.events))
-            )
-            
-            results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                event = self.events[idx]
-                
-                # Şehir filtresi varsa uygula
-                if city_filter:
-                    event_city = str(event.get('city', '')).lower()
-                    if event_city != city_filter.lower():
-                        continue
-                
-                # FAISS L2 mesafesini benzerlik skoruna çevir (0-1 arası)
-                # Düşük mesafe = yüksek benzerlik
-                similarity_score = 1 / (1 + float(dist))
-                
-                results.append({
-                    'event': event,
-                    'score': similarity_score
-                })
-                
-                # Yeterli sonuç toplandıysa dur
-                if len(results) >= k:
-                    break
-            
-            return results
-            
+            # 🔍 Kullanıcı sorgusunu embedding'e çevir (LRU cache'ten)
+            query_embedding = self.embed_query(query)
+
+            # 🗄️ FAISS ile en yakın vektörleri bul (metadata filtresi arama içinde uygulanır)
+            with self._lock:
+                distances, indices = self._vector_search(query_embedding, min(n_candidates, candidates), allowed)
         except Exception as e:
-            logger.error(f"❌ Retrieval hatası: {e}")
-            return []
+            # Model yüklenemedi, batcher veya FAISS hatası: BM25 sonucu varsa onunla devam et
+            if not keyword_hits:
+                raise
+            logger.error(f"❌ Vektör araması başarısız, sadece BM25 sonuçları kullanılıyor: {e}")
+            return self._to_results(keyword_hits[:k], degraded=True)
+
+        # FAISS L2 mesafesini benzerlik skoruna çevir (0-1 arası)
+        # Düşük mesafe = yüksek benzerlik
+        vector_hits = [(int(slot), 1 / (1 + float(dist)))
+                       for dist, slot in zip(distances, indices) if slot >= 0]
+
+        # 🔀 Vektör + BM25 sıralamalarını RRF ile birleştir
+        if keyword_hits:
+            return self._to_results(_reciprocal_rank_fusion([vector_hits, keyword_hits])[:k])
+        return self._to_results(vector_hits[:k])
 
@@ -14,6 +14,7 @@ from dotenv import load_dotenv
 import logging
 import re
 import time
+import catalogue
 
 # .env dosyasından environment variable'ları yükle
 load_dotenv()
@@ -754,12 +755,22 @@ def scrape_biletix():
 
 # ============ PROCESS AND SAVE ============
 
+# Her scrape'te değişen zaman damgaları (etkinliğin içeriği sayılmaz)
+SCRAPE_TIMESTAMP_FIELDS = ('last_scraped', 'updated_at')
+
+def event_changed(existing, event_data):
+    """Scrape edilen alanlardan biri kayıttakinden farklı mı (zaman damgaları hariç)"""
+    return any(existing.get(field) != value for field, value in event_data.items()
+               if field not in SCRAPE_TIMESTAMP_FIELDS)
+
 def process_and_save_events(raw_events):
     """Etkinlikleri işler ve veritabanına kaydeder"""
     logger.info(f"📊 Toplam {len(raw_events)} etkinlik işleniyor...")
     
     saved_count = 0
     updated_count = 0
+    unchanged_count = 0
+    changed_ids = []  # RAG index'ine artımlı olarak aktarılacak etkinlikler
     
     for event in raw_events:
         try:
@@ -809,29 +820,54 @@ def process_and_save_events(raw_events):
                 'date': event_data['date']
             })
             
-            if existing:
+            if existing and not event_changed(existing, event_data):
+                # İçerik aynı: sadece görülme zamanı güncellenir, RAG index'ine değişiklik yazılmaz.
+                # last_scraped API yanıtlarında yer almadığı için (EVENT_UNVERSIONED_FIELDS)
+                # revizyon artırılmaz; cache'lenmiş yanıtlar ve ETag'ler geçerli kalır
+                events_collection.update_one(
+                    {'_id': existing['_id']},
+                    {'$set': {'last_scraped': event_data['last_scraped']}}
+                )
+                unchanged_count += 1
+            elif existing:
                 events_collection.update_one(
                     {'_id': existing['_id']},
                     {'$set': event_data}
                 )
+                changed_ids.append(existing['_id'])
                 updated_count += 1
             else:
                 event_data['created_at'] = datetime.now()
-                events_collection.insert_one(event_data)
+                result = events_collection.insert_one(event_data)
+                changed_ids.append(result.inserted_id)
                 saved_count += 1
         
         except Exception as e:
             logger.error(f"Etkinlik kaydetme hatası: {e}")
             continue
     
-    logger.info(f"✅ {saved_count} yeni etkinlik eklendi, {updated_count} etkinlik güncellendi")
+    # Değişiklikleri kaydet (backend RAG index'ini yeniden kurmadan günceller)
+    try:
+        catalogue.record_changes(db, changed_ids, catalogue.OP_UPSERT)
+    except Exception as e:
+        logger.error(f"Değişiklik kaydı yazılamadı: {e}")
+    
+    logger.info(f"✅ {saved_count} yeni etkinlik eklendi, {updated_count} etkinlik güncellendi, "
+                f"{unchanged_count} etkinlik değişmedi")
     return saved_count, updated_count
 
 def clean_old_events():
     """Geçmiş tarihlerdeki etkinlikleri temizler"""
     yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
     
-    result = events_collection.delete_many({'date': {'$lt': yesterday}})
+    old_ids = [doc['_id'] for doc in events_collection.find({'date': {'$lt': yesterday}}, {'_id': 1})]
+    result = events_collection.delete_many({'_id': {'$in': old_ids}})
+    
+    # Silinen etkinlikleri kaydet (backend RAG index'inden çıkarır)
+    try:
+        catalogue.record_changes(db, old_ids, catalogue.OP_DELETE)
+    except Exception as e:
+        logger.error(f"Değişiklik kaydı yazılamadı: {e}")
     
     logger.info(f"🗑️ {result.deleted_count} eski etkinlik silindi")
     return result.deleted_count
@@ -0,0 +1,67 @@
+"""
+Ortak test ayarları - proje kökü import yoluna eklenir, servisler kapalı çalışılır
+
+MongoDB ve Telegram gerekmez: events_backend import sırasında bağlanmaz, events_collection
+None kalır ve bot başlatılmaz.
+"""
+
+import hashlib
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('MONGO_URI', 'mongodb://127.0.0.1:1/')
+os.environ.setdefault('MONGO_AUTOCONNECT', '0')
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '')
+os.environ.setdefault('TELEGRAM_AUTOSTART', '0')
+os.environ.setdefault('CATALOGUE_CHANGE_STREAM', '0')
+
+
+@pytest.fixture(scope='session')
+def benchmark():
+    """rag-benchmark.py modülü (sentetik katalog ve recall yardımcıları)"""
+    spec = importlib.util.spec_from_file_location('rag_benchmark', os.path.join(ROOT, 'rag-benchmark.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeModel:
+    """Metin hash'inden deterministik vektör üreten encoder (model indirmeden)"""
+
+    dimension = 8
+
+    def __init__(self):
+        self.encoded = 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        self.encoded += len(texts)
+        vectors = np.array([
+            np.frombuffer(hashlib.sha256(text.encode('utf-8')).digest()[:self.dimension * 4], dtype='uint32')
+            for text in texts
+        ], dtype='float32')
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def fake_model(monkeypatch, tmp_path):
+    """torch backend'i FakeModel yükler; embedding deposu ve index artifact'i geçici dizinde"""
+    import rag_retriever
+
+    model = FakeModel()
+    monkeypatch.setattr(rag_retriever, 'EMBEDDING_BACKEND', 'torch')
+    monkeypatch.setattr(rag_retriever, '_model_cache', {})
+    monkeypatch.setattr(rag_retriever, '_loaded_backends', {})
+    monkeypatch.setattr(rag_retriever, '_embedding_stores', {})
+    monkeypatch.setattr(rag_retriever, '_load_torch_model', lambda model_name, cache_dir: model)
+    monkeypatch.setenv('EMBEDDING_CACHE_DIR', str(tmp_path))
+    return model
@@ -0,0 +1,113 @@
+"""
+Yanıt cache'i - sadece BM25 sonuçlarından veya retrieval hatasından üretilen yanıtlar cache'lenmez
+"""
+
+import numpy as np
+import pytest
+
+import rag_engine
+import rag_retriever
+from rag_engine import RAGEngine, answer_cache_key
+from rag_retriever import EmbeddingStore, EventRecord, FAISSRetriever, _build_searchable_text, _embedding_key
+
+QUERY = 'Duman konseri ne zaman'
+
+
+class StubRetriever:
+    """Sabit sonuç döndüren retriever (degraded: BM25 hızlı yolu)"""
+
+    def __init__(self, events, degraded):
+        self.results = [{'event': EventRecord(e), 'score': 1.0} for e in events]
+        if degraded:
+            for result in self.results:
+                result['degraded'] = True
+
+    def set_snippet_renderers(self, renderers):
+        pass
+
+    def retrieve(self, query, **kwargs):
+        if isinstance(self.results, Exception):
+            raise self.results
+        return self.results
+
+    def cached_query_embedding(self, query):
+        return None
+
+
+@pytest.fixture
+def answer_cache(monkeypatch):
+    """Boş, sadece bellekte çalışan yanıt cache'i; Gemini kapalı"""
+    cache = rag_engine.AnswerCache(16, 60)
+    monkeypatch.setattr(rag_engine, '_answer_cache', cache)
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    return cache
+
+
+def cache_key(engine):
+    return answer_cache_key(QUERY, 'antalya', 5, None, None, engine.catalogue_revision)
+
+
+@pytest.mark.parametrize('answer', ['answer_question', 'answer_question_stream'])
+def test_degraded_answer_is_not_cached(benchmark, answer_cache, answer):
+    engine = RAGEngine([], retriever=StubRetriever(benchmark.synthetic_events(3), degraded=True))
+
+    result = getattr(engine, answer)(QUERY)
+    if answer == 'answer_question_stream':
+        result = ''.join(result)
+    assert result
+    assert answer_cache.get(cache_key(engine)) is None
+
+    engine.retriever = StubRetriever(benchmark.synthetic_events(3), degraded=False)
+    engine.answer_question(QUERY)
+    assert answer_cache.get(cache_key(engine)) is not None
+
+
+def test_retrieve_marks_bm25_fast_path_degraded(benchmark, monkeypatch, tmp_path):
+    # Vektörler depodan gelir: model yüklenmez, sorgu BM25 hızlı yolundan cevaplanır
+    monkeypatch.setattr(rag_retriever, '_model_cache', {})
+    monkeypatch.setenv('EMBEDDING_CACHE_DIR', str(tmp_path))
+    events = benchmark.synthetic_events(20)
+    events[0]['title'] = 'Duman Konseri'
+    model_id = rag_retriever._embedding_id('fake-model')
+    texts = [_build_searchable_text(EventRecord(e)) for e in events]
+    store = EmbeddingStore(model_id)
+    store.put_many([_embedding_key(model_id, text) for text in texts],
+                   np.random.default_rng(0).random((len(texts), 8), dtype='float32'))
+    store.save()
+
+    retriever = FAISSRetriever(events, model_name='fake-model')
+    monkeypatch.setattr(retriever, '_warm_up_model', lambda: None)
+    results = retriever.retrieve(QUERY)
+
+    assert results and all(r['degraded'] for r in results)
+
+
+def test_retrieval_error_is_not_cached_as_no_results(benchmark, answer_cache):
+    retriever = StubRetriever([], degraded=False)
+    retriever.results = RuntimeError("FAISS hatası")
+    engine = RAGEngine([], retriever=retriever)
+
+    assert engine.answer_question(QUERY)['answer'] == rag_engine.ERROR_ANSWER
+    assert answer_cache.get(cache_key(engine)) is None
+
+    # Gerçekten sonuç yoksa "bulamadım" yanıtı cache'lenir
+    retriever.results = []
+    assert engine.answer_question(QUERY)['answer'] == rag_engine.NO_RESULTS_ANSWER
+    assert answer_cache.get(cache_key(engine)) is not None
+
+
+def test_vector_search_error_falls_back_to_degraded_bm25(benchmark, fake_model, monkeypatch):
+    events = benchmark.synthetic_events(20)
+    events[0]['title'] = 'Duman Konseri'
+    retriever = FAISSRetriever(events, model_name='fake-model')
+
+    def fail(*args):
+        raise RuntimeError("invalid search params")
+
+    monkeypatch.setattr(retriever, '_vector_search', fail)
+    results = retriever.retrieve(QUERY)
+    assert results and all(r['degraded'] for r in results)
+
+    # BM25 de bir şey bulamadıysa hata yukarı iletilir ("sonuç yok" sayılmaz)
+    with pytest.raises(RuntimeError):
+        retriever.retrieve('zzzz')
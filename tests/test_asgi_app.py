@@ -0,0 +1,58 @@
+"""
+ASGI sunucusu - import sırasında Mongo'ya bağlanmaz, yazma route'ları Flask handler'larıdır
+"""
+
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip('motor')
+pytest.importorskip('a2wsgi')
+from starlette.testclient import TestClient
+
+import asgi_app
+import catalogue
+import events_backend
+
+
+@pytest.fixture
+def client():
+    # with kullanılmaz: lifespan (Mongo bağlantısı, bot) çalışmaz
+    return TestClient(asgi_app.app)
+
+
+def test_import_does_not_connect_to_mongo():
+    assert events_backend.client is None
+    assert events_backend.catalogue_revision is None
+
+
+@pytest.mark.parametrize('method, path', [('POST', '/api/events'), ('PUT', '/api/events/x'),
+                                          ('DELETE', '/api/events/x'), ('POST', '/api/seed')])
+def test_write_routes_are_served_by_flask_handlers(client, method, path):
+    response = client.request(method, path, json={})
+    # Flask'ın check_mongodb yanıtı: route var, Mongo yok
+    assert response.status_code in (500, 503)
+    assert response.json()['success'] is False
+
+
+def test_chat_validation_is_shared(client):
+    assert client.post('/api/chat', json={}).json() == {"success": False, "error": "Invalid JSON"}
+    assert client.post('/api/chat', json={'message': ''}).json()['error'] == "Message is required"
+
+
+def test_stale_revision_is_read_with_motor(monkeypatch):
+    cache = catalogue.RevisionCache(db=None, ttl=60)
+    reads = []
+
+    async def find_one(query):
+        reads.append(query)
+        return {'_id': catalogue.CATALOGUE_DOC_ID, 'revision': 9}
+
+    monkeypatch.setattr(events_backend, 'catalogue_revision', cache)
+    monkeypatch.setattr(asgi_app, 'motor_db', {catalogue.META_COLLECTION: types.SimpleNamespace(find_one=find_one)})
+
+    assert asyncio.run(asgi_app.catalogue_revision()) == 9
+    assert asyncio.run(asgi_app.catalogue_revision()) == 9  # TTL içinde: Mongo'ya gidilmez
+    assert len(reads) == 1
+    assert cache.get() == 9  # Senkron okuyucular da aynı cache'i görür
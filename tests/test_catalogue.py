@@ -0,0 +1,86 @@
+"""
+Katalog değişiklik kaydı - revizyon kaydı yazılmamış bir değişikliği göstermez
+"""
+
+from datetime import datetime
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import catalogue
+
+
+class FakeCollection:
+    """record_changes/fetch_changes'in kullandığı kadar Mongo koleksiyonu (revision unique)"""
+
+    def __init__(self):
+        self.docs = []
+
+    def find_one(self, query=None, sort=None, projection=None):
+        docs = [d for d in self.docs if all(d.get(k) == v for k, v in (query or {}).items())]
+        if sort:
+            field, direction = sort[0]
+            docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return docs[0] if docs else None
+
+    def insert_one(self, doc):
+        if 'revision' in doc and any(d.get('revision') == doc['revision'] for d in self.docs):
+            raise DuplicateKeyError("revision_1")
+        self.docs.append(dict(doc))
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.find_one(query)
+        if doc is None:
+            doc = dict(query)
+            self.docs.append(doc)
+        for field, value in update['$max'].items():
+            doc[field] = max(doc.get(field, value), value)
+
+    def find(self, query):
+        after = query['revision']['$gt']
+        return FakeCursor([d for d in self.docs if d['revision'] > after])
+
+
+class FakeCursor(list):
+    def sort(self, field, direction):
+        return FakeCursor(sorted(self, key=lambda d: d[field], reverse=direction < 0))
+
+
+@pytest.fixture
+def db():
+    return {catalogue.CHANGES_COLLECTION: FakeCollection(), catalogue.META_COLLECTION: FakeCollection()}
+
+
+def test_revision_follows_written_changes(db):
+    assert catalogue.record_changes(db, ['a'], catalogue.OP_UPSERT) == 1
+    assert catalogue.record_changes(db, ['b'], catalogue.OP_DELETE) == 2
+    assert catalogue.current_revision(db) == 2
+    assert catalogue.fetch_changes(db, 0) == (2, ['a'], ['b'])
+
+
+def test_writer_dying_after_change_record_leaves_no_gap(db, monkeypatch):
+    meta = db[catalogue.META_COLLECTION]
+    monkeypatch.setattr(meta, 'update_one', lambda *args, **kwargs: (_ for _ in ()).throw(ConnectionError()))
+    with pytest.raises(ConnectionError):
+        catalogue.record_changes(db, ['a'], catalogue.OP_UPSERT)
+    monkeypatch.undo()
+
+    # Revizyon ilerlemedi; sonraki yazma yarım kalan kaydın üstüne numara alır
+    assert catalogue.current_revision(db) == 0
+    assert catalogue.record_changes(db, ['b'], catalogue.OP_UPSERT) == 2
+    assert catalogue.fetch_changes(db, 0) == (2, ['a', 'b'], [])
+
+
+def test_concurrent_writer_taking_the_number_is_retried(db, monkeypatch):
+    changes = db[catalogue.CHANGES_COLLECTION]
+    insert_one = changes.insert_one
+
+    def racing_insert(doc):
+        # Başka bir yazıcı aynı numarayı bir an önce yazar
+        if not changes.docs:
+            insert_one({'revision': doc['revision'], 'op': catalogue.OP_UPSERT, 'event_ids': ['x'],
+                        'ts': datetime.now()})
+        insert_one(doc)
+
+    monkeypatch.setattr(changes, 'insert_one', racing_insert)
+    assert catalogue.record_changes(db, ['a'], catalogue.OP_UPSERT) == 2
@@ -0,0 +1,65 @@
+"""
+Embedding deposu - upsert sadece yeni vektörleri yazar, depo süreç başına bir kez okunur
+"""
+
+import os
+
+import numpy as np
+
+import rag_retriever
+from rag_retriever import EmbeddingStore, FAISSRetriever, embedding_store
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, 8), dtype='float32')
+
+
+def keys(n, prefix='k'):
+    return [f"{prefix}{i:039d}" for i in range(n)]
+
+
+def test_append_writes_only_new_vectors(tmp_path):
+    store = EmbeddingStore('model', str(tmp_path))
+    store.put_many(keys(100), vectors(100))
+    store.save()
+    main_file = os.stat(store.path)
+
+    store.append(keys(2, 'n'), vectors(2, seed=1))
+
+    assert os.stat(store.path).st_mtime_ns == main_file.st_mtime_ns
+    assert os.path.getsize(store.log_path) < main_file.st_size / 10
+    # Başka bir worker ana dosyayı ve log'u birlikte okur
+    other = EmbeddingStore('model', str(tmp_path))
+    np.testing.assert_array_equal(other.get(keys(2, 'n')[1]), vectors(2, seed=1)[1])
+    np.testing.assert_array_equal(other.get(keys(100)[99]), vectors(100)[99])
+
+
+def test_save_merges_log_and_prunes(tmp_path):
+    store = EmbeddingStore('model', str(tmp_path))
+    store.put_many(keys(10), vectors(10))
+    store.save()
+    EmbeddingStore('model', str(tmp_path)).append(keys(1, 'n'), vectors(1, seed=1))  # Başka worker
+
+    store.save(keep_keys=keys(5) + keys(1, 'n'))
+
+    assert os.path.getsize(store.log_path) == 0
+    reopened = EmbeddingStore('model', str(tmp_path))
+    assert reopened.get(keys(10)[9]) is None
+    np.testing.assert_array_equal(reopened.get(keys(1, 'n')[0]), vectors(1, seed=1)[0])
+
+
+def test_upsert_reuses_process_store(benchmark, fake_model, monkeypatch):
+    events = benchmark.synthetic_events(20)
+    retriever = FAISSRetriever(events, model_name='fake-model')
+    store = embedding_store(retriever.embedding_id)
+    loads = []
+    monkeypatch.setattr(EmbeddingStore, '_load', lambda self: loads.append(self))
+    saves = []
+    monkeypatch.setattr(EmbeddingStore, 'save', lambda self, keep_keys=None: saves.append(self))
+
+    retriever.upsert([dict(events[0], _id='f' * 24, title='Yeni Konser')])
+
+    assert embedding_store(retriever.embedding_id) is store
+    assert loads == [] and saves == []
+    assert fake_model.encoded == len(events) + 1
+    assert os.path.getsize(store.log_path) > 0
@@ -0,0 +1,108 @@
+"""
+/api/events keyset sayfalama - null, string ve datetime tarihli etkinlikler tam bir kez döner
+"""
+
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import events_backend
+from events_backend import build_events_query, encode_events_cursor, paginate_events
+
+# Mongo'nun sıralama ve $type karşılaştırmasındaki tip sırası (eksik alan null sayılır)
+TYPE_ORDER = {'null': 0, 'number': 1, 'string': 2, 'date': 3}
+
+
+def bson_type(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, datetime):
+        return 'date'
+    if isinstance(value, (int, float)):
+        return 'number'
+    return 'string'
+
+
+def sort_key(event):
+    date = event.get('date')
+    return TYPE_ORDER[bson_type(date)], date if date is not None else 0, event['_id']
+
+
+def matches(event, query):
+    """build_events_query'nin ürettiği operatörler için küçük bir Mongo eşleştiricisi"""
+    for field, condition in query.items():
+        if field == '$and':
+            if not all(matches(event, sub) for sub in condition):
+                return False
+            continue
+        if field == '$or':
+            if not any(matches(event, sub) for sub in condition):
+                return False
+            continue
+        value = event.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for op, operand in condition.items():
+            if op == '$type':
+                if bson_type(value) not in operand:
+                    return False
+            elif op in ('$gt', '$gte', '$lte'):
+                # Tip ayrımı: farklı tipteki değerler karşılaştırılmaz
+                if value is None or bson_type(value) != bson_type(operand):
+                    return False
+                if not {'$gt': value > operand, '$gte': value >= operand, '$lte': value <= operand}[op]:
+                    return False
+    return True
+
+
+def fetch_all(events, limit):
+    """Tüm sayfaları cursor ile gez, dönen etkinlik ID'lerini sırayla topla"""
+    seen, cursor = [], None
+    for _ in range(len(events) + 2):
+        args = {'limit': str(limit)}
+        if cursor:
+            args['cursor'] = cursor
+        query, limit, _ = build_events_query(args)
+        page = sorted((e for e in events if matches(e, query)), key=sort_key)[:limit + 1]
+        page, cursor = paginate_events(page, limit)
+        seen.extend(e['_id'] for e in page)
+        if cursor is None:
+            return seen
+    raise AssertionError("Sayfalama bitmedi")
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_pages_cover_mixed_date_types_once(limit):
+    events = [
+        {'_id': ObjectId()},
+        {'_id': ObjectId(), 'date': None},
+        {'_id': ObjectId(), 'date': 20250101},
+        {'_id': ObjectId(), 'date': '2025-01-20'},
+        {'_id': ObjectId(), 'date': '2025-01-20'},
+        {'_id': ObjectId(), 'date': '2025-03-01'},
+        {'_id': ObjectId(), 'date': datetime(2025, 2, 1, 20, 30)},
+        {'_id': ObjectId(), 'date': datetime(2025, 2, 1, 20, 30)},
+    ]
+
+    assert fetch_all(events, limit) == [e['_id'] for e in sorted(events, key=sort_key)]
+
+
+def test_datetime_cursor_round_trips():
+    event = {'_id': ObjectId(), 'date': datetime(2025, 2, 1, 20, 30)}
+    query, _, _ = build_events_query({'cursor': encode_events_cursor(event)})
+
+    assert {'date': event['date'], '_id': {'$gt': event['_id']}} in query['$or']
+
+
+@pytest.mark.parametrize('limit', ['0', str(events_backend.EVENTS_MAX_LIMIT + 1), 'abc'])
+def test_limit_out_of_range_is_rejected(limit):
+    with pytest.raises(ValueError):
+        build_events_query({'limit': limit})
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        build_events_query({'cursor': 'bozuk'})
@@ -0,0 +1,142 @@
+"""
+Gemini devre kesici - sonuçsuz kalan deneme çağrıları ve havuz kuyruğu hata sayılmaz
+"""
+
+import asyncio
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import rag_engine
+from rag_engine import CircuitBreaker, RAGEngine
+
+TIMEOUT = 0.3
+
+
+class FakeGemini:
+    """generate_content'i taklit eden model (delay: yanıt süresi)"""
+
+    def __init__(self, delay=0.0, chunks=('Merhaba', ' dünya')):
+        self.delay = delay
+        self.chunks = chunks
+
+    def generate_content(self, prompt, stream=False):
+        time.sleep(self.delay)
+        if stream:
+            return iter([types.SimpleNamespace(text=text) for text in self.chunks])
+        return types.SimpleNamespace(text=''.join(self.chunks))
+
+    async def generate_content_async(self, prompt, stream=False):
+        await asyncio.sleep(self.delay)
+        return types.SimpleNamespace(text=''.join(self.chunks))
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """Tek hatada açılan, cooldown'ı hemen dolan devre kesici; 1 thread'lik Gemini havuzu"""
+    breaker = CircuitBreaker(max_failures=1, cooldown=0)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(rag_engine, '_gemini_breaker', breaker)
+    monkeypatch.setattr(rag_engine, '_gemini_executor', executor)
+    monkeypatch.setattr(rag_engine, 'GEMINI_TIMEOUT', TIMEOUT)
+    monkeypatch.setattr(rag_engine, 'GEMINI_LATE_ANSWER_CACHE', False)
+    yield breaker
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    engine = RAGEngine([], retriever=types.SimpleNamespace(set_snippet_renderers=lambda renderers: None))
+    engine.model = FakeGemini()
+    plan = {'results': [], 'query_embedding': None, 'cacheable': False, 'prompt': 'soru'}
+    monkeypatch.setattr(engine, '_prepare', lambda *args: (None, plan))
+    return engine
+
+
+def open_breaker(breaker):
+    """Devreyi aç ve half-open deneme iznini al"""
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_closed_stream_settles_half_open_trial(breaker, engine):
+    open_breaker(breaker)
+    breaker.state = CircuitBreaker.OPEN  # allow() _stream içinde tekrar çağrılır
+
+    stream = engine._stream('key', 'soru', 'antalya', 5, None, None)
+    assert next(stream) == 'Merhaba'
+    stream.close()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()['abandoned'] == 1
+    assert breaker.allow()  # sıradaki istek yeni deneme yapar
+
+
+def test_cancelled_async_call_settles_half_open_trial(breaker, engine):
+    engine.model = FakeGemini(delay=TIMEOUT / 2)
+    open_breaker(breaker)
+    breaker.state = CircuitBreaker.OPEN
+
+    async def cancel():
+        task = asyncio.ensure_future(engine._generate_async('key', {'prompt': 'soru'}))
+        await asyncio.sleep(TIMEOUT / 10)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()['abandoned'] == 1
+    assert breaker.failures == 1
+
+
+def test_queue_wait_counts_against_the_budget_but_not_against_gemini(breaker, engine):
+    # Havuz bütçenin çoğu boyunca dolu, çağrının kendisi kısa: toplam süre bütçeyi aşar
+    rag_engine._gemini_executor.submit(time.sleep, TIMEOUT * 0.8)
+    engine.model = FakeGemini(delay=TIMEOUT * 0.5)
+
+    started = time.perf_counter()
+    assert engine._generate('key', {'prompt': 'soru'}) is None
+    assert time.perf_counter() - started < TIMEOUT * 1.2
+
+    stats = breaker.stats()
+    assert stats['busy'] == 1
+    assert stats['failures'] == 0
+
+
+def test_slow_gemini_times_out_within_the_budget(breaker, engine):
+    engine.model = FakeGemini(delay=TIMEOUT * 2)
+
+    started = time.perf_counter()
+    assert engine._generate('key', {'prompt': 'soru'}) is None
+    assert time.perf_counter() - started < TIMEOUT * 1.2
+    assert breaker.stats()['timeouts'] == 1
+
+
+def test_stream_holds_a_single_pool_slot(breaker, engine, monkeypatch):
+    engine.model = FakeGemini(chunks=('Bir', ' iki', ' üç'))
+    submits = []
+    submit = rag_engine._gemini_executor.submit
+    monkeypatch.setattr(rag_engine._gemini_executor, 'submit', lambda *args: submits.append(args) or submit(*args))
+
+    assert list(engine._generate_stream('soru')) == ['Bir', ' iki', ' üç']
+    assert len(submits) == 1
+
+
+def test_saturated_pool_skips_without_failure(breaker, engine):
+    release = threading.Event()
+    rag_engine._gemini_executor.submit(release.wait)
+    try:
+        assert engine._generate('key', {'prompt': 'soru'}) is None
+    finally:
+        release.set()
+
+    stats = breaker.stats()
+    assert stats['busy'] == 1
+    assert stats['failures'] == 0
+    assert stats['state'] == CircuitBreaker.CLOSED
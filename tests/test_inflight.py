@@ -0,0 +1,81 @@
+"""
+Eşzamanlı istek birleştirme - akış lideri bekleyenleri süresiz bekletmez
+"""
+
+import asyncio
+import time
+import types
+
+import pytest
+
+import rag_engine
+from rag_engine import InflightRequests, RAGEngine, answer_cache_key
+
+WAIT_TIMEOUT = 0.2
+QUERY = 'bu hafta sonu konser var mı'
+READY = {'answer': 'Hazır yanıt', 'sources': []}
+
+
+@pytest.fixture
+def inflight(monkeypatch):
+    """Kısa bekleme süreli birleştirme tablosu; yanıt cache'i kapalı"""
+    inflight = InflightRequests(wait_timeout=WAIT_TIMEOUT)
+    monkeypatch.setattr(rag_engine, '_inflight', inflight)
+    monkeypatch.setattr(rag_engine, '_answer_cache', rag_engine.AnswerCache(0, 60))
+    return inflight
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    engine = RAGEngine([], retriever=types.SimpleNamespace(set_snippet_renderers=lambda renderers: None))
+    monkeypatch.setattr(engine, '_prepare', lambda *args: (dict(READY), None))
+    return engine
+
+
+def test_waiter_behind_stalled_stream_computes_itself(inflight, engine):
+    # Lider ilk parçayı gönderdi, istemci akışı okumayı bıraktı
+    stream = engine.answer_question_stream(QUERY)
+    assert next(stream) == READY['answer']
+
+    started = time.perf_counter()
+    result = engine.answer_question(QUERY)
+
+    assert result == READY
+    assert WAIT_TIMEOUT <= time.perf_counter() - started < WAIT_TIMEOUT * 5
+    assert inflight.stats()['wait_timeouts'] == 1
+    stream.close()
+
+
+def test_closed_stream_releases_waiters(inflight, engine):
+    stream = engine.answer_question_stream(QUERY)
+    next(stream)
+    key = answer_cache_key(QUERY, 'antalya', 5, None, None, engine.catalogue_revision)
+    future, leader = inflight.join(key)
+    assert not leader
+
+    stream.close()
+
+    assert future.done()
+    assert inflight.stats()['in_flight'] == 0
+
+
+def test_cancelled_async_waiter_does_not_break_leader(inflight):
+    future, _ = inflight.join('key')
+
+    async def cancel_waiter():
+        waiter = asyncio.ensure_future(inflight.wait_async(inflight.join('key')[0]))
+        await asyncio.sleep(WAIT_TIMEOUT / 10)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(cancel_waiter())
+    inflight.finish('key', future, READY)
+    assert future.result() == READY
+
+
+def test_async_waiter_times_out(inflight):
+    inflight.join('key')
+    assert asyncio.run(inflight.wait_async(inflight.join('key')[0])) is None
+    assert inflight.stats()['wait_timeouts'] == 1
@@ -0,0 +1,70 @@
+"""
+ONNX embedding backend - torch ile aynı sonuçlar ve backend'e göre ayrılan cache kimliği
+"""
+
+import os
+
+import pytest
+
+import rag_retriever
+from rag_retriever import EmbeddingStore, EventRecord, FAISSRetriever, _build_searchable_text, _embedding_key
+
+MIN_RECALL = 0.9
+
+
+@pytest.fixture
+def broken_onnx(monkeypatch, fake_model):
+    """EMBEDDING_BACKEND=onnx ama ONNX yüklenemiyor: torch (FakeModel) yüklenir"""
+    def fail(*args, **kwargs):
+        raise RuntimeError("onnxruntime kurulu değil")
+
+    monkeypatch.setattr(rag_retriever, 'EMBEDDING_BACKEND', 'onnx')
+    monkeypatch.setattr(rag_retriever, 'OnnxSentenceEncoder', fail)
+    return fake_model
+
+
+@pytest.mark.parametrize('backend', ['onnx', 'onnx-int8'])
+def test_onnx_recall_matches_torch(benchmark, backend):
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('sentence_transformers')
+
+    try:
+        torch_model = rag_retriever._get_or_load_model(benchmark.DEFAULT_MODEL, backend='torch')
+    except OSError as e:  # Model indirilemedi (ağ yok, HF Hub erişilemiyor)
+        pytest.skip(f"{benchmark.DEFAULT_MODEL} yüklenemedi: {e}")
+    onnx_model = rag_retriever._get_or_load_model(benchmark.DEFAULT_MODEL, backend=backend)
+    assert rag_retriever._loaded_backends[(backend, benchmark.DEFAULT_MODEL)] == backend
+
+    texts = [_build_searchable_text(e) for e in benchmark.synthetic_events(300)]
+    recall, cosine = benchmark.backend_recall(torch_model, onnx_model, texts, benchmark.SAMPLE_QUERIES, k=5)
+    assert recall >= MIN_RECALL
+    assert cosine.mean() > 0.95
+
+
+def test_onnx_fallback_stores_vectors_under_torch_identity(benchmark, broken_onnx):
+    events = benchmark.synthetic_events(20)
+    retriever = FAISSRetriever(events, model_name='fake-model')
+
+    assert retriever.embedding_id == 'fake-model'
+    assert rag_retriever._embedding_id('fake-model') == 'fake-model'
+    assert os.path.exists(EmbeddingStore('fake-model').path)
+    assert not os.path.exists(EmbeddingStore('fake-model#onnx').path)
+
+
+def test_upsert_after_fallback_requires_rebuild(benchmark, broken_onnx):
+    # Depoda gerçek ONNX vektörleri var: index model yüklenmeden kurulur
+    events = benchmark.synthetic_events(20)
+    texts = [_build_searchable_text(EventRecord(e)) for e in events]
+    store = EmbeddingStore('fake-model#onnx')
+    store.put_many([_embedding_key('fake-model#onnx', text) for text in texts], type(broken_onnx)().encode(texts))
+    store.save()
+    retriever = FAISSRetriever(events, model_name='fake-model')
+    assert retriever.embedding_id == 'fake-model#onnx'
+    assert broken_onnx.encoded == 0
+
+    # Yeni etkinlik encode edilirken torch'a dönülür: ONNX index'ine torch vektörü eklenmez
+    new_event = dict(events[0], _id='f' * 24, title='Yeni Konser')
+    with pytest.raises(RuntimeError):
+        retriever.upsert([new_event])
+    assert retriever.embedding_id == 'fake-model#onnx'
+    assert retriever.index.ntotal == len(events)
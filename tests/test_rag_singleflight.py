@@ -0,0 +1,103 @@
+"""
+get_rag_engine() single-flight - eşzamanlı ilk isteklerde tek kurulum, değişiklikte tek arka plan işi
+"""
+
+import threading
+import time
+import types
+
+import pytest
+
+import events_backend
+
+THREADS = 32
+BUILD_SECONDS = 0.2
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Mongo'suz events_backend: kurulum sayılır, revizyon testten yönetilir"""
+    builds = []
+    revision = [0]
+
+    def build_rag_state(use_artifact=True):
+        builds.append(use_artifact)
+        time.sleep(BUILD_SECONDS)
+        return events_backend._new_rag_state(types.SimpleNamespace(), revision[0], time.monotonic())
+
+    monkeypatch.setattr(events_backend, '_rag_state', None)
+    monkeypatch.setattr(events_backend, '_rag_update_thread', None)
+    monkeypatch.setattr(events_backend, 'events_collection', object())
+    monkeypatch.setattr(events_backend, 'catalogue_revision', types.SimpleNamespace(get=lambda: revision[0]))
+    monkeypatch.setattr(events_backend, '_build_rag_state', build_rag_state)
+    return types.SimpleNamespace(builds=builds, revision=revision)
+
+
+def call_concurrently(func, threads=THREADS):
+    """func'ı aynı anda başlayan thread'lerden çağır, (sonuçlar, süreler) döndür"""
+    results, timings = [], []
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        started = time.perf_counter()
+        results.append(func())
+        timings.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results, timings
+
+
+def test_concurrent_first_requests_build_once(backend):
+    engines, _ = call_concurrently(events_backend.get_rag_engine)
+
+    assert len(backend.builds) == 1
+    assert engines[0] is not None
+    assert all(engine is engines[0] for engine in engines)
+
+
+def test_failed_first_build_is_retried(backend, monkeypatch):
+    def fail(use_artifact=True):
+        backend.builds.append(use_artifact)
+        raise RuntimeError("Mongo kapalı")
+
+    monkeypatch.setattr(events_backend, '_build_rag_state', fail)
+    assert events_backend.get_rag_engine() is None
+    assert events_backend.get_rag_engine() is None
+    assert len(backend.builds) == 2
+
+
+def test_catalogue_change_rebuilds_once_in_background(backend, monkeypatch):
+    old_engine = events_backend.get_rag_engine()
+    # Delta'lar uygulanamıyor (örn. değişiklik kaydı silinmiş): tam rebuild gerekir
+    monkeypatch.setattr(events_backend, '_apply_rag_changes', lambda state: False)
+    backend.revision[0] += 1
+
+    engines, timings = call_concurrently(events_backend.get_rag_engine)
+    events_backend._rag_update_thread.join()
+
+    assert backend.builds == [True, False]
+    assert all(engine is old_engine for engine in engines)
+    assert max(timings) < BUILD_SECONDS
+    assert events_backend.get_rag_engine() is not old_engine
+
+
+def test_revision_without_change_record_rebuilds(backend, monkeypatch):
+    old_engine = events_backend.get_rag_engine()
+    # Yazıcı revizyonu artırdı ama değişiklik kaydı yok: delta'lar ilerlemeden True döner
+    fetches = []
+    monkeypatch.setattr(events_backend, '_apply_rag_changes', lambda state: fetches.append(1) or True)
+    monkeypatch.setattr(events_backend, 'RAG_DELTA_RETRIES', 1)
+    backend.revision[0] += 1
+
+    events_backend.get_rag_engine()
+    events_backend._rag_update_thread.join(timeout=5)
+
+    assert not events_backend._rag_update_thread.is_alive()
+    assert len(fetches) == 2  # Bir deneme + bir bekleme sonrası deneme, sonra rebuild
+    assert backend.builds == [True, False]
+    assert events_backend.get_rag_engine() is not old_engine
@@ -0,0 +1,74 @@
+"""
+Okuma endpoint'lerinin yanıt cache'i - bayt sınırı, büyük gövdeler ve cursor'lı sayfalar
+"""
+
+import pytest
+
+import events_backend
+from events_backend import ResponseCache, build_events_query
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=100, max_body=60)
+    cache.put('a', 1, b'x' * 40)
+    cache.put('b', 1, b'x' * 40)
+    cache.put('c', 1, b'x' * 40)  # 120 bayt: en eski gövde düşer
+
+    assert cache.get('a', 1) is None
+    assert cache.get('b', 1) is not None and cache.get('c', 1) is not None
+    assert cache.stats()['bytes'] == 80
+
+
+def test_oversized_body_is_not_cached():
+    cache = ResponseCache(max_bytes=100, max_body=60)
+    cache.put('small', 1, b'x' * 10)
+    cache.put('big', 1, b'x' * 61)
+
+    assert cache.get('big', 1) is None
+    assert cache.get('small', 1) is not None  # Büyük gövde küçükleri düşürmez
+    assert cache.stats()['skipped'] == 1
+
+
+def test_replacing_an_entry_keeps_the_byte_count():
+    cache = ResponseCache(max_bytes=100, max_body=60)
+    cache.put('a', 1, b'x' * 40)
+    cache.put('a', 1, b'x' * 30)
+    assert cache.stats()['bytes'] == 30
+
+
+@pytest.fixture
+def flask_cache(monkeypatch):
+    cache = ResponseCache(max_bytes=1024 * 1024)
+    monkeypatch.setattr(events_backend, 'response_cache', cache)
+    monkeypatch.setattr(events_backend, 'cached_catalogue_revision', lambda: 7)
+    return cache
+
+
+@pytest.mark.parametrize('query, cached', [('?limit=10', True), ('?limit=10&cursor=abc', False)])
+def test_cursor_pages_are_not_cached(flask_cache, query, cached):
+    with events_backend.app.test_request_context(f'/api/events{query}'):
+        response = events_backend.cached_response(lambda: ({"success": True, "events": []}, 200))
+    assert response.status_code == 200
+    assert response.headers['ETag']  # cursor'lı sayfa da 304 alabilir
+    assert (flask_cache.stats()['size'] == 1) is cached
+
+
+def test_unversioned_fields_stay_out_of_responses():
+    _, _, projection = build_events_query({})
+    assert projection == {'last_scraped': 0}
+    _, _, projection = build_events_query({'fields': 'title'})
+    assert 'last_scraped' not in projection
+
+
+def test_source_and_last_scraped_can_be_selected():
+    _, _, projection = build_events_query({'fields': 'title,source,last_scraped'})
+    assert projection == {'title': 1, 'source': 1, 'last_scraped': 1, 'date': 1}
+
+
+def test_unversioned_field_responses_bypass_cache_and_etag(flask_cache):
+    with events_backend.app.test_request_context('/api/events?fields=title,last_scraped'):
+        response = events_backend.app.make_response(
+            events_backend.cached_response(lambda: ({"success": True, "events": []}, 200)))
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert flask_cache.stats()['size'] == 0
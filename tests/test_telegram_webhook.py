@@ -0,0 +1,58 @@
+"""
+Telegram webhook - secret olmadan webhook modu başlamaz ve hiçbir update kabul edilmez
+"""
+
+import asyncio
+import types
+
+import pytest
+
+import events_backend
+
+UPDATE = {'update_id': 1}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    queued = []
+    application = types.SimpleNamespace(bot=None, update_queue=types.SimpleNamespace(put=queued.append))
+    monkeypatch.setattr(events_backend, '_telegram_application', application)
+    monkeypatch.setattr(events_backend.asyncio, 'run_coroutine_threadsafe', lambda item, loop: None)
+    monkeypatch.setattr(events_backend.Update, 'de_json', lambda data, bot: data)
+    client = events_backend.app.test_client()
+    client.queued = queued
+    return client
+
+
+def post(client, secret=None):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret is not None else {}
+    return client.post(events_backend.TELEGRAM_WEBHOOK_PATH, json=UPDATE, headers=headers)
+
+
+def test_empty_secret_rejects_every_update(client, monkeypatch):
+    monkeypatch.setattr(events_backend, 'TELEGRAM_WEBHOOK_SECRET', '')
+    assert post(client).status_code == 403
+    assert post(client, '').status_code == 403
+    assert client.queued == []
+
+
+def test_matching_secret_is_accepted(client, monkeypatch):
+    monkeypatch.setattr(events_backend, 'TELEGRAM_WEBHOOK_SECRET', 's3cret')
+    assert post(client, 'yanlış').status_code == 403
+    assert post(client, 's3cret').status_code == 200
+    assert client.queued == [UPDATE]
+
+
+def test_webhook_mode_does_not_start_without_secret(monkeypatch):
+    started = []
+
+    async def webhook():
+        started.append(True)
+
+    monkeypatch.setattr(events_backend, 'TELEGRAM_BOT_TOKEN', 'token')
+    monkeypatch.setattr(events_backend, 'TELEGRAM_MODE', 'webhook')
+    monkeypatch.setattr(events_backend, 'TELEGRAM_WEBHOOK_SECRET', '')
+    monkeypatch.setattr(events_backend, 'run_telegram_webhook_async', webhook)
+
+    asyncio.run(events_backend.run_telegram_bot_async())
+    assert started == []
@@ -0,0 +1,47 @@
+"""
+Vektör saklama tipleri - her tipte filtreli (ID selector'lı) arama çalışır
+"""
+
+import pytest
+
+import rag_retriever
+from rag_retriever import FAISSRetriever
+
+DATE_RANGE = ('2026-03-01', '2026-08-31')
+
+
+@pytest.mark.parametrize('storage', ['float32', 'float16', 'pq'])
+def test_filtered_retrieve_on_flat_index(benchmark, fake_model, monkeypatch, storage):
+    # PQ kod kitabı küçük katalogda da eğitilsin (normalde float16'ya düşülür)
+    monkeypatch.setattr(rag_retriever, 'PQ_MIN_TRAIN', 300)
+    monkeypatch.setattr(rag_retriever, 'RAG_VECTOR_STORAGE', storage)
+    monkeypatch.setattr(rag_retriever, 'RAG_HYBRID_SEARCH', False)
+    retriever = FAISSRetriever(benchmark.synthetic_events(400), model_name='fake-model')
+    assert (retriever.index_type, retriever.vector_storage) == ('flat', storage)
+
+    results = retriever.retrieve('caz gecesi', k=10, city_filter='antalya', date_range=DATE_RANGE)
+
+    assert len(results) == 10
+    assert all(DATE_RANGE[0] <= r['event']['date'] <= DATE_RANGE[1] for r in results)
+
+    # Silinen etkinlik filtreli aramada da dönmez
+    removed = results[0]['event']['_id']
+    retriever.remove([removed])
+    results = retriever.retrieve('caz gecesi', k=10, city_filter='antalya', date_range=DATE_RANGE)
+    assert removed not in {r['event']['_id'] for r in results}
+
+
+@pytest.mark.parametrize('storage', ['float16', 'pq'])
+def test_filtered_retrieve_on_mapped_index_with_tombstones(benchmark, fake_model, monkeypatch, tmp_path, storage):
+    monkeypatch.setattr(rag_retriever, 'PQ_MIN_TRAIN', 300)
+    monkeypatch.setattr(rag_retriever, 'RAG_VECTOR_STORAGE', storage)
+    monkeypatch.setattr(rag_retriever, 'RAG_HYBRID_SEARCH', False)
+    FAISSRetriever(benchmark.synthetic_events(400), model_name='fake-model').save(str(tmp_path / 'index'))
+    retriever, _ = FAISSRetriever.load(str(tmp_path / 'index'), model_name='fake-model')
+
+    removed = retriever.retrieve('caz gecesi', k=1, city_filter='antalya', date_range=DATE_RANGE)[0]['event']['_id']
+    retriever.remove([removed])  # mmap'li index'e dokunulmaz: silinen slot maskelenir
+    results = retriever.retrieve('caz gecesi', k=10, city_filter='antalya', date_range=DATE_RANGE)
+
+    assert len(results) == 10
+    assert removed not in {r['event']['_id'] for r in results}